@@ -0,0 +1,238 @@
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import typer
+
+from tex2imgs.webwork_to_blackboard import (
+    build_indexed_lookup,
+    detect_blackboard,
+    detect_webwork,
+    encode_rows,
+    merge_exports,
+    read_csv_bytes,
+    rows_to_csv_bytes,
+)
+
+FIRST_NAMES = ["ana", "chris", "jane", "john", "li", "maria", "omar", "sara", "wei"]
+LAST_NAMES = ["doe", "garcia", "kim", "lee", "lopez", "nguyen", "patel", "smith"]
+WEBWORK_PREAMBLE = [
+    "NO OF FIELDS",
+    "SET NAME",
+    "PROB NUMBER",
+    "CLOSE DATE",
+    "CLOSE TIME",
+    "PROB VALUE",
+]
+WEBWORK_FIXED = [
+    "STUDENT ID",
+    "login ID",
+    "LAST NAME",
+    "FIRST NAME",
+    "SECTION",
+    "RECITATION",
+    "total",
+    "summary",
+    "%score",
+]
+
+
+def make_students(n: int, seed: int = 0) -> List[Dict[str, str]]:
+    """
+    Generate a roster with realistic, partly colliding login names.
+
+    First names repeat often, so the "before the dot" key variant is shared
+    by many students, which is the case the lookup has to resolve.
+    """
+    rng = random.Random(seed)
+    students = []
+    for i in range(n):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        login = f"{first}.{last}{i}" if rng.random() < 0.8 else f"{first}_{last}{i}"
+        students.append(
+            {"id": str(100000 + i), "first": first, "last": last, "login": login}
+        )
+    return students
+
+
+def make_blackboard(students: List[Dict[str, str]], seed: int = 0) -> bytes:
+    rng = random.Random(seed + 1)
+    rows = [
+        [
+            "Last Name",
+            "First Name",
+            "Username",
+            "Student ID",
+            "Last Access",
+            "Availability",
+            "Overall Grade",
+        ]
+    ]
+    for student in students:
+        # Mix key styles: full email, bare login, upper-case email
+        style = rng.random()
+        if style < 0.6:
+            username = f"{student['login']}@uni.edu"
+        elif style < 0.9:
+            username = student["login"]
+        else:
+            username = f"{student['login']}@uni.edu".upper()
+        rows.append(
+            [
+                student["last"].upper(),
+                student["first"].upper(),
+                username,
+                student["id"],
+                "2026-01-15",
+                "Yes",
+                str(rng.randint(50, 100)),
+            ]
+        )
+    # Students dropped from WebWork but still in Blackboard
+    rows.extend(
+        [["EXTRA", "STUDENT", f"extra{i}@uni.edu", "", "", "Yes", ""] for i in range(5)]
+    )
+    return rows_to_csv_bytes(rows)
+
+
+def make_webwork(
+    students: List[Dict[str, str]], projects: int, seed: int = 0
+) -> bytes:
+    rng = random.Random(seed + 2)
+    width = len(WEBWORK_FIXED) + projects
+    names = [f"Problem_Set_{j + 1}" for j in range(projects)]
+    rows = []
+    for label in WEBWORK_PREAMBLE:
+        row = [label.ljust(13)] + [""] * (width - 1)
+        if label == "SET NAME":
+            row[len(WEBWORK_FIXED) :] = names
+        elif label == "PROB VALUE":
+            row[len(WEBWORK_FIXED) :] = [str(rng.choice([10, 15, 20]))] * projects
+        rows.append(row)
+    rows.append(WEBWORK_FIXED + names)
+    for student in students:
+        # WebWork logins are usually the local part, sometimes the full email
+        login = student["login"]
+        if rng.random() < 0.2:
+            login += "@uni.edu"
+        scores = [str(rng.randint(0, 100)) for _ in range(projects)]
+        rows.append(
+            [
+                student["id"],
+                login,
+                student["last"].upper(),
+                student["first"].upper(),
+                "",
+                "",
+                "",
+                "",
+                str(rng.randint(0, 100)),
+            ]
+            + scores
+        )
+    # Students enrolled in WebWork only
+    rows.extend(
+        [["", f"guest{i}", "", "", "", "", "", "", "0"] + ["0"] * projects for i in range(5)]
+    )
+    return rows_to_csv_bytes(rows)
+
+
+def measure(fn: Callable, trace_memory: bool):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    value = fn()
+    seconds = time.perf_counter() - start
+    stats = {"seconds": round(seconds, 4)}
+    if trace_memory:
+        stats["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    return value, stats
+
+
+def run_stages(blackboard: bytes, webwork: bytes, trace_memory: bool) -> Dict:
+    stages = {}
+    (bb_rows, ww_rows), stages["parse"] = measure(
+        lambda: (read_csv_bytes(blackboard), read_csv_bytes(webwork)), trace_memory
+    )
+    (bb, ww), stages["detect"] = measure(
+        lambda: (detect_blackboard(bb_rows), detect_webwork(ww_rows)), trace_memory
+    )
+    index, stages["index"] = measure(lambda: build_indexed_lookup(ww), trace_memory)
+    result, stages["merge"] = measure(
+        lambda: merge_exports(bb, ww, index), trace_memory
+    )
+    _, stages["serialize"] = measure(lambda: encode_rows(result.rows), trace_memory)
+    return {"stages": stages, "matched": result.matched, "unmatched": result.unmatched}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main(
+    students: List[int] = typer.Option(
+        [1000, 10000, 100000, 500000], help="Roster sizes to benchmark."
+    ),
+    projects: List[int] = typer.Option([10, 200], help="WebWork project counts."),
+    memory: bool = typer.Option(True, help="Also measure peak memory per stage."),
+    seed: int = 0,
+    output: Optional[str] = typer.Option(None, help="Write the JSON report here."),
+):
+    """
+    Benchmark the WebWork to Blackboard merge on synthetic rosters.
+
+    Every stage (parse, detect, index, merge, serialize) is timed on its own.
+    Peak memory is measured in a second, traced run, so tracing does not
+    distort the timings. The JSON report can be compared between revisions.
+    """
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "results": [],
+    }
+    for n in students:
+        roster = make_students(n, seed)
+        blackboard = make_blackboard(roster, seed)
+        for p in projects:
+            webwork = make_webwork(roster, p, seed)
+            entry = {
+                "students": n,
+                "projects": p,
+                "blackboard_bytes": len(blackboard),
+                "webwork_bytes": len(webwork),
+            }
+            entry.update(run_stages(blackboard, webwork, trace_memory=False))
+            if memory:
+                traced = run_stages(blackboard, webwork, trace_memory=True)
+                for stage, stats in traced["stages"].items():
+                    entry["stages"][stage]["peak_mb"] = stats["peak_mb"]
+            report["results"].append(entry)
+            total = sum(s["seconds"] for s in entry["stages"].values())
+            sys.stderr.write(f"{n} students, {p} projects: {total:.2f}s\n")
+
+    text = json.dumps(report, indent=2)
+    if output is None:
+        print(text)
+    else:
+        with open(output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    typer.run(main)
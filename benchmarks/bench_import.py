@@ -0,0 +1,62 @@
+import json
+import statistics
+import subprocess
+import sys
+from typing import List
+
+import typer
+
+# Modules that must not be loaded by a plain import of the render module
+HEAVY_MODULES = ["numpy", "pandas", "pdf2image", "PIL", "typer", "matplotlib"]
+
+SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+def cold_import(module: str) -> dict:
+    """Import a module in a fresh interpreter and time it."""
+    code = SNIPPET.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout)
+
+
+def main(
+    module: List[str] = typer.Option(["tex2imgs.utils"], help="Modules to import."),
+    repeat: int = typer.Option(10, help="Fresh interpreters per module."),
+    max_ms: float = typer.Option(
+        150.0, help="Fail if the median import takes longer (milliseconds)."
+    ),
+):
+    """
+    Measure the cold import time of the render modules.
+
+    Every import runs in a new interpreter, as in a freshly started Streamlit
+    container. Exits with an error if the median time exceeds --max-ms or if
+    a heavy dependency (numpy, pandas, ...) is loaded at import time.
+    """
+    failed = False
+    for name in module:
+        runs = [cold_import(name) for _ in range(repeat)]
+        median_ms = statistics.median(r["seconds"] for r in runs) * 1000
+        heavy = sorted({m for r in runs for m in r["heavy"]})
+        typer.echo(
+            f"{name}: median {median_ms:.1f} ms over {repeat} runs"
+            + (f", loads {', '.join(heavy)}" if heavy else "")
+        )
+        if median_ms > max_ms or heavy:
+            failed = True
+    if failed:
+        typer.echo("Import time budget exceeded.")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,100 @@
+import json
+import platform
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import typer
+
+from benchmarks.bench_gradebook import git_revision
+from tex2imgs.raster import RASTER_BACKENDS, get_backend
+from tex2imgs.utils import build_document, compile_tex, parse_questions
+
+
+def compile_questions(path_file: str, workdir: str, aspectratio: int) -> str:
+    """Compile the questions of a LaTeX file as `read_tex` does."""
+    with open(path_file, "r") as f:
+        questions, _ = parse_questions(f.readlines())
+    bodies = [question.body for question in questions]
+    return compile_tex(build_document(bodies, aspectratio=aspectratio), workdir)
+
+
+def time_backend(name: str, path_pdf: str, dpi: int, batch_size: int) -> dict:
+    backend = get_backend(name, batch_size=batch_size)
+    start = time.perf_counter()
+    first = None
+    pages = 0
+    for _ in backend.pages(path_pdf, dpi=dpi):
+        if first is None:
+            first = time.perf_counter() - start
+        pages += 1
+    seconds = time.perf_counter() - start
+    return {
+        "pages": pages,
+        "seconds": round(seconds, 4),
+        "first_page_seconds": round(first or 0.0, 4),
+        "pages_per_second": round(pages / max(seconds, 1e-9), 2),
+    }
+
+
+def main(
+    file: str = typer.Argument(..., help="LaTeX question file, or a compiled PDF."),
+    backend: List[str] = typer.Option(
+        list(RASTER_BACKENDS), help="Raster backends to compare."
+    ),
+    dpi: List[int] = typer.Option([100, 200], help="Resolutions to benchmark."),
+    repeat: int = typer.Option(3, help="Runs per backend; the best is kept."),
+    batch_size: int = 50,
+    aspectratio: int = 169,
+    output: Optional[str] = typer.Option(None, help="Write the JSON report here."),
+):
+    """
+    Compare the raster backends on the same PDF.
+
+    A .tex file is compiled once with pdflatex, then every backend renders
+    all its pages at every resolution. The best of --repeat runs is
+    reported, with the time to the first page. Backends that cannot run
+    (e.g. pypdfium2 not installed) are reported with their error.
+    """
+    workdir = tempfile.TemporaryDirectory(prefix="tex2imgs_bench_")
+    if file.endswith(".pdf"):
+        path_pdf = file
+    else:
+        path_pdf = compile_questions(file, workdir.name, aspectratio)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "file": file,
+        "results": [],
+    }
+    for d in dpi:
+        for name in backend:
+            entry = {"backend": name, "dpi": d}
+            try:
+                runs = [
+                    time_backend(name, path_pdf, d, batch_size) for _ in range(repeat)
+                ]
+            except (ImportError, OSError, ValueError) as e:
+                entry["error"] = str(e)
+                sys.stderr.write(f"{name} @ {d} dpi: {e}\n")
+            else:
+                entry.update(min(runs, key=lambda run: run["seconds"]))
+                sys.stderr.write(
+                    f"{name} @ {d} dpi: {entry['pages']} pages in "
+                    f"{entry['seconds']:.2f}s\n"
+                )
+            report["results"].append(entry)
+    workdir.cleanup()
+
+    text = json.dumps(report, indent=2)
+    if output is None:
+        print(text)
+    else:
+        with open(output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    typer.run(main)
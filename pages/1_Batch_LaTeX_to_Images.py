@@ -1,12 +1,18 @@
+import json
 import os
 
 import streamlit as st
 
-from tex2imgs.utils import read_tex
+from tex2imgs.supervisor import RenderAborted, streamlit_cancel
+from tex2imgs.utils import read_tex, render_limits
 
 
 st.set_page_config(page_title="Batch LaTeX to Images", page_icon="logo.png")
 
+# A runaway question (e.g. an endless tikz loop) must not block the server.
+# Same limits as the command line
+RENDER_LIMITS = render_limits(json.load(open("config.json")))
+
 
 if "uploader_key" not in st.session_state:
     st.session_state.uploader_key = 0
@@ -49,10 +55,16 @@ if file is not None:
         path_output="output.zip",
         score_good=1.0,
         score_bad=None,
+        cancel=streamlit_cancel(),
+        **RENDER_LIMITS,
     )
 
-    for progress in generator:
-        bar.progress(progress)
+    try:
+        for progress in generator:
+            bar.progress(progress)
+    except (ValueError, RenderAborted) as exc:
+        st.error(f"Could not render the questions: {exc}")
+        st.stop()
 
     with open("output.zip", "rb") as fp:
         st.download_button(
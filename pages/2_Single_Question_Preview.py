@@ -1,13 +1,24 @@
-import os
-import shutil
+import json
 
 import streamlit as st
 
-from tex2imgs.utils import read_tex
+from tex2imgs.coalesce import RenderBatcher
+from tex2imgs.supervisor import RenderAborted
+from tex2imgs.utils import parse_questions, render_limits
 
 
 st.set_page_config(page_title="Single Question Preview", page_icon="logo.png")
 
+# The preview reruns on every edit: keep a bad question from hanging it
+RENDER_LIMITS = render_limits(json.load(open("config.json")), preview=True)
+
+
+# Shared by every session: previews requested at the same time are compiled
+# as one document, which saves most of the pdflatex start-up cost
+@st.cache_resource
+def render_batcher():
+    return RenderBatcher(window=0.05, **RENDER_LIMITS)
+
 
 st.title("Single Question Preview")
 st.write(
@@ -42,31 +53,33 @@ col1, col2 = st.columns(2)
 aspectratio = col1.selectbox("Aspect Ratio", ["4:1", "3:1", "16:9", "16:10", "4:3"])
 # DPI
 dpi = col2.number_input("DPI", value=100, min_value=10, max_value=1000, step=10)
+fast = st.checkbox(
+    "Fast preview",
+    help=(
+        "Draw questions made of plain text and inline math with matplotlib "
+        "instead of LaTeX. The fonts and spacing differ from the batch "
+        "images; other questions are still rendered with LaTeX."
+    ),
+)
 
-# Run on real time
-path_file = "temp.tex"
-path_folder = "temp"
 # Include the \begin{question} and \end{question} tags
 latex_expression = r"\begin{question}" + latex_expression + r"\end{question}"
+questions, errors = parse_questions(latex_expression.splitlines(keepends=True))
+if errors or not questions:
+    st.error("Could not read the question. Check the \\choice lines.")
+    st.stop()
 
-# Generate a tex file containing the LaTeX expression
-with open(path_file, "w") as f:
-    f.write(latex_expression)
 # Generate the image
-gen = read_tex(
-    path_file, path_folder, aspectratio=int(aspectratio.replace(":", "")), dpi=dpi
-)
-for _ in gen:
-    pass
-
-# Find the png image inside the folder
-for file in os.listdir(path_folder):
-    if file.endswith(".png"):
-        path_img = os.path.join(path_folder, file)
-        break
+try:
+    page = render_batcher().render(
+        questions[0].body,
+        aspectratio=int(aspectratio.replace(":", "")),
+        dpi=dpi,
+        render_mode="mathtext" if fast else "pdf",
+    )
+except (ValueError, RenderAborted) as exc:
+    st.error(f"Could not render the question: {exc}")
+    st.stop()
 
 # Display the image
-st.image(path_img)
-
-os.remove(path_file)
-shutil.rmtree(path_folder)
+st.image(page.image)
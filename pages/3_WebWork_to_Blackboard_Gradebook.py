@@ -1,4 +1,6 @@
+import hashlib
 import html
+import math
 from pathlib import Path
 
 import streamlit as st
@@ -6,8 +8,9 @@ import streamlit as st
 from tex2imgs.webwork_to_blackboard import (
     clean,
     convert_rows,
+    delta_rows,
+    encode_rows,
     read_csv_bytes,
-    rows_to_csv_bytes,
 )
 
 st.set_page_config(page_title="WebWork to Blackboard Gradebook", page_icon="logo.png")
@@ -15,6 +18,11 @@ st.set_page_config(page_title="WebWork to Blackboard Gradebook", page_icon="logo
 
 RESULT_KEY = "webwork_blackboard_conversion"
 SIGNATURE_KEY = "webwork_blackboard_signature"
+PAGE_KEY = "webwork_blackboard_preview_page"
+# Parsed files and conversions are shared by all sessions, keyed by content
+# hash; Streamlit evicts the oldest entries beyond this bound.
+CACHE_ENTRIES = 32
+PREVIEW_ROWS = 25
 EXAMPLES_DIR = Path(__file__).resolve().parents[1] / "examples"
 SAMPLE_FILES = [
     (
@@ -31,21 +39,85 @@ SAMPLE_FILES = [
 ]
 
 
-def uploaded_signature(blackboard_file, webwork_file, blackboard_bytes, webwork_bytes):
-    return (
-        blackboard_file.name if blackboard_file else None,
-        len(blackboard_bytes or b""),
-        webwork_file.name if webwork_file else None,
-        len(webwork_bytes or b""),
-    )
+def content_digest(data):
+    if not data:
+        return None
+    return hashlib.sha256(data).hexdigest()
+
+
+def uploaded_signature(blackboard_digest, webwork_digest, previous_digest=None):
+    return (blackboard_digest, webwork_digest, previous_digest)
+
 
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def parse_csv(digest, _data):
+    return read_csv_bytes(_data)
 
-def preview_table(rows, limit=10):
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def csv_header(digest, _data):
+    rows = parse_csv(digest, _data)
     if not rows:
+        return None
+    return [clean(cell) for cell in rows[0]]
+
+
+# A cached resource is shared rather than copied, so every session holding a
+# result points at the same encoded CSV. Treat the returned dict as read-only.
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner="Converting...")
+def cached_output(
+    blackboard_digest,
+    webwork_digest,
+    blackboard_key,
+    webwork_key,
+    delta_mode,
+    previous_digest,
+    _blackboard_data,
+    _webwork_data,
+    _previous_data,
+):
+    blackboard_rows = parse_csv(blackboard_digest, _blackboard_data)
+    result = convert_rows(
+        blackboard_rows=blackboard_rows,
+        webwork_rows=parse_csv(webwork_digest, _webwork_data),
+        blackboard_key=blackboard_key,
+        webwork_key=webwork_key,
+    )
+    out_rows = result.rows
+    delta = None
+    if delta_mode:
+        if previous_digest is not None:
+            previous_rows = parse_csv(previous_digest, _previous_data)
+        else:
+            previous_rows = blackboard_rows
+        delta = delta_rows(result, previous_rows)
+        out_rows = delta.rows
+    return {
+        "data": encode_rows(out_rows),
+        "matched": result.matched,
+        "unmatched": result.unmatched,
+        "appended_columns": result.appended_columns,
+        "overwritten_headers": result.overwritten_headers,
+        "unmatched_blackboard_keys": result.unmatched_blackboard_keys,
+        "unmatched_webwork_keys": result.unmatched_webwork_keys,
+        "blackboard_key": result.blackboard_key,
+        "webwork_key": result.webwork_key,
+        "delta": (
+            None
+            if delta is None
+            else {
+                "changed_students": delta.changed_students,
+                "changed_headers": delta.changed_headers,
+            }
+        ),
+    }
+
+
+def preview_table(header, rows):
+    if not header:
         return ""
-    header = rows[0]
     preview_rows = []
-    for row in rows[1 : limit + 1]:
+    for row in rows:
         padded = list(row)
         while len(padded) < len(header):
             padded.append("")
@@ -114,6 +186,10 @@ with st.expander("How the conversion works", expanded=True):
    type the WebWork key column manually.
 5. Convert and download the new CSV. The output adds one column per WebWork
    project and leaves unmatched Blackboard students blank.
+6. To upload only what changed, tick **Only export changed scores**. The
+   output then keeps the key column plus the WebWork columns that changed,
+   for the students whose scores changed. Scores are compared with the
+   Blackboard CSV, or with the previously uploaded CSV if you provide it.
 """
     )
 
@@ -167,25 +243,19 @@ with col2:
 
 blackboard_bytes = blackboard_file.getvalue() if blackboard_file else None
 webwork_bytes = webwork_file.getvalue() if webwork_file else None
-signature = uploaded_signature(
-    blackboard_file, webwork_file, blackboard_bytes, webwork_bytes
-)
-if st.session_state.get(SIGNATURE_KEY) != signature:
-    st.session_state[SIGNATURE_KEY] = signature
-    st.session_state.pop(RESULT_KEY, None)
+blackboard_digest = content_digest(blackboard_bytes)
+webwork_digest = content_digest(webwork_bytes)
 
-blackboard_rows = None
 blackboard_key = None
 can_convert = bool(blackboard_bytes and webwork_bytes)
 
 if blackboard_bytes:
     try:
-        blackboard_rows = read_csv_bytes(blackboard_bytes)
-        if not blackboard_rows:
+        header = csv_header(blackboard_digest, blackboard_bytes)
+        if header is None:
             can_convert = False
             st.error("The Blackboard CSV is empty.")
         else:
-            header = [clean(cell) for cell in blackboard_rows[0]]
             key_options = ["Auto-detect"] + header
             key_choice = st.selectbox("Blackboard key column", key_options)
             if key_choice != "Auto-detect":
@@ -207,31 +277,44 @@ webwork_key = st.text_input(
     help="Leave blank unless your WebWork export uses a custom key column name.",
 )
 
+delta_mode = st.checkbox(
+    "Only export changed scores",
+    key="webwork_blackboard_delta",
+    help="Create a partial upload with the key column and the changed WebWork "
+    "columns for the students whose scores changed.",
+)
+previous_file = None
+if delta_mode:
+    previous_file = st.file_uploader(
+        "Previously uploaded CSV (optional)",
+        type=["csv"],
+        key="webwork_blackboard_previous_csv",
+        help="Leave empty to compare against the Blackboard CSV above.",
+    )
+
+previous_bytes = previous_file.getvalue() if previous_file else None
+previous_digest = content_digest(previous_bytes)
+signature = uploaded_signature(blackboard_digest, webwork_digest, previous_digest) + (
+    delta_mode,
+)
+if st.session_state.get(SIGNATURE_KEY) != signature:
+    st.session_state[SIGNATURE_KEY] = signature
+    st.session_state.pop(RESULT_KEY, None)
+
 if st.button("Convert CSV", type="primary", disabled=not can_convert):
     try:
-        if blackboard_rows is None:
-            blackboard_rows = read_csv_bytes(blackboard_bytes or b"")
-        webwork_rows = read_csv_bytes(webwork_bytes or b"")
-        result = convert_rows(
-            blackboard_rows=blackboard_rows,
-            webwork_rows=webwork_rows,
-            blackboard_key=blackboard_key,
-            webwork_key=clean(webwork_key) or None,
+        st.session_state[RESULT_KEY] = cached_output(
+            blackboard_digest,
+            webwork_digest,
+            blackboard_key,
+            clean(webwork_key) or None,
+            delta_mode,
+            previous_digest,
+            blackboard_bytes,
+            webwork_bytes,
+            previous_bytes,
         )
-        st.session_state[RESULT_KEY] = {
-            "data": rows_to_csv_bytes(result.rows),
-            "matched": result.matched,
-            "unmatched": result.unmatched,
-            "appended_columns": result.appended_columns,
-            "overwritten_headers": getattr(result, "overwritten_headers", []),
-            "unmatched_blackboard_keys": getattr(
-                result, "unmatched_blackboard_keys", []
-            ),
-            "unmatched_webwork_keys": getattr(result, "unmatched_webwork_keys", []),
-            "blackboard_key": result.blackboard_key,
-            "webwork_key": result.webwork_key,
-            "rows": result.rows,
-        }
+        st.session_state[PAGE_KEY] = 1
     except ValueError as exc:
         st.session_state.pop(RESULT_KEY, None)
         st.error(str(exc))
@@ -249,6 +332,16 @@ if conversion:
         f"and WebWork `{conversion['webwork_key']}`."
     )
 
+    delta = conversion.get("delta")
+    if delta is not None:
+        if delta["changed_students"]:
+            st.info(
+                f"Partial upload: {delta['changed_students']} students with "
+                f"changed scores in {format_code_list(delta['changed_headers'])}."
+            )
+        else:
+            st.warning("No WebWork scores changed since the previous upload.")
+
     overwritten_headers = conversion.get("overwritten_headers", [])
     if overwritten_headers:
         st.error(
@@ -273,11 +366,32 @@ if conversion:
 
     st.download_button(
         "Download Blackboard CSV",
-        data=conversion["data"],
-        file_name="blackboard_with_webwork.csv",
+        data=conversion["data"].data,
+        file_name=(
+            "blackboard_webwork_changes.csv"
+            if conversion.get("delta") is not None
+            else "blackboard_with_webwork.csv"
+        ),
         mime="text/csv",
     )
 
-    table = preview_table(conversion["rows"])
-    if table:
-        st.markdown(table, unsafe_allow_html=True)
+    encoded = conversion["data"]
+    total_rows = len(encoded) - 1
+    if total_rows > 0:
+        pages = math.ceil(total_rows / PREVIEW_ROWS)
+        page = 1
+        if pages > 1:
+            page = st.number_input(
+                f"Preview page (of {pages})",
+                min_value=1,
+                max_value=pages,
+                step=1,
+                key=PAGE_KEY,
+            )
+        # Only the header and the visible slice are decoded and rendered.
+        start = 1 + (page - 1) * PREVIEW_ROWS
+        table = preview_table(
+            encoded.rows(0, 1)[0], encoded.rows(start, start + PREVIEW_ROWS)
+        )
+        if table:
+            st.markdown(table, unsafe_allow_html=True)
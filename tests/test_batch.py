@@ -0,0 +1,27 @@
+from PIL import Image
+
+from tex2imgs import utils
+from tex2imgs.batch import render_job
+
+QUESTION = r"""
+\begin{question}
+What is $1+1$?
+\choice[!]{2}
+\choice{3}
+\end{question}
+"""
+
+
+def test_render_job_counts_questions(tmp_path, monkeypatch):
+    def render_images(questions, ls_groups, workdir, **params):
+        for group in ls_groups:
+            yield group, Image.new("RGB", (8, 4), "white"), 0
+
+    monkeypatch.setattr(utils, "render_images", render_images)
+    path_file = tmp_path / "bank.tex"
+    path_file.write_text(QUESTION * 4)
+    params = dict(figure_cache=None)
+    # Four identical questions are one render group
+    assert render_job(str(path_file), str(tmp_path / "out"), params)[0] == 4
+    # Resumed from the checkpoint, with nothing left to render
+    assert render_job(str(path_file), str(tmp_path / "out"), params)[0] == 4
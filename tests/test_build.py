@@ -0,0 +1,61 @@
+import filecmp
+import os
+
+import pytest
+from PIL import Image
+
+from tex2imgs import utils
+from tex2imgs.utils import Question, build_questions
+
+COLORS = {"a": "red", "b": "blue", "c": "green"}
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """Stub the renderer: one image per group, colored by the body."""
+    calls = []
+
+    def render_images(questions, ls_groups, workdir, **params):
+        calls.append([[questions[i].name for i in group] for group in ls_groups])
+        for group in ls_groups:
+            body = questions[group[0]].body
+            yield group, Image.new("RGB", (8, 4), COLORS[body]), 4
+
+    monkeypatch.setattr(utils, "render_images", render_images)
+    return calls
+
+
+def build(path_output, bodies):
+    questions = [
+        Question(name=f"Q{i:03d}", body=body, scores={"Item": f"Q{i:03d}"})
+        for i, body in enumerate(bodies, start=1)
+    ]
+    for _ in build_questions(questions, path_output, figure_cache=None):
+        pass
+
+
+def color(path):
+    return Image.open(path).convert("RGB").getpixel((0, 0))
+
+
+def test_identical_questions_render_once(tmp_path, rendered):
+    build(str(tmp_path), ["a", "b", "a"])
+    assert rendered == [[["Q001", "Q003"], ["Q002"]]]
+    for name in ["Q001", "Q002", "Q003"]:
+        assert os.path.exists(tmp_path / f"{name}.png")
+    assert filecmp.cmp(tmp_path / "Q001.png", tmp_path / "Q003.png", shallow=False)
+    assert color(tmp_path / "Q002.png") == (0, 0, 255)
+    rows = (tmp_path / "sizes.csv").read_text().splitlines()
+    assert sorted(rows[1:]) == ["Q001,4", "Q002,4", "Q003,4"]
+
+
+def test_editing_a_duplicate_keeps_the_other(tmp_path, rendered):
+    build(str(tmp_path), ["a", "a"])
+    before = (tmp_path / "Q002.png").read_bytes()
+    # Q001 held the shared file: rendering it again must not touch Q002
+    build(str(tmp_path), ["c", "a"])
+    assert rendered[-1] == [["Q001"]]
+    assert color(tmp_path / "Q001.png") == (0, 128, 0)
+    assert (tmp_path / "Q002.png").read_bytes() == before
+    assert color(tmp_path / "Q002.png") == (255, 0, 0)
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".part")]
@@ -0,0 +1,40 @@
+import os
+
+from tex2imgs.checkpoint import CHECKPOINT_FILE, Checkpoint, read_checkpoint
+
+
+def test_resume_skips_written_questions(tmp_path):
+    (tmp_path / "Q1.png").write_bytes(b"png")
+    checkpoint = Checkpoint(str(tmp_path), "key")
+    checkpoint.add("Q1", "digest1", 10, 20, 30)
+    checkpoint.add("Q2", "digest2", 11, 21, 31)
+    checkpoint.close()
+    # Interrupted while writing a line
+    with open(tmp_path / CHECKPOINT_FILE, "a") as f:
+        f.write('{"name": "Q3", "dig')
+
+    checkpoint = Checkpoint(str(tmp_path), "key")
+    path = str(tmp_path / "Q1.png")
+    assert checkpoint.completed("Q1", "digest1", path) == dict(
+        name="Q1", digest="digest1", size=10, width=20, height=30
+    )
+    # Edited question, missing image, unknown question
+    assert checkpoint.completed("Q1", "edited", path) is None
+    assert checkpoint.completed("Q2", "digest2", str(tmp_path / "Q2.png")) is None
+    assert checkpoint.completed("Q3", "digest3", path) is None
+    checkpoint.close()
+    # The cut line is dropped when the checkpoint is rewritten
+    assert list(read_checkpoint(str(tmp_path))) == ["Q1", "Q2"]
+
+
+def test_other_parameters_start_over(tmp_path):
+    (tmp_path / "Q1.png").write_bytes(b"png")
+    checkpoint = Checkpoint(str(tmp_path), "key")
+    checkpoint.add("Q1", "digest1", 10, 20, 30)
+    checkpoint.close()
+
+    checkpoint = Checkpoint(str(tmp_path), "other key")
+    assert checkpoint.completed("Q1", "digest1", str(tmp_path / "Q1.png")) is None
+    checkpoint.close()
+    assert read_checkpoint(str(tmp_path)) == {}
+    assert os.path.exists(tmp_path / CHECKPOINT_FILE)
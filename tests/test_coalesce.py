@@ -0,0 +1,67 @@
+import json
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from tex2imgs import coalesce
+from tex2imgs.supervisor import RenderTimeout
+
+
+class FakeBackend:
+    def pages(self, path_pdf, dpi, last_page):
+        with open(path_pdf) as f:
+            bodies = json.load(f)
+        return [Image.new("RGB", (10, 10), "white") for _ in bodies[:last_page]]
+
+
+@pytest.fixture
+def compiled(monkeypatch):
+    """Record the bodies of every document, and fail like pdflatex would."""
+    calls = []
+    lock = threading.Lock()
+
+    def compile_pdf(bodies, document, workdir, cache_dir=None, supervisor=None):
+        with lock:
+            calls.append(list(bodies))
+        if any("SLOW" in body for body in bodies):
+            raise RenderTimeout("pdflatex timed out")
+        if any("BAD" in body for body in bodies):
+            raise ValueError("Error executing command: pdflatex")
+        path_pdf = os.path.join(workdir, "batch.pdf")
+        with open(path_pdf, "w") as f:
+            json.dump(bodies, f)
+        return path_pdf
+
+    monkeypatch.setattr(coalesce, "compile_pdf", compile_pdf)
+    monkeypatch.setattr(coalesce, "get_backend", lambda *a, **k: FakeBackend())
+    return calls
+
+
+def render_all(bodies):
+    batcher = coalesce.RenderBatcher(window=0.5, workers=2, figure_cache=None)
+    futures = [batcher.submit(body) for body in bodies]
+    batcher.close()
+    return futures
+
+
+def test_failed_batch_is_bisected(compiled):
+    bodies = ["Q1", "Q2", "BAD", "Q4", "Q5", "Q6", "Q7", "Q8"]
+    futures = render_all(bodies)
+    for body, future in zip(bodies, futures):
+        if body == "BAD":
+            with pytest.raises(ValueError):
+                future.result(timeout=0)
+        else:
+            assert isinstance(future.result(timeout=0), coalesce.RenderedPage)
+    # 8 -> 4 + 4 -> 2 + 2 -> 1 + 1, instead of 1 + 8 documents
+    assert sorted(len(call) for call in compiled) == [1, 1, 2, 2, 4, 4, 8]
+
+
+def test_aborted_batch_fails_at_once(compiled):
+    futures = render_all(["Q1", "SLOW", "Q3"])
+    for future in futures:
+        with pytest.raises(RenderTimeout):
+            future.result(timeout=0)
+    assert compiled == [["Q1", "SLOW", "Q3"]]
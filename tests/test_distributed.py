@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from tex2imgs import distributed
+from tex2imgs.utils import Question
+
+
+def make_question(name, source=None):
+    return Question(name=name, body="x", scores={"Item": name}, source=source)
+
+
+@pytest.fixture
+def server():
+    server = distributed.make_server("127.0.0.1", 0, figure_cache=None, timeout=5)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("name", ["", "..", "../escape", "/tmp/x", "a\\b"])
+def test_worker_rejects_paths_in_names(name):
+    with pytest.raises(ValueError, match="Invalid question name"):
+        distributed.worker_questions([{"name": name, "body": "x", "scores": {}}])
+
+
+def test_worker_drops_source_paths():
+    questions = distributed.worker_questions(
+        [{"name": "Q1", "body": "x", "scores": {}, "source": "/home/me/bank.tex"}]
+    )
+    assert questions[0].source is None
+
+
+def test_render_shard_rejects_local_params(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("build_questions called")
+
+    monkeypatch.setattr(distributed, "build_questions", fail)
+    for key in ["path_index", "figure_cache", "timeout", "path_output"]:
+        with pytest.raises(ValueError, match="not allowed"):
+            distributed.render_shard([make_question("Q1")], {key: "/tmp/x"})
+
+
+def test_worker_uses_its_own_settings(server, monkeypatch):
+    calls = []
+
+    def build(questions, folder, **params):
+        calls.append(params)
+        raise ValueError("stop")
+
+    monkeypatch.setattr(distributed, "build_questions", build)
+    url = f"http://127.0.0.1:{server.server_port}"
+    with pytest.raises(ValueError, match="stop"):
+        distributed.post_shard(url, [make_question("Q1")], {"dpi": 100}, 5)
+    assert calls == [
+        dict(dpi=100, figure_cache=None, timeout=5, memory_mb=None, cpu_seconds=None)
+    ]
+
+    with pytest.raises(ValueError, match="not allowed"):
+        distributed.post_shard(
+            url, [make_question("Q1")], {"path_index": "/etc/index.db"}, 5
+        )
+    assert len(calls) == 1
@@ -0,0 +1,53 @@
+import os
+
+from tex2imgs import figures
+
+PICTURE = r"\begin{tikzpicture}\draw (0,0) -- (\len,0);\end{tikzpicture}"
+
+
+def test_find_definitions():
+    text = (
+        r"Let \newcommand{\f}[1][0]{x^{#1}} and \def\g#1#2{#1+#2}"
+        r"\let\a=\b then \tikzset{my/.style={red}} \definecolor{c}{rgb}{1,0,0}"
+    )
+    assert figures.find_definitions(text) == [
+        r"\newcommand{\f}[1][0]{x^{#1}}",
+        r"\def\g#1#2{#1+#2}",
+        r"\let\a=\b",
+        r"\tikzset{my/.style={red}}",
+    ]
+
+
+def test_figure_key_depends_on_body_definitions():
+    def keys(body):
+        return figures.name_figures(body, "preamble")[1]
+
+    key = keys(r"\newcommand{\len}{2} Draw: " + PICTURE)
+    # Editing the text keeps the key, editing the macro changes it
+    assert keys(r"\newcommand{\len}{2} Draw it: " + PICTURE) == key
+    assert keys(r"\newcommand{\len}{3} Draw: " + PICTURE) != key
+    # Definitions after the picture cannot change it
+    assert keys(PICTURE + r" \def\x{1}") == keys(PICTURE + r" \def\x{2}")
+    # Bodies without definitions keep the keys of existing caches
+    assert keys(PICTURE) == [figures.figure_key("preamble", PICTURE)]
+
+
+def test_store_figure_publishes_pdf_last(tmp_path, monkeypatch):
+    workdir = tmp_path / "work"
+    cache_dir = tmp_path / "cache"
+    (workdir / figures.FIGURE_DIR).mkdir(parents=True)
+    cache_dir.mkdir()
+    for extension in [".pdf", ".dpth"]:
+        (workdir / figures.FIGURE_DIR / ("key" + extension)).write_text(extension)
+
+    published = []
+    replace = os.replace
+
+    def record(src, dst):
+        published.append(os.path.basename(dst))
+        replace(src, dst)
+
+    monkeypatch.setattr(figures.os, "replace", record)
+    figures.store_figure(str(cache_dir), "key", str(workdir))
+    assert published == ["key.dpth", "key.pdf"]
+    assert sorted(os.listdir(cache_dir)) == ["key.dpth", "key.pdf"]
@@ -0,0 +1,44 @@
+import pytest
+
+from tex2imgs.includes import read_source_tree
+
+
+def write(folder, name, text):
+    path = folder / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def test_includes_are_expanded_in_place(tmp_path):
+    root = write(tmp_path, "main.tex", "a\n\\input{topics/one}\nb\n")
+    # Paths are relative to the main file, also in nested includes
+    one = write(tmp_path, "topics/one.tex", "c\n\\include{topics/two.tex}\n")
+    two = write(tmp_path, "topics/two.tex", "d\n")
+    tree = read_source_tree(root)
+    assert tree.lines == ["a\n", "c\n", "d\n", "b\n"]
+    assert tree.origins == [(root, 1), (one, 1), (two, 1), (root, 3)]
+    assert tree.includes == {root: [one], one: [two], two: []}
+    assert tree.missing == {}
+
+
+def test_missing_include_is_left_to_tex(tmp_path):
+    root = write(tmp_path, "main.tex", "a\n\\input{glyphtounicode}\nb\n")
+    with pytest.warns(UserWarning, match="glyphtounicode.tex, included by"):
+        tree = read_source_tree(root)
+    assert tree.lines == ["a\n", "\\input{glyphtounicode}\n", "b\n"]
+    assert tree.origins == [(root, 1), (root, 2), (root, 3)]
+    assert tree.includes == {root: []}
+    assert tree.missing == {str(tmp_path / "glyphtounicode.tex"): root}
+
+
+def test_include_cycle_raises(tmp_path):
+    root = write(tmp_path, "main.tex", "\\input{one}\n")
+    write(tmp_path, "one.tex", "\\input{main}\n")
+    with pytest.raises(ValueError, match="Include cycle"):
+        read_source_tree(root)
+
+
+def test_missing_main_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_source_tree(str(tmp_path / "main.tex"))
@@ -0,0 +1,55 @@
+import os
+
+from tex2imgs.index import (
+    group_by_source,
+    query_index,
+    source_outputs,
+    update_index,
+)
+from tex2imgs.utils import Question
+
+
+def question(name, source, line=1):
+    return Question(
+        name=name,
+        body=f"\\begin{{frame}}{name}\\end{{frame}}",
+        scores={},
+        source=source,
+        line=line,
+    )
+
+
+def record(q, size):
+    return dict(question=q, width=100, height=50, size=size)
+
+
+def test_update_index_keeps_one_row_per_output(tmp_path):
+    path_index = str(tmp_path / "questions.db")
+    q = question("Algebra_Q001", "/bank/algebra.tex")
+    update_index(path_index, [record(q, 10)], str(tmp_path / "169"), 169, 200)
+    update_index(path_index, [record(q, 30)], str(tmp_path / "43"), 43, 100)
+    rows = query_index(path_index)
+    assert sorted(row["size"] for row in rows) == [10, 30]
+    (row,) = query_index(path_index, aspectratio=43)
+    assert row["size"] == 30 and row["dpi"] == 100
+    (row,) = query_index(path_index, output=str(tmp_path / "169"))
+    assert row["size"] == 10
+
+
+def test_render_outputs_separate_sources(tmp_path):
+    path_index = str(tmp_path / "questions.db")
+    a = question("Algebra_Q001", "/bank/algebra/main.tex")
+    b = question("Algebra_Q001", "/bank/geometry/main.tex")
+    update_index(path_index, [record(a, 1), record(b, 2)], "/out/169", 169, 200)
+    update_index(path_index, [record(a, 3)], "/out/43", 43, 200)
+    dict_sources = group_by_source(query_index(path_index))
+    assert {k: len(v) for k, v in dict_sources.items()} == {
+        "/bank/algebra/main.tex": 1,
+        "/bank/geometry/main.tex": 1,
+    }
+    outputs = source_outputs("out", dict_sources)
+    assert sorted(outputs) == [
+        os.path.join("out", "algebra", "main"),
+        os.path.join("out", "geometry", "main"),
+    ]
+    assert source_outputs("out.zip", {"/bank/a.tex": [a]}) == {"out.zip": [a]}
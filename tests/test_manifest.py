@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+import zipfile
+
+from typer.testing import CliRunner
+
+from tex2imgs.manifest import (
+    MANIFEST_FILE,
+    app,
+    diff_manifests,
+    read_manifest,
+    write_manifest,
+)
+from tex2imgs.utils import Question
+
+
+def build(folder, images):
+    """Write images and their manifest to a folder, as a render would."""
+    folder.mkdir()
+    records = []
+    for name, data in images.items():
+        (folder / f"{name}.png").write_bytes(data)
+        question = Question(name=name, body=data.decode(), scores={})
+        records.append(
+            dict(question=question, width=1, height=1, size=1, file=f"{name}.png")
+        )
+    write_manifest(str(folder), records, dict(dpi=200))
+    return str(folder)
+
+
+def test_diff_manifests(tmp_path):
+    old = build(tmp_path / "old", {"Q1": b"a", "Q2": b"b", "Q3": b"c"})
+    new = build(tmp_path / "new", {"Q1": b"a", "Q2": b"B", "Q4": b"d"})
+    diff = diff_manifests(read_manifest(old), read_manifest(new))
+    assert diff.added == ["Q4.png"]
+    assert diff.changed == ["Q2.png"]
+    assert diff.removed == ["Q3.png"]
+    assert diff.unchanged == ["Q1.png"]
+
+
+def test_diff_command_packages_changes(tmp_path):
+    old = build(tmp_path / "old", {"Q1": b"a", "Q2": b"b", "Q3": b"c"})
+    new = build(tmp_path / "new", {"Q1": b"a", "Q2": b"B", "Q4": b"d"})
+    path_zip = str(tmp_path / "changes.zip")
+    result = CliRunner().invoke(app, ["diff", old, new, "--output", path_zip])
+    assert result.exit_code == 0, result.output
+    assert "1 added, 1 changed, 1 removed, 1 unchanged" in result.output
+    assert "Removed: Q3.png" in result.output
+    with zipfile.ZipFile(path_zip) as zipf:
+        assert sorted(zipf.namelist()) == sorted(
+            ["Q4.png", "Q2.png", MANIFEST_FILE, "changes.csv"]
+        )
+        assert zipf.read("Q2.png") == b"B"
+        assert json.loads(zipf.read(MANIFEST_FILE)) == read_manifest(new)
+        rows = list(csv.reader(io.StringIO(zipf.read("changes.csv").decode())))
+    assert rows == [
+        ["File", "Change"],
+        ["Q4.png", "added"],
+        ["Q2.png", "changed"],
+        ["Q3.png", "removed"],
+    ]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from tex2imgs.mathtext import parse_mathtext, render_mathtext, slide_size_cm
+
+
+def frame(text):
+    return "\\begin{frame}" + text + "\\end{frame}"
+
+
+def test_parse_supported_body():
+    lines = parse_mathtext(frame(r"What is $2x$? \\ \textbf{A.} 50\% {5}"))
+    # Lines of words, words of (text, bold, math) runs
+    assert lines == [
+        [
+            [("What", False, False)],
+            [("is", False, False)],
+            [("$2x$", False, True), ("?", False, False)],
+        ],
+        [
+            [("A.", True, False)],
+            [("50", False, False), ("%", False, False)],
+            [("5", False, False)],
+        ],
+    ]
+
+
+def test_slide_size():
+    assert slide_size_cm(169) == (16, 9)
+    assert slide_size_cm(43) == (12.8, 12.8 * 3 / 4)
+    assert slide_size_cm(1610) == (16, 10)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "What is $2x$?",  # Not a frame
+        frame(r"\includegraphics{plot.png}"),
+        frame(r"\begin{tikzpicture}\draw (0,0) -- (1,1);\end{tikzpicture}"),
+        frame(r"Solve $\notacommand{x}$"),
+        frame(r"From 1--2"),
+        frame(r"A~tie"),
+        frame(r"\textbf{$x$}"),
+    ],
+)
+def test_parse_unsupported_body_falls_back(body):
+    assert parse_mathtext(body) is None
+
+
+@pytest.mark.parametrize("aspectratio, dpi", [(169, 100), (43, 200)])
+def test_render_has_slide_size(aspectratio, dpi):
+    width_cm, height_cm = slide_size_cm(aspectratio)
+    img = render_mathtext(parse_mathtext(frame("What is $2x$?")), aspectratio, dpi=dpi)
+    assert img.mode == "RGB"
+    assert img.size == (int(width_cm / 2.54 * dpi), int(height_cm / 2.54 * dpi))
+    pixels = np.asarray(img)
+    # Some text, left margin of 1 cm
+    assert (pixels < 255).any()
+    assert (pixels[:, : int(dpi / 2.54) - 1] == 255).all()
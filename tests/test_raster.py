@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+from tex2imgs.raster import read_ppm, svg_size
+
+
+def ppm(width, height, pixel=b"\x01\x02\x03", comment=b""):
+    header = b"P6\n" + comment + b"%d %d\n255\n" % (width, height)
+    return header + pixel * (width * height)
+
+
+def test_read_ppm_pages_back_to_back():
+    stream = io.BytesIO(ppm(3, 2) + ppm(1, 4, b"\xff\x00\x00", b"# page 2\n"))
+    first = read_ppm(stream)
+    assert first.mode == "RGB" and first.size == (3, 2)
+    assert first.getpixel((2, 1)) == (1, 2, 3)
+    second = read_ppm(stream)
+    assert second.size == (1, 4)
+    assert second.getpixel((0, 3)) == (255, 0, 0)
+    assert read_ppm(stream) is None
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b"P3\n1 1\n255\n", "Expected a PPM image"),
+        (b"P6\n1 1", "Truncated PPM header"),
+        (b"P6\n1 1\n65535\n", "Unsupported PPM maxval"),
+        (b"P6\n2 1\n255\n\x00\x00\x00", "Truncated PPM image"),
+    ],
+)
+def test_read_ppm_errors(data, message):
+    with pytest.raises(ValueError, match=message):
+        read_ppm(io.BytesIO(data))
+
+
+@pytest.mark.parametrize(
+    "root, size",
+    [
+        ("<svg width='120.5pt' height='30pt' viewBox='0 0 1 1'>", (120.5, 30)),
+        ('<svg height="30" stroke-width="2" width="40">', (40, 30)),
+        ('<svg viewBox="-1.5 -2 72.25 14.5">', (72.25, 14.5)),
+        ('<svg width="100%" height="100%" viewBox="0,0,50,20">', (50, 20)),
+    ],
+)
+def test_svg_size(tmp_path, root, size):
+    path = tmp_path / "page.svg"
+    path.write_text("<?xml version='1.0'?>\n" + root + "<g/></svg>")
+    assert svg_size(str(path)) == size
+
+
+def test_svg_size_errors(tmp_path):
+    path = tmp_path / "page.svg"
+    path.write_text("<html></html>")
+    with pytest.raises(ValueError, match="No <svg> element"):
+        svg_size(str(path))
+    path.write_text("<svg width='10pt'></svg>")
+    with pytest.raises(ValueError, match="nor viewBox"):
+        svg_size(str(path))
@@ -0,0 +1,58 @@
+import pytest
+from PIL import Image
+
+from tex2imgs import render
+
+SOURCE = r"""
+\begin{question}
+Draw: \begin{tikzpicture}\draw (0,0) -- (1,1);\end{tikzpicture}
+\choice[!]{1}
+\choice{2}
+\end{question}
+\begin{question}
+What is $1+1$?
+\choice[!]{2}
+\choice{3}
+\end{question}
+\begin{question}
+Draw: \begin{tikzpicture}\draw (0,0) -- (1,1);\end{tikzpicture}
+\choice[!]{1}
+\choice{2}
+\end{question}
+"""
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Render the groups in reverse order, like mathtext before pdflatex."""
+    calls = []
+
+    def render_images(questions, ls_groups, workdir, **params):
+        calls.append((questions, ls_groups, params))
+        for group in reversed(ls_groups):
+            yield group, Image.new("RGB", (4, 2 + group[0]), "white"), group[0]
+
+    monkeypatch.setattr(render, "render_images", render_images)
+    return calls
+
+
+def test_questions_come_in_source_order(calls):
+    rendered = list(render.render_questions(SOURCE, render_mode="mathtext"))
+    assert [r.name for r in rendered] == ["Q001", "Q002", "Q003"]
+    # Identical questions share their image
+    assert [r.size for r in rendered] == [0, 1, 0]
+    assert calls[0][1] == [[0, 2], [1]]
+
+
+def test_no_figure_cache_by_default(calls):
+    list(render.render_questions(SOURCE))
+    assert calls[0][2]["figure_cache"] is None
+
+
+def test_source_lines_with_or_without_newlines(calls):
+    lines = SOURCE.splitlines()
+    for source in [lines, SOURCE.splitlines(keepends=True)]:
+        rendered = list(render.render_questions(source))
+        assert [r.name for r in rendered] == ["Q001", "Q002", "Q003"]
+    bodies = [[q.body for q in call[0]] for call in calls]
+    assert bodies[0] == bodies[1]
@@ -0,0 +1,141 @@
+import json
+import zipfile
+
+import pytest
+from PIL import Image
+
+from tex2imgs.manifest import diff_manifests, read_manifest
+from tex2imgs.utils import (
+    QuestionFilter,
+    build_questions,
+    finish_output,
+    parse_questions,
+    parse_versions,
+    write_question_tables,
+)
+
+BANK = r"""
+\begin{multiplechoice}[title={Algebra}, resetcounter=no]
+\begin{question}
+Calculate $\frac{10}{20}$:
+\choice{2}
+\choice[!]{0.5}
+\end{question}
+\subsection{Linear, Equations}
+\begin{question}
+What is $2x$ when $x=3$?
+\choice{5}
+\choice[!]{6}
+\choice{7}
+\end{question}
+%topic=Roots
+%#original
+\begin{question}
+Solve $x+1=2$:
+\choice[!]{1}
+\choice{2}
+\end{question}
+\begin{question}
+Solve $x+2=3$:
+\choice[!]{1}
+\choice{2}
+\end{question}
+\end{multiplechoice}
+"""
+NAMES = [
+    "Algebra_Q001",
+    "Algebra_LinearEquations_Q001",
+    "Algebra_Roots_Q001_V01",
+    "Algebra_Roots_Q001_V02",
+]
+
+
+def parse(select=None):
+    questions, errors = parse_questions(
+        BANK.splitlines(keepends=True), score_noanswer=0, select=select
+    )
+    assert errors == []
+    return questions
+
+
+def test_parse_versions():
+    assert parse_versions("1-3, 5") == [(1, 3), (5, 5)]
+    for text in ["3-1", "a", "1-"]:
+        with pytest.raises(ValueError, match="Invalid version range"):
+            parse_versions(text)
+
+
+@pytest.mark.parametrize(
+    "select, names",
+    [
+        (QuestionFilter(), NAMES),
+        (QuestionFilter(subsections=["Linear*"]), NAMES[1:2]),
+        (QuestionFilter(subsections=["Linear, Equations"]), NAMES[1:2]),
+        (QuestionFilter(sections=["Geometry"]), []),
+        (QuestionFilter(questions=["*_V0[2-9]", "Algebra_Q*"]), NAMES[::3]),
+        # Questions without versions pass the version ranges
+        (QuestionFilter(versions="2"), NAMES[:2] + NAMES[3:]),
+    ],
+)
+def test_question_filter(select, names):
+    questions = parse(select)
+    assert [q.name for q in questions] == names
+    # Selected questions keep the names and scores of a full build
+    full = {q.name: q for q in parse()}
+    assert all(q.scores == full[q.name].scores for q in questions)
+
+
+def render(path_output, questions, dpi=200):
+    """Write fake images for the questions and finish the output."""
+    out_folder = path_output[:-4] if path_output.endswith(".zip") else path_output
+    merge = len(questions) < len(NAMES)
+    for i, question in enumerate(questions):
+        img = Image.new("RGB", (20, 10 + i), "white")
+        img.save(f"{out_folder}/{question.name}.png")
+    write_question_tables(out_folder, questions, path_output if merge else None)
+    finish_output(
+        path_output,
+        questions,
+        [10 + i for i in range(len(questions))],
+        [(20, 10 + i) for i in range(len(questions))],
+        config=dict(dpi=dpi),
+        merge=merge,
+    )
+
+
+@pytest.mark.parametrize("name", ["output", "output.zip"])
+def test_selection_merges_into_output(tmp_path, name):
+    path_output = str(tmp_path / name)
+    (tmp_path / "output").mkdir()
+    questions = parse()
+    render(path_output, questions)
+    full = read_manifest(path_output)
+
+    def read(file):
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(path_output) as zipf:
+                return zipf.read(file).decode("utf-8")
+        return (tmp_path / name / file).read_text()
+
+    tables = {f: read(f) for f in ["questions.csv", "questions_Algebra.csv"]}
+    if name.endswith(".zip"):
+        (tmp_path / "output").mkdir()
+    render(path_output, parse(QuestionFilter(questions=["*Linear*"])))
+
+    diff = diff_manifests(full, read_manifest(path_output))
+    assert diff.removed == [] and diff.added == []
+    assert diff.changed == ["Algebra_LinearEquations_Q001.png"]
+    assert {f: read(f) for f in tables} == tables
+    sizes = read("sizes.csv").splitlines()
+    assert sizes[0] == "Item,Size"
+    assert sorted(line.split(",")[0] for line in sizes[1:]) == sorted(NAMES)
+    assert json.loads(read("manifest.json"))["files"].keys() == full["files"].keys()
+
+
+def test_selection_needs_same_config(tmp_path):
+    path_output = str(tmp_path / "output")
+    (tmp_path / "output").mkdir()
+    render(path_output, parse())
+    gen = build_questions(parse(QuestionFilter(versions="1")), path_output, merge=True)
+    with pytest.raises(ValueError, match="rendered with other parameters"):
+        next(gen)
@@ -0,0 +1,86 @@
+import subprocess
+import sys
+
+import pytest
+
+from tex2imgs.supervisor import RenderKilled, RenderTimeout, Supervisor
+from tex2imgs.utils import render_limits
+
+linux = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="limits use prlimit"
+)
+
+
+@linux
+def test_limits_are_applied_without_preexec_fn(monkeypatch):
+    popen = subprocess.Popen
+
+    def checked_popen(cmd, **kwargs):
+        assert "preexec_fn" not in kwargs
+        return popen(cmd, **kwargs)
+
+    monkeypatch.setattr(subprocess, "Popen", checked_popen)
+    # Sleep first, so the limits are read after they were applied
+    code = (
+        "import resource, time; time.sleep(0.5); "
+        "print(*resource.getrlimit(resource.RLIMIT_CPU))"
+    )
+    proc = Supervisor(cpu_seconds=30).popen(
+        [sys.executable, "-c", code], stdout=subprocess.PIPE, text=True
+    )
+    out, _ = proc.communicate()
+    assert out.split() == ["30", "35"]
+
+
+@linux
+def test_cpu_limit_kill_raises_render_killed():
+    code = "import time\ntime.sleep(0.2)\nwhile True:\n    pass"
+    with pytest.raises(RenderKilled, match="SIGXCPU|SIGKILL"):
+        Supervisor(cpu_seconds=1).run([sys.executable, "-c", code])
+
+
+def test_signal_kill_raises_render_killed():
+    code = "import os, signal; os.kill(os.getpid(), signal.SIGKILL)"
+    with pytest.raises(RenderKilled, match="SIGKILL"):
+        Supervisor().run([sys.executable, "-c", code])
+
+
+def test_timeout_raises_render_timeout():
+    with pytest.raises(RenderTimeout):
+        Supervisor(timeout=0.5).run(
+            [sys.executable, "-c", "import time; time.sleep(30)"]
+        )
+
+
+def test_nonzero_exit_is_returned():
+    assert Supervisor().run([sys.executable, "-c", "raise SystemExit(3)"]) == 3
+
+
+def test_render_killed_is_not_retried_by_svg_fallback(monkeypatch, tmp_path):
+    from tex2imgs import utils
+
+    calls = []
+
+    def killed(*args, **kwargs):
+        calls.append(kwargs.get("engine", "pdflatex"))
+        raise RenderKilled("Killed by SIGXCPU: latex")
+
+    monkeypatch.setattr(utils, "compile_tex", killed)
+    with pytest.raises(RenderKilled):
+        utils.render_svg("document", str(tmp_path), 1)
+    assert calls == ["latex"]
+
+
+def test_render_limits_read_from_config():
+    dict_config = dict(
+        timeout=600,
+        memory_mb=4096,
+        cpu_seconds=600,
+        preview_limits=dict(timeout=60, cpu_seconds=60),
+    )
+    assert render_limits(dict_config) == dict(
+        timeout=600, memory_mb=4096, cpu_seconds=600
+    )
+    assert render_limits(dict_config, preview=True) == dict(
+        timeout=60, memory_mb=4096, cpu_seconds=60
+    )
@@ -0,0 +1,166 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+from tex2imgs import figures, raster, utils
+from tex2imgs.supervisor import Supervisor
+from tex2imgs.utils import (
+    Question,
+    build_document,
+    needs_pdf,
+    render_images,
+    tex_environment,
+)
+
+TEXT = r"What is $\frac{1}{2} + \frac{1}{3}$?"
+FIGURE = r"\begin{tikzpicture}\draw (0,0) -- (1,1);\end{tikzpicture}"
+GRAPHICS = r"\includegraphics[width=3cm]{plot.png}"
+FRAMES = [
+    "\\begin{frame}\nOne\n\\end{frame}\n",
+    "\\begin{frame}\nTwo\n\\end{frame}\n",
+]
+
+
+def test_tex_environment_searches_source_folders(tmp_path, monkeypatch):
+    monkeypatch.delenv("TEXINPUTS", raising=False)
+    monkeypatch.chdir(tmp_path)
+    bank = tmp_path / "bank"
+    sources = [str(bank / "main.tex"), str(bank / "topic.tex"), None]
+    env = tex_environment(sources)
+    # Compilation folder, then the source folder, then the current folder,
+    # then the default path (trailing separator)
+    assert env["TEXINPUTS"] == os.pathsep.join([".", str(bank), str(tmp_path), ""])
+
+
+def test_tex_environment_keeps_user_texinputs(monkeypatch):
+    monkeypatch.setenv("TEXINPUTS", "/opt/styles" + os.pathsep)
+    env = tex_environment()
+    assert env["TEXINPUTS"].endswith(os.pathsep + "/opt/styles" + os.pathsep)
+
+
+def test_supervisor_runs_with_env(tmp_path):
+    env = tex_environment([str(tmp_path / "bank.tex")])
+    cmd = [sys.executable, "-c", "import os; print(os.environ['TEXINPUTS'])"]
+    proc = Supervisor(env=env).popen(cmd, stdout=subprocess.PIPE, text=True)
+    out, _ = proc.communicate()
+    assert out.strip() == env["TEXINPUTS"]
+
+
+@pytest.mark.parametrize(
+    "body, pdf",
+    [
+        (TEXT, False),
+        (r"\textbf{Pick} $x \in \mathbb{R}$", False),
+        (FIGURE, True),
+        (GRAPHICS, True),
+        (r"\begin{axis}\addplot {x^2};\end{axis}", True),
+        (r"\tkzDefPoint(0,0){A}", True),
+    ],
+)
+def test_needs_pdf(body, pdf):
+    assert needs_pdf(body) is pdf
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    """Stub dvipng and pdflatex, recording the bodies each one compiles."""
+    calls = {"dvi": [], "pdf": [], "dvi_error": None}
+
+    def render_dvi(txt_full, workdir, dpi, pages, supervisor=None):
+        calls["dvi"].append(txt_full)
+        if calls["dvi_error"]:
+            raise ValueError(calls["dvi_error"])
+        ls_png = []
+        for i in range(pages):
+            ls_png.append(os.path.join(workdir, f"page{i}.png"))
+            Image.new("RGB", (8, 4), "white").save(ls_png[-1])
+        return ls_png
+
+    def compile_pdf(bodies, document, workdir, cache_dir=None, supervisor=None):
+        calls["pdf"].append(list(bodies))
+        return os.path.join(workdir, "questions.pdf")
+
+    class Backend:
+        def pages(self, path_pdf, dpi, last_page):
+            for _ in range(last_page):
+                yield Image.new("RGB", (8, 4), "white")
+
+    monkeypatch.setattr(utils, "render_dvi", render_dvi)
+    monkeypatch.setattr(figures, "compile_pdf", compile_pdf)
+    monkeypatch.setattr(raster, "get_backend", lambda *args, **kwargs: Backend())
+    return calls
+
+
+def route(tmp_path, bodies, **params):
+    questions = [
+        Question(name=f"Q{i:03d}", body=body, scores={})
+        for i, body in enumerate(bodies, start=1)
+    ]
+    ls_groups = [[i] for i in range(len(questions))]
+    pages = render_images(questions, ls_groups, str(tmp_path), **params)
+    return [group for group, _, _ in pages]
+
+
+def test_auto_mode_sends_figures_to_pdflatex(tmp_path, engines):
+    groups = route(tmp_path, [FIGURE, TEXT, GRAPHICS], render_mode="auto")
+    assert len(engines["dvi"]) == 1
+    assert TEXT in engines["dvi"][0] and FIGURE not in engines["dvi"][0]
+    assert engines["pdf"] == [[FIGURE, GRAPHICS]]
+    # DVI pages come first
+    assert groups == [[1], [0], [2]]
+
+
+def test_auto_mode_without_figures_skips_pdflatex(tmp_path, engines):
+    assert route(tmp_path, [TEXT, TEXT + "!"], render_mode="auto") == [[0], [1]]
+    assert len(engines["dvi"]) == 1 and engines["pdf"] == []
+
+
+def test_standalone_template_always_uses_pdflatex(tmp_path, engines):
+    bodies = [TEXT, FIGURE]
+    groups = route(tmp_path, bodies, render_mode="auto", template="standalone")
+    assert engines["dvi"] == [] and engines["pdf"] == [bodies]
+    assert groups == [[0], [1]]
+
+
+def test_pdf_mode_never_uses_dvi(tmp_path, engines):
+    route(tmp_path, [TEXT], render_mode="pdf")
+    assert engines["dvi"] == [] and engines["pdf"] == [[TEXT]]
+
+
+def test_dvi_failure_falls_back_to_pdflatex(tmp_path, engines):
+    engines["dvi_error"] = "dvipng not found"
+    groups = route(tmp_path, [FIGURE, TEXT], render_mode="auto")
+    assert len(engines["dvi"]) == 1
+    assert engines["pdf"] == [[FIGURE, TEXT]]
+    assert groups == [[0], [1]]
+
+
+def test_beamer_document():
+    txt = build_document(FRAMES, aspectratio=43, fontsize=11, linespread=1.3)
+    assert "\\documentclass[11pt, aspectratio=43" in txt
+    assert "\\linespread{1.3}" in txt
+    assert "$" not in txt.split("\\begin{document}")[0]
+    body = txt.split("\\begin{document}")[1]
+    assert body.strip().startswith("\\begin{frame}\nOne")
+    assert body.count("\\begin{frame}") == 2
+    assert txt.endswith("\\end{document}")
+
+
+def test_standalone_document():
+    txt = build_document(FRAMES, aspectratio=43, fontsize=11, template="standalone")
+    preamble, body = txt.split("\\begin{document}")
+    # The text width of a 4:3 slide, 12.8 cm wide with 1 cm margins
+    assert "\\documentclass[11pt, varwidth=10.8cm, border=4pt" in preamble
+    assert "multi=qpage" in preamble and "$" not in preamble
+    assert "frame" not in txt
+    assert body.count("\\begin{qpage}") == body.count("\\end{qpage}") == 2
+    assert body.index("One") < body.index("Two")
+    assert txt.endswith("\\end{document}")
+
+
+def test_unknown_template():
+    with pytest.raises(ValueError, match="Unknown template"):
+        build_document(FRAMES, template="article")
@@ -0,0 +1,62 @@
+import os
+
+from typer.testing import CliRunner
+
+from tex2imgs import validate
+
+CONFIG = os.path.join(os.path.dirname(__file__), os.pardir, "config.json")
+
+
+def document(bodies):
+    return "\\documentclass{article}\n\\begin{document}\n" + "".join(bodies) + (
+        "\\end{document}\n"
+    )
+
+
+class FakeSupervisor:
+    """Writes a pdflatex log with an error at each of the given lines."""
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def run(self, cmd, cwd, **kwargs):
+        log = "".join(
+            f"./validate.tex:{line}: Error {line}.\nl.{line} input {line}\n"
+            for line in self.lines
+        )
+        with open(os.path.join(cwd, "validate.log"), "w") as f:
+            f.write(log)
+        return 1
+
+
+def test_errors_are_attributed_to_bodies():
+    # Lines 1-2: preamble, 3-4: body 0, 5: body 1, 6: \end{document}, 7: EOF
+    bodies = ["a\nb\n", "c\n"]
+    errors = validate.check_shard(bodies, document, FakeSupervisor([1, 4, 5, 6, 7]))
+    assert [(e["line"], e["body"]) for e in errors] == [
+        (1, None),
+        (4, 0),
+        (5, 1),
+        (6, 1),
+        (7, 1),
+    ]
+    assert errors[1]["message"] == "Error 4."
+    assert errors[1]["context"] == "input 4"
+
+
+def test_main_counts_questions_and_exits(tmp_path, monkeypatch):
+    path_tex = tmp_path / "bank.tex"
+    path_tex.write_text(
+        "\\begin{question}\nQ\n\\choice[!]{1}\n\\choice{2}\n\\end{question}\n"
+    )
+    found = [
+        validate.LatexError(None, None, 0, "Preamble error", ""),
+        validate.LatexError("Q001", str(path_tex), 1, "Undefined", "\\foo"),
+    ]
+    monkeypatch.setattr(validate, "validate_questions", lambda *a, **k: found)
+    app = validate.typer.Typer()
+    app.command()(validate.main)
+    result = CliRunner().invoke(app, [str(path_tex), "--config", CONFIG])
+    assert result.exit_code == 1
+    assert result.exception is None or isinstance(result.exception, SystemExit)
+    assert "1 questions checked, 1 with errors" in result.output
@@ -0,0 +1,179 @@
+import codecs
+
+import pytest
+
+from tex2imgs.webwork_to_blackboard import (
+    WEBWORK_HEADER_GROUPS,
+    convert_rows,
+    delta_rows,
+    detect_blackboard,
+    detect_webwork,
+    encode_rows,
+    first_available_header_row,
+    iter_lines,
+    read_csv,
+    read_csv_bytes,
+    rows_to_csv_bytes,
+    webwork_columns,
+)
+
+BLACKBOARD = [
+    ["Last Name", "First Name", "Username", "Problem_Set_1", "Problem_Set_2"],
+    ["SMITH", "JOHN", "john.smith@uni.edu", "100", "90"],
+    ["DOE", "JANE", "jane.doe@uni.edu", "95", "100"],
+    ["GARCIA", "ANA", "ana.garcia@uni.edu", "80", "75"],
+]
+WEBWORK = [
+    ["Email", "Problem_Set_1", "Problem_Set_2"],
+    ["john.smith@uni.edu", "100", "95"],
+    ["jane.doe@uni.edu", "95", "100"],
+]
+
+
+def test_delta_rows_keeps_changed_cells():
+    result = convert_rows(BLACKBOARD, WEBWORK)
+    delta = delta_rows(result, BLACKBOARD)
+    assert delta.changed_headers == ["Problem_Set_2"]
+    assert delta.rows == [
+        ["Username", "Problem_Set_2"],
+        ["john.smith@uni.edu", "95"],
+    ]
+
+
+def test_delta_rows_skips_unmatched_students():
+    # ana.garcia is not in the WebWork export, and has grades from the
+    # previous upload: the delta must not overwrite them
+    result = convert_rows([row[:3] for row in BLACKBOARD], WEBWORK)
+    assert result.unmatched_blackboard_keys == ["ana.garcia@uni.edu"]
+    delta = delta_rows(result, BLACKBOARD)
+    keys = [row[0] for row in delta.rows[1:]]
+    assert "ana.garcia@uni.edu" not in keys
+    assert keys == ["john.smith@uni.edu"]
+    assert delta.changed_students == 1
+
+
+def test_iter_lines_splits_multibyte_and_crlf_across_chunks():
+    text = "name,score\r\nJosé,10\r\nZoë,\"a\r\nb\"\r\n"
+    data = text.encode("utf-8")
+    for chunk_size in range(1, len(data) + 1):
+        lines = list(iter_lines(data, "utf-8", chunk_size=chunk_size))
+        assert "".join(lines) == text
+
+
+def test_csv_source_detects_bom_and_dialect(tmp_path):
+    rows = [["Username", "HW1"], ["ana", "7"], ["zoë", "8"]]
+    data = codecs.BOM_UTF16_LE + "\r\n".join(";".join(r) for r in rows).encode(
+        "utf-16-le"
+    )
+    assert read_csv_bytes(data) == rows
+    path = tmp_path / "gradebook.csv"
+    path.write_bytes(data)
+    assert read_csv(path) == rows
+
+
+def test_csv_source_reads_empty_file(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_bytes(b"")
+    assert read_csv(path) == []
+
+
+def reference_webwork(rows, key_column=None):
+    """detect_webwork as it was before the single-pass scan, projected."""
+    rows = [[cell.strip() for cell in row] for row in rows]
+    header_idx = first_available_header_row(rows, WEBWORK_HEADER_GROUPS)
+    header = rows[header_idx]
+    key_idx, project_indices, project_names = webwork_columns(header, key_column)
+    columns = [key_idx, *project_indices]
+    return (
+        [header[i] for i in columns],
+        project_names,
+        [
+            [row[i] if i < len(row) else "" for i in columns]
+            for row in rows[header_idx + 1 :]
+            if any(row)
+        ],
+    )
+
+
+WEBWORK_EXPORTS = {
+    "email": [
+        ["Course report"],
+        [],
+        ["Name", " Email ", "%score", "Problem_Set_1", "Problem_Set_2"],
+        ["Ana", "ana@uni.edu", "90", "10"],  # Ragged: one score missing
+        ["", "", "", "", ""],
+        ["Bob", "bob@uni.edu", "80", "7", "8", "extra"],
+    ],
+    "login and email": [
+        # A login header first, then a better (email) header row
+        ["Login ID", "Problem Set 1"],
+        ["ana", "1"],
+        ["Login ID", "E-mail", "Problem set 1", "Notes"],
+        ["ana", "ana@uni.edu", "9", "late"],
+    ],
+    "login": [
+        ["Student", "Login ID", "Score", "Homework A", "Homework B"],
+        ["Ana", "ana", "10", "5", "5"],
+        ["Bob", "bob"],
+    ],
+    "user id": [
+        ["USER  ID", "Section", "PROBLEM_SET_3"],
+        [" u1 ", "A", " 4 "],
+    ],
+}
+
+
+@pytest.mark.parametrize("name", WEBWORK_EXPORTS)
+def test_detect_webwork_matches_reference(name):
+    rows = WEBWORK_EXPORTS[name]
+    export = detect_webwork(rows)
+    header, project_names, data = reference_webwork(rows)
+    assert export.header == header
+    assert export.project_names == project_names
+    assert export.rows == data
+    assert export.key_idx == 0
+    assert export.project_indices == list(range(1, len(header)))
+
+
+def test_detect_webwork_key_columns():
+    rows = WEBWORK_EXPORTS["login and email"]
+    assert detect_webwork(rows).header[0] == "E-mail"
+    assert detect_webwork(rows, key_column="login id").header[0] == "Login ID"
+    assert detect_webwork(rows, key_column="login id").rows == [["ana", "9", "late"]]
+    with pytest.raises(ValueError, match="WebWork key column not found: Student"):
+        detect_webwork(rows, key_column="Student")
+
+
+def test_detect_webwork_errors():
+    with pytest.raises(ValueError, match="Could not find a header row"):
+        detect_webwork([["Name", "Score"], ["Ana", "1"]])
+    with pytest.raises(ValueError, match="project columns"):
+        detect_webwork([["Email", "Total"], ["ana@uni.edu", "1"]])
+
+
+def test_detect_blackboard_key_and_ragged_rows():
+    rows = [["Last Name", "Login", "Student E-mail", "HW"], ["Doe", "jd"]]
+    export = detect_blackboard(rows)
+    assert export.key_idx == 2
+    assert export.rows[1] == ["Doe", "jd", "", ""]
+    assert detect_blackboard(rows, key_column="login").key_idx == 1
+
+
+def test_encoded_rows_round_trip():
+    rows = [
+        ["Username", "Note", "Score"],
+        ["ana", 'said "hi", then left', "1"],
+        ["zoë", "two\nlines", ""],
+        ["", "", ""],
+        ["bob", "x;y\ttab", "3"],
+    ]
+    encoded = encode_rows(rows)
+    assert len(encoded) == len(rows)
+    assert encoded.data == rows_to_csv_bytes(rows)
+    assert encoded.rows() == rows
+    for start in range(len(rows) + 1):
+        for stop in range(start, len(rows) + 1):
+            assert encoded.rows(start, stop) == rows[start:stop]
+    assert encoded.rows(-2) == rows[-2:]
+    assert encoded.rows(3, 1) == []
+    assert len(encode_rows([])) == 0 and encode_rows([]).rows() == []
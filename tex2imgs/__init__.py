@@ -1,4 +1,4 @@
-__all__ = ["read_tex"]
+__all__ = ["read_tex", "render_questions", "RenderedQuestion"]
 
 
 def __getattr__(name):
@@ -6,4 +6,8 @@ def __getattr__(name):
         from tex2imgs.utils import read_tex
 
         return read_tex
+    if name in ("render_questions", "RenderedQuestion"):
+        from tex2imgs import render
+
+        return getattr(render, name)
     raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
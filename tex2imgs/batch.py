@@ -0,0 +1,141 @@
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import typer
+
+from tex2imgs.includes import read_source_tree
+from tex2imgs.utils import config_params, read_tex
+
+
+def find_tex_files(source: str) -> List[str]:
+    """
+    List the LaTeX files of a course.
+
+    Parameters
+    ----------
+    source : str
+        Folder (searched recursively for .tex files) or glob pattern.
+    """
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "**", "*.tex")
+    else:
+        pattern = source
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def skip_included(files: List[str]) -> List[str]:
+    """Drop the files included by another one: they render as part of it."""
+    included = set()
+    for path_file in files:
+        try:
+            tree = read_source_tree(path_file)
+        except ValueError:
+            # Reported when the file is rendered
+            continue
+        included.update(path for path in tree.hashes if path != tree.root)
+    return [f for f in files if os.path.abspath(f) not in included]
+
+
+def output_folder(path_file: str, source: str, output: str, key: str) -> str:
+    """Folder for one (file, config) render: <output>/<file>/<key>."""
+    if os.path.isdir(source):
+        name = os.path.splitext(os.path.relpath(path_file, source))[0]
+    else:
+        name = Path(path_file).stem
+    return os.path.join(output, name, key)
+
+
+def silence_stdout():
+    # pdflatex writes to the inherited stdout; keep the summary readable
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+
+def render_job(path_file: str, path_output: str, params: Dict) -> Tuple[int, float]:
+    """Render one file with one configuration. Returns (questions, seconds)."""
+    start = time.perf_counter()
+    gen = read_tex(path_file, path_output, **params)
+    # The progress is not yielded per question: read_tex returns the count
+    try:
+        while True:
+            next(gen)
+    except StopIteration as stop:
+        questions = stop.value
+    return questions, time.perf_counter() - start
+
+
+def main(
+    source: str = typer.Argument(..., help="Folder or glob of .tex files."),
+    key: List[str] = typer.Option(["169"], help="Configuration keys to render."),
+    output: str = "output",
+    config: str = "config.json",
+    workers: int = typer.Option(os.cpu_count() or 1, help="Worker processes."),
+    index: Optional[str] = typer.Option(None, help="Question index to update."),
+):
+    """
+    Render every question file of a course with several configurations.
+
+    All (file, configuration) renders are scheduled on one shared pool of
+    worker processes. Each render writes to <output>/<file>/<key>, and a
+    throughput summary is printed at the end.
+    """
+    dict_config = json.load(open(config))
+    files = skip_included(find_tex_files(source))
+    if not files:
+        typer.echo(f"No .tex files found in {source}")
+        raise typer.Exit(1)
+
+    jobs = [
+        (path_file, k, output_folder(path_file, source, output, k))
+        for path_file in files
+        for k in key
+    ]
+    typer.echo(f"Rendering {len(files)} files x {len(key)} configurations")
+
+    start = time.perf_counter()
+    total_questions = 0
+    busy = 0.0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=silence_stdout) as pool:
+        futures = {
+            pool.submit(
+                render_job,
+                path_file,
+                path_output,
+                dict(config_params(dict_config, k), path_index=index),
+            ): (path_file, k, path_output)
+            for path_file, k, path_output in jobs
+        }
+        for future in as_completed(futures):
+            path_file, k, path_output = futures[future]
+            try:
+                questions, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                typer.echo(f"FAILED {path_file} [{k}]: {e}")
+                continue
+            total_questions += questions
+            busy += seconds
+            typer.echo(
+                f"{path_file} [{k}]: {questions} questions in {seconds:.1f}s"
+                f" -> {path_output}"
+            )
+    wall = time.perf_counter() - start
+
+    typer.echo(
+        f"\n{len(jobs) - failed}/{len(jobs)} renders, {total_questions} questions"
+        f" in {wall:.1f}s ({total_questions / max(wall, 1e-9):.1f} questions/s,"
+        f" {workers} workers, {busy / max(wall, 1e-9):.1f}x parallel speedup)"
+    )
+    if failed:
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
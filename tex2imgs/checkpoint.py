@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+CHECKPOINT_FILE = ".checkpoint.jsonl"
+
+
+def render_key(params: Dict) -> str:
+    """Hash of everything, besides the question bodies, that changes an image."""
+    txt = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(txt.encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """
+    Record of the questions already written to an output folder.
+
+    The file holds one JSON line with the render key, then one line per
+    written question: its name, the hash of its body, and its size. Lines are
+    appended and flushed as the images are saved, so an interrupted render
+    loses at most the question being written. A rerun with the same render
+    key skips every question whose body is unchanged and whose file exists.
+    """
+
+    def __init__(self, out_folder: str, key: str):
+        self.path = os.path.join(out_folder, CHECKPOINT_FILE)
+        self.key = key
+        self.entries: Dict[str, Dict] = self._load()
+        # Rewrite the valid lines only: drops a line cut by an interruption
+        self.file = open(self.path, "w")
+        self._write({"key": key})
+        for entry in self.entries.values():
+            self._write(entry)
+
+    def _load(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        entries = {}
+        with open(self.path, "r") as f:
+            for idx, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if idx == 0:
+                    if entry.get("key") != self.key:
+                        # Rendered with other parameters: start over
+                        return {}
+                    continue
+                entries[entry["name"]] = entry
+        return entries
+
+    def _write(self, entry: Dict):
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    def completed(self, name: str, digest: str, path: str) -> Optional[Dict]:
+        """The entry of a question, if it was written with this body to path."""
+        entry = self.entries.get(name)
+        if entry is None or entry["digest"] != digest or not os.path.exists(path):
+            return None
+        return entry
+
+    def add(self, name: str, digest: str, size: int, width: int, height: int):
+        entry = dict(
+            name=name,
+            digest=digest,
+            size=int(size),
+            width=int(width),
+            height=int(height),
+        )
+        self.entries[name] = entry
+        self._write(entry)
+
+    def close(self):
+        self.file.close()
+
+
+def read_checkpoint(out_folder: str) -> Dict[str, Dict]:
+    """The entries of the checkpoint in a folder, by name, whatever its key."""
+    entries = {}
+    path = os.path.join(out_folder, CHECKPOINT_FILE)
+    with open(path, "r") as f:
+        next(f, None)
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            entries[entry["name"]] = entry
+    return entries
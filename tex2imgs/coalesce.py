@@ -0,0 +1,231 @@
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from tex2imgs.figures import compile_pdf
+from tex2imgs.raster import get_backend
+from tex2imgs.supervisor import RenderAborted, Supervisor
+from tex2imgs.utils import (
+    DEFAULT_FIGURE_CACHE,
+    build_document,
+    process_image,
+    tex_environment,
+)
+
+
+@dataclass
+class RenderedPage:
+    """One rendered question: the image and its size (see `process_image`)."""
+
+    image: object  # PIL.Image.Image
+    size: int
+
+
+@dataclass
+class RenderRequest:
+    body: str  # Frame source, as in Question.body
+    key: Tuple  # Document parameters; only equal keys share a document
+    arrival: float = field(default_factory=time.monotonic)
+    future: Future = field(default_factory=Future)
+
+
+class RenderBatcher:
+    """
+    Coalesce concurrent single-question renders into shared documents.
+
+    Every pdflatex run pays for loading the beamer preamble, which dominates
+    the cost of a one-question render. Requests arriving within `window`
+    seconds of the first pending one are compiled together, one frame each,
+    and the pages are split back to their callers. A request waits at most
+    `window` seconds before its batch starts compiling, so the window is
+    also the latency added to a lone request.
+
+    Requests only share a document if they have the same aspect ratio, font
+    size, line spread, dpi, crop and template. If a shared document fails to
+    compile (e.g. one question has an error), it is split in halves, which
+    are compiled in parallel on the pool, until the bad questions are
+    isolated, so one bad question does not fail the others. A render stopped
+    by the supervisor (see `RenderAborted`) fails its whole batch.
+
+    Parameters
+    ----------
+    window : float, optional
+        Seconds to wait for more requests after the first one.
+    max_batch : int, optional
+        Maximum number of requests in one document.
+    workers : int, optional
+        Documents compiled at the same time.
+    raster_backend : str, optional
+        See `tex2imgs.raster`.
+    figure_cache : str, optional
+        Cache of the tikz pictures, see `tex2imgs.figures.compile_pdf`.
+    timeout, memory_mb, cpu_seconds : optional
+        Limits of each subprocess, see `tex2imgs.supervisor.Supervisor`.
+    """
+
+    def __init__(
+        self,
+        window: float = 0.05,
+        max_batch: int = 32,
+        workers: int = 2,
+        raster_backend: str = "pdf2image",
+        figure_cache: Optional[str] = DEFAULT_FIGURE_CACHE,
+        timeout: Optional[float] = 60,
+        memory_mb: Optional[int] = None,
+        cpu_seconds: Optional[int] = None,
+    ):
+        self.window = window
+        self.max_batch = max_batch
+        self.raster_backend = raster_backend
+        self.figure_cache = figure_cache
+        self.supervisor = Supervisor(
+            timeout, memory_mb, cpu_seconds, env=tex_environment()
+        )
+        # Counters, e.g. to check the average batch size
+        self.requests = 0
+        self.documents = 0
+        self._queue: queue.Queue = queue.Queue()
+        # Batches submitted to the pool and not finished yet, including the
+        # halves of failed batches
+        self._inflight = 0
+        self._done = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._thread = threading.Thread(target=self._collect, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        body: str,
+        aspectratio: int = 169,
+        fontsize: int = 12,
+        linespread: float = 1.1,
+        dpi: int = 200,
+        crop: bool = False,
+        template: str = "beamer",
+        render_mode: str = "pdf",
+    ) -> Future:
+        """
+        Queue a question body. The future resolves to a RenderedPage.
+
+        With render_mode="mathtext", a question that matplotlib can draw is
+        rendered right away, without LaTeX (see tex2imgs.mathtext).
+        """
+        if render_mode == "mathtext" and template == "beamer":
+            from tex2imgs.mathtext import parse_mathtext, render_mathtext
+
+            lines = parse_mathtext(body)
+            if lines is not None:
+                future: Future = Future()
+                try:
+                    img = render_mathtext(lines, aspectratio, fontsize, linespread, dpi)
+                    future.set_result(RenderedPage(*process_image(img, crop=crop)))
+                except Exception as e:
+                    future.set_exception(e)
+                return future
+        key = (aspectratio, fontsize, linespread, dpi, crop, template)
+        request = RenderRequest(body, key)
+        self._queue.put(request)
+        return request.future
+
+    def render(self, body: str, wait: Optional[float] = None, **params):
+        """Render a question body and wait for it. See `submit`."""
+        return self.submit(body, **params).result(timeout=wait)
+
+    def close(self):
+        """Stop accepting requests once the queued ones are dispatched."""
+        self._queue.put(None)
+        self._thread.join()
+        with self._done:
+            self._done.wait_for(lambda: self._inflight == 0)
+        self._pool.shutdown(wait=True)
+
+    def _collect(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batches: Dict[Tuple, List[RenderRequest]] = {first.key: [first]}
+            count = 1
+            closing = False
+            # The window starts when the first request arrived
+            deadline = first.arrival + self.window
+            while count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                batches.setdefault(request.key, []).append(request)
+                count += 1
+            for key, requests in batches.items():
+                self._dispatch(key, requests)
+            if closing:
+                return
+
+    def _dispatch(self, key: Tuple, requests: List[RenderRequest]):
+        with self._done:
+            self._inflight += 1
+        self._pool.submit(self._run, key, requests)
+
+    def _run(self, key: Tuple, requests: List[RenderRequest]):
+        try:
+            self._render(key, requests)
+        finally:
+            with self._done:
+                self._inflight -= 1
+                self._done.notify_all()
+
+    def _render(self, key: Tuple, requests: List[RenderRequest]):
+        aspectratio, fontsize, linespread, dpi, crop, template = key
+        # Identical bodies in a batch share a page
+        bodies = list(dict.fromkeys(request.body for request in requests))
+        try:
+            with tempfile.TemporaryDirectory(prefix="tex2imgs_batch_") as workdir:
+                path_pdf = compile_pdf(
+                    bodies,
+                    partial(
+                        build_document,
+                        aspectratio=aspectratio,
+                        fontsize=fontsize,
+                        linespread=linespread,
+                        template=template,
+                    ),
+                    workdir,
+                    cache_dir=self.figure_cache,
+                    supervisor=self.supervisor,
+                )
+                backend = get_backend(self.raster_backend, supervisor=self.supervisor)
+                pages = {}
+                for body, img in zip(
+                    bodies, backend.pages(path_pdf, dpi=dpi, last_page=len(bodies))
+                ):
+                    img, size = process_image(
+                        img, crop=crop, tight=template == "standalone"
+                    )
+                    pages[body] = RenderedPage(img, size)
+        except Exception as e:
+            if len(bodies) > 1 and not isinstance(e, RenderAborted):
+                # Find the culprits: compile each half of the batch on its own
+                half = len(bodies) // 2
+                for part in (set(bodies[:half]), set(bodies[half:])):
+                    self._dispatch(key, [r for r in requests if r.body in part])
+                return
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        self.requests += len(requests)
+        self.documents += 1
+        for request in requests:
+            if not request.future.done():
+                request.future.set_result(pages[request.body])
@@ -0,0 +1,413 @@
+import base64
+import dataclasses
+import json
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional
+
+import typer
+
+from tex2imgs.checkpoint import read_checkpoint
+from tex2imgs.includes import read_source_tree
+from tex2imgs.manifest import manifest_config
+from tex2imgs.utils import (
+    DEFAULT_FIGURE_CACHE,
+    Question,
+    build_questions,
+    finish_output,
+    output_folder,
+    parse_questions,
+    render_limits,
+    render_params,
+    write_bytes,
+    write_errors,
+    write_question_tables,
+)
+
+# Parameters of `build_questions` that a coordinator may send. Everything
+# else (paths, figure cache, limits) is chosen by the worker itself
+WORKER_PARAMS = [
+    "batch_size",
+    "aspectratio",
+    "fontsize",
+    "linespread",
+    "dpi",
+    "crop",
+    "show_size",
+    "raster_backend",
+    "render_mode",
+    "output_format",
+    "template",
+]
+BACKOFF_SECONDS = 0.5
+
+app = typer.Typer(help="Render questions on several machines.")
+
+
+def worker_questions(ls_dict: List[Dict]) -> List[Question]:
+    """
+    Questions received by a worker.
+
+    The names become file names in the worker's temporary folder, so they
+    must not contain a path. The source files only exist on the coordinator:
+    their paths are dropped.
+    """
+    questions = []
+    for dict_question in ls_dict:
+        question = Question(**dict_question)
+        name = question.name
+        if name in ("", ".", "..") or any(c in name for c in "/\\\0"):
+            raise ValueError(f"Invalid question name: {name}")
+        questions.append(dataclasses.replace(question, source=None))
+    return questions
+
+
+def render_shard(
+    questions: List[Question], params: Dict, local_params: Optional[Dict] = None
+) -> Dict:
+    """
+    Render a shard of questions in a temporary folder.
+
+    Only the WORKER_PARAMS are taken from params. The figure cache and the
+    limits come from local_params, which the worker sets.
+
+    Returns the images, base64-encoded by file name, and one entry per
+    question with its size and dimensions (see tex2imgs.checkpoint).
+    """
+    unknown = sorted(set(params) - set(WORKER_PARAMS))
+    if unknown:
+        raise ValueError(f"Parameters not allowed on a worker: {unknown}")
+    with tempfile.TemporaryDirectory(prefix="tex2imgs_worker_") as folder:
+        gen = build_questions(questions, folder, **params, **(local_params or {}))
+        for _ in gen:
+            pass
+        entries = read_checkpoint(folder)
+        extension = "." + params.get("output_format", "png")
+        files = {}
+        for question in questions:
+            name = question.name + extension
+            with open(os.path.join(folder, name), "rb") as f:
+                files[name] = base64.b64encode(f.read()).decode("ascii")
+    return {"files": files, "entries": [entries[q.name] for q in questions]}
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """
+    Worker endpoints.
+
+    GET /health answers "ok". POST /render takes a JSON object with the
+    "questions" (as dictionaries) and the render "params", and answers with
+    the result of `render_shard`, or an "error" and status 500. The server's
+    local_params (see `make_server`) are added to every render.
+    """
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_error(404)
+            return
+        self.reply(200, {"status": "ok"})
+
+    def do_POST(self):
+        if self.path != "/render":
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers["Content-Length"])
+            payload = json.loads(self.rfile.read(length))
+            questions = worker_questions(payload["questions"])
+            result = render_shard(
+                questions, payload["params"], self.server.local_params
+            )
+        except Exception as e:
+            self.reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self.reply(200, result)
+
+    def reply(self, status: int, body: Dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"[worker {self.server.server_port}] {format % args}\n")
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    figure_cache: Optional[str] = DEFAULT_FIGURE_CACHE,
+    timeout: Optional[float] = None,
+    memory_mb: Optional[int] = None,
+    cpu_seconds: Optional[int] = None,
+) -> ThreadingHTTPServer:
+    """
+    Create a worker server. Call serve_forever() on it to start serving.
+
+    The figure cache and the limits (see `build_questions`) apply to every
+    render of the worker, whatever the coordinator sends.
+    """
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.local_params = dict(  # type: ignore[attr-defined]
+        figure_cache=figure_cache,
+        timeout=timeout,
+        memory_mb=memory_mb,
+        cpu_seconds=cpu_seconds,
+    )
+    return server
+
+
+def post_shard(url: str, questions: List[Question], params: Dict, timeout: float):
+    payload = json.dumps(
+        {"questions": [dataclasses.asdict(q) for q in questions], "params": params}
+    ).encode("utf-8")
+    request = urllib.request.Request(
+        url.rstrip("/") + "/render",
+        data=payload,
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        # The worker reported the error in the body
+        try:
+            message = json.loads(e.read())["error"]
+        except (ValueError, KeyError):
+            message = str(e)
+        raise ValueError(f"Worker {url} failed: {message}") from e
+
+
+def make_shards(questions: List[Question], shard_size: int) -> List[List[int]]:
+    """
+    Split the questions in shards of about shard_size questions.
+
+    Identical questions stay in the same shard, so each worker can still
+    render them once (see `build_questions`).
+    """
+    dict_groups: Dict[str, List[int]] = {}
+    for i, question in enumerate(questions):
+        dict_groups.setdefault(question.digest, []).append(i)
+    shards: List[List[int]] = [[]]
+    for group in dict_groups.values():
+        if shards[-1] and len(shards[-1]) + len(group) > shard_size:
+            shards.append([])
+        shards[-1].extend(group)
+    return [shard for shard in shards if shard]
+
+
+def render_distributed(
+    questions: List[Question],
+    path_output: str,
+    workers: List[str],
+    shard_size: int = 25,
+    retries: int = 2,
+    request_timeout: float = 900,
+    path_index: Optional[str] = None,
+    **params,
+) -> Iterator[float]:
+    """
+    Render parsed questions on remote workers, into the usual output layout.
+
+    The questions are split in shards, and every worker renders one shard at
+    a time. If a worker cannot be reached or does not answer in time, its
+    shard goes back to the queue for another worker, and a worker that fails
+    `retries + 1` times in a row is no longer used. A shard that a worker
+    fails to render is retried up to `retries` more times. Yields the
+    progress from 0 to 1, like `build_questions`.
+
+    Parameters
+    ----------
+    questions : List[Question]
+        Questions to render, e.g. from `parse_questions`.
+    path_output : str
+        Path to the output folder or zip file.
+    workers : List[str]
+        Base URLs of the workers, e.g. "http://10.0.0.2:8765".
+    shard_size : int, optional
+        Questions per request.
+    retries : int, optional
+        How many times a shard that failed to render is retried, and how many
+        connection failures in a row drop a worker.
+    request_timeout : float, optional
+        Seconds to wait for a worker to answer one shard.
+    path_index : str, optional
+        Question index to update, on this machine.
+    params
+        Render parameters of `build_questions` (dpi, aspectratio...). Only
+        the WORKER_PARAMS are sent; the workers choose their own figure
+        cache and limits.
+    """
+    if not workers:
+        raise ValueError("No workers given")
+    config = manifest_config(params)
+    params = {k: v for k, v in params.items() if k in WORKER_PARAMS}
+    extension = "." + params.get("output_format", "png")
+    out_folder = output_folder(path_output)
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    shards = make_shards(questions, shard_size)
+    # (shard, attempt) to render, and (shard, result, error) rendered
+    pending: queue.Queue = queue.Queue()
+    results: queue.Queue = queue.Queue()
+    for k in range(len(shards)):
+        pending.put((k, 0))
+    remaining = [len(shards)]
+    lock = threading.Lock()
+
+    def work(url: str):
+        failures = 0
+        while failures <= retries:
+            with lock:
+                if remaining[0] == 0:
+                    return
+            try:
+                k, attempt = pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            shard = [questions[i] for i in shards[k]]
+            try:
+                result = post_shard(url, shard, params, request_timeout)
+            except ValueError as e:
+                # The worker is fine, the shard failed to render
+                if attempt < retries:
+                    pending.put((k, attempt + 1))
+                else:
+                    results.put((k, None, str(e)))
+                sys.stderr.write(f"Shard {k} failed on {url}: {e}\n")
+                continue
+            except OSError as e:
+                # The worker is down or too slow: give the shard to another
+                # one, and wait before trying this worker again
+                pending.put((k, attempt))
+                failures += 1
+                sys.stderr.write(f"Worker {url} failed on shard {k}: {e}\n")
+                time.sleep(min(BACKOFF_SECONDS * 2**failures, 30))
+                continue
+            failures = 0
+            results.put((k, result, None))
+        sys.stderr.write(f"Worker {url} failed {failures} times, dropped\n")
+
+    threads = [
+        threading.Thread(target=work, args=(url,), daemon=True) for url in workers
+    ]
+    for thread in threads:
+        thread.start()
+
+    ls_sizes = [0] * len(questions)
+    ls_dims = [(0, 0)] * len(questions)
+    dict_index = {q.name: i for i, q in enumerate(questions)}
+    done = 0
+    try:
+        while remaining[0] > 0:
+            try:
+                k, result, error = results.get(timeout=0.5)
+            except queue.Empty:
+                if not any(thread.is_alive() for thread in threads):
+                    raise ValueError("All workers failed")
+                continue
+            if error is not None:
+                raise ValueError(
+                    f"Shard {k} failed after {retries + 1} attempts: {error}"
+                )
+            for name, data in result["files"].items():
+                write_bytes(os.path.join(out_folder, name), base64.b64decode(data))
+            for entry in result["entries"]:
+                i = dict_index[entry["name"]]
+                ls_sizes[i] = entry["size"]
+                ls_dims[i] = (entry["width"], entry["height"])
+            with lock:
+                remaining[0] -= 1
+            done += len(shards[k])
+            yield done / len(questions)
+    finally:
+        # Stop the worker threads, also if the caller gives up
+        with lock:
+            remaining[0] = 0
+
+    write_question_tables(out_folder, questions)
+    finish_output(
+        path_output,
+        questions,
+        ls_sizes,
+        ls_dims,
+        extension=extension,
+        path_index=path_index,
+        aspectratio=params.get("aspectratio", 169),
+        dpi=params.get("dpi", 200),
+        config=config,
+    )
+
+
+@app.command()
+def worker(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    config: Optional[str] = typer.Option(
+        None, help="Configuration file with the figure cache and limits."
+    ),
+):
+    """Serve render requests from a coordinator."""
+    dict_config = json.load(open(config)) if config is not None else {}
+    server = make_server(
+        host,
+        port,
+        figure_cache=dict_config.get("figure_cache", DEFAULT_FIGURE_CACHE),
+        **render_limits(dict_config),
+    )
+    typer.echo(f"Worker listening on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+@app.command()
+def render(
+    file: str,
+    worker: List[str] = typer.Option(..., help="Worker URL, repeat for several."),
+    output: str = "output",
+    config: str = "config.json",
+    key: str = "169",
+    shard_size: int = 25,
+    retries: int = 2,
+    index: Optional[str] = None,
+):
+    """Parse a LaTeX file here and render its questions on the workers."""
+    dict_config = json.load(open(config))
+    tree = read_source_tree(file)
+    questions, errors = parse_questions(
+        tree.lines,
+        score_good=dict_config["score_good"],
+        score_bad=dict_config["score_bad"],
+        score_noanswer=dict_config["score_noanswer"],
+        origins=tree.origins,
+    )
+    write_errors(output_folder(output), errors)
+    gen = render_distributed(
+        questions,
+        output,
+        worker,
+        shard_size=shard_size,
+        retries=retries,
+        path_index=index,
+        **render_params(dict_config, key),
+    )
+    for p in gen:
+        sys.stdout.write("\r%d%%" % (p * 100))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    app()
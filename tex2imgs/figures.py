@@ -0,0 +1,274 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tex2imgs.supervisor import Supervisor
+from tex2imgs.utils import compile_tex, link_or_copy
+
+# Externalized pictures are read from (and exported to) this subfolder of the
+# compilation folder, as <key>.pdf plus <key>.dpth for their baseline. The
+# .pdf comes last: a picture is cached once its .pdf exists
+FIGURE_DIR = "figures"
+FIGURE_FILES = [".dpth", ".pdf"]
+# Only the pictures named by `name_figures` are externalized. Their names are
+# hashes of their source, so "simple" (the file exists) is a safe up-to-date
+# check, and a missing file would show up as a placeholder instead of
+# calling pdflatex from pdflatex
+EXTERNALIZE = (
+    r"\usetikzlibrary{external}"
+    + r"\tikzexternalize[prefix="
+    + FIGURE_DIR
+    + r"/, mode=list and make, up to date check=simple]"
+    + r"\tikzset{external/export=false}"
+)
+FIGURE_TOKEN = re.compile(r"\\(begin|end)\{tikzpicture\}")
+# Definitions in a body that a picture may use
+DEFINITION = re.compile(
+    r"\\(?:(?:re)?newcommand|providecommand|DeclareMathOperator"
+    r"|(?:re)?newenvironment|[egx]?def|let|tikzset|pgfplotsset)\b\*?"
+)
+
+
+def find_figures(body: str) -> List[Tuple[int, int]]:
+    """Start and end of the outermost tikzpicture environments of a body."""
+    spans = []
+    depth = 0
+    start = 0
+    for match in FIGURE_TOKEN.finditer(body):
+        if match.group(1) == "begin":
+            if depth == 0:
+                start = match.start()
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                spans.append((start, match.end()))
+    return spans
+
+
+def skip_group(text: str, pos: int, close: str) -> int:
+    """End of the group that starts at pos, e.g. {...} for close="}"."""
+    opening = "{" if close == "}" else "["
+    depth = 0
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+            continue
+        if char == opening:
+            depth += 1
+        elif char == close:
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        pos += 1
+    return pos
+
+
+def find_definitions(text: str) -> List[str]:
+    """
+    Macro definitions in LaTeX text, e.g. \\newcommand{\\f}[1]{x^#1}.
+
+    Each definition runs from its command to its last argument: the control
+    sequences and parameters before the first {...} group (as in
+    \\def\\f#1{...} or \\let\\a\\b), then the {...} and [...] groups.
+    """
+    definitions = []
+    for match in DEFINITION.finditer(text):
+        pos = match.end()
+        groups = 0
+        while pos < len(text):
+            rest = text[pos:]
+            stripped = len(rest) - len(rest.lstrip())
+            char = rest[stripped : stripped + 1]
+            if char == "{":
+                pos = skip_group(text, pos + stripped, "}")
+                groups += 1
+            elif char == "[":
+                pos = skip_group(text, pos + stripped, "]")
+            elif groups == 0 and char in ("#", "="):
+                pos += stripped + 2 if char == "#" else stripped + 1
+            elif groups == 0 and char == "\\":
+                cs = re.match(r"\\(?:[A-Za-z@]+|.)", rest[stripped:])
+                pos += stripped + cs.end()
+            else:
+                break
+        definitions.append(text[match.start() : pos])
+    return definitions
+
+
+def figure_key(preamble: str, source: str, definitions: str = "") -> str:
+    """
+    Cache key of a picture: hash of the preamble and its source.
+
+    definitions are the macros defined in the body before the picture (see
+    `find_definitions`), which the picture may use.
+    """
+    normalized = " ".join(source.split())
+    if definitions:
+        normalized = " ".join(definitions.split()) + "\n" + normalized
+    return hashlib.sha256((preamble + "\n" + normalized).encode("utf-8")).hexdigest()
+
+
+def name_figures(body: str, preamble: str) -> Tuple[str, List[str]]:
+    """
+    Mark every picture of a body for externalization under its cache key.
+
+    Returns the new body and the keys of its pictures, in order.
+    """
+    keys = []
+    parts = []
+    last = 0
+    for start, end in find_figures(body):
+        definitions = "\n".join(find_definitions(body[:start]))
+        key = figure_key(preamble, body[start:end], definitions)
+        keys.append(key)
+        parts.append(body[last:start])
+        parts.append(
+            r"\tikzset{external/export next=true}\tikzsetnextfilename{%s}" % key
+        )
+        last = start
+    parts.append(body[last:])
+    return "".join(parts), keys
+
+
+def externalize(txt_full: str) -> str:
+    """Enable the externalization of the named pictures in a document."""
+    return txt_full.replace(
+        "\\begin{document}", EXTERNALIZE + "\n    \\begin{document}", 1
+    )
+
+
+def fetch_figure(cache_dir: str, key: str, workdir: str) -> bool:
+    """Link a cached picture into the compilation folder, if it is cached."""
+    if not os.path.exists(os.path.join(cache_dir, key + ".pdf")):
+        return False
+    for extension in FIGURE_FILES:
+        path = os.path.join(cache_dir, key + extension)
+        if os.path.exists(path):
+            link_or_copy(path, os.path.join(workdir, FIGURE_DIR, key + extension))
+    return True
+
+
+def store_figure(cache_dir: str, key: str, workdir: str):
+    """
+    Copy an exported picture into the cache, atomically.
+
+    The .pdf is published last, so a picture whose .pdf is in the cache (see
+    `fetch_figure`) also has its .dpth.
+    """
+    for extension in FIGURE_FILES:
+        path = os.path.join(workdir, FIGURE_DIR, key + extension)
+        if not os.path.exists(path):
+            continue
+        # Concurrent renders may export the same picture: never expose a
+        # partial file under the final name
+        fd, path_partial = tempfile.mkstemp(dir=cache_dir, suffix=".part")
+        os.close(fd)
+        shutil.copyfile(path, path_partial)
+        os.replace(path_partial, os.path.join(cache_dir, key + extension))
+
+
+def export_figure(
+    key: str, path_tex: str, workdir: str, supervisor: Supervisor
+) -> str:
+    """
+    Export one picture to FIGURE_DIR, as tikz's own makefile would.
+
+    path_tex is a document, relative to workdir, that draws the picture.
+    Raises ValueError if pdflatex fails.
+    """
+    jobname = os.path.splitext(path_tex)[0]
+    cmd = [
+        "pdflatex",
+        "-halt-on-error",
+        "-interaction",
+        "batchmode",
+        "-jobname",
+        f"{FIGURE_DIR}/{key}",
+        r"\def\tikzexternalrealjob{%s}\input{%s}" % (jobname, jobname),
+    ]
+    retcode = supervisor.run(cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+    if retcode != 0:
+        raise ValueError(
+            "Error {} executing command: {}".format(retcode, " ".join(cmd))
+        )
+    return key
+
+
+def compile_pdf(
+    bodies: List[str],
+    document: Callable[[List[str]], str],
+    workdir: str,
+    cache_dir: Optional[str] = None,
+    supervisor: Optional[Supervisor] = None,
+    workers: Optional[int] = None,
+) -> str:
+    """
+    Compile question bodies with pdflatex, reusing their cached tikz pictures.
+
+    Every tikzpicture (also from pgfplots or tkz-euclide) is externalized
+    under a hash of the preamble and its source. Pictures in `cache_dir` are
+    included as PDFs. The missing ones are exported first, in parallel, each
+    from a document with only its own question, and added to the cache.
+    Without `cache_dir`, or without pictures, this is `compile_tex`.
+
+    Parameters
+    ----------
+    bodies : List[str]
+        Question bodies, one page each.
+    document : Callable[[List[str]], str]
+        Builds the full document from bodies, e.g. `build_document` with the
+        render parameters.
+    workdir : str
+        Compilation folder.
+    cache_dir : str, optional
+        Persistent figure cache. No cache if None.
+    workers : int, optional
+        Pictures exported at the same time, one per CPU by default.
+
+    Returns
+    -------
+    str
+        Path to the PDF.
+    """
+    supervisor = supervisor or Supervisor()
+    if cache_dir is None or not any(find_figures(body) for body in bodies):
+        return compile_tex(document(bodies), workdir, supervisor=supervisor)
+
+    preamble = document([])
+    os.makedirs(os.path.join(workdir, FIGURE_DIR), exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    named = []
+    # Missing picture -> index of a body that draws it
+    missing: Dict[str, int] = {}
+    for k, body in enumerate(bodies):
+        body, keys = name_figures(body, preamble)
+        named.append(body)
+        for key in keys:
+            if key not in missing and not fetch_figure(cache_dir, key, workdir):
+                missing[key] = k
+
+    if missing:
+        dict_tex = {}
+        for k in sorted(set(missing.values())):
+            path_tex = f"figure_source_{k}.tex"
+            with open(os.path.join(workdir, path_tex), "w") as f:
+                f.write(externalize(document([named[k]])))
+            dict_tex[k] = path_tex
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            exported = pool.map(
+                lambda item: export_figure(
+                    item[0], dict_tex[item[1]], workdir, supervisor
+                ),
+                missing.items(),
+            )
+            for key in exported:
+                store_figure(cache_dir, key, workdir)
+
+    return compile_tex(externalize(document(named)), workdir, supervisor=supervisor)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import re
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from tex2imgs.utils import Question
+
+DEPENDENCIES_FILE = "dependencies.json"
+# Only includes on a line of their own are followed, like the other commands
+# the parser reads (\begin{question}, \subsection...)
+INCLUDE = re.compile(r"\s*\\(?:input|include)\{([^}]+)\}\s*(?:%.*)?$")
+
+
+@dataclass
+class SourceTree:
+    """A LaTeX file with its includes expanded."""
+
+    root: str  # Absolute path of the main file
+    lines: List[str]  # Lines of the expanded file
+    origins: List[Tuple[str, int]]  # (file, line number) of each line
+    hashes: Dict[str, str]  # File -> sha256 of its contents
+    includes: Dict[str, List[str]]  # File -> files it includes, in order
+    missing: Dict[str, str]  # Included file not found -> file including it
+
+
+def read_lines(path: str) -> List[str]:
+    with open(path, "r") as f:
+        return f.readlines()
+
+
+def resolve_include(name: str, folder: str) -> str:
+    """Path of an included file, as LaTeX finds it (trying .tex first)."""
+    path = os.path.join(folder, name)
+    if os.path.exists(path + ".tex") or not os.path.splitext(path)[1]:
+        path += ".tex"
+    return os.path.abspath(path)
+
+
+def read_source_tree(path_file: str, workers: int = 8) -> SourceTree:
+    """
+    Read a LaTeX file and every file it includes with \\input or \\include.
+
+    The files are read concurrently, as soon as the file including them has
+    been read. Include paths are relative to the folder of the main file, as
+    when LaTeX compiles it. An included file that is not there (e.g.
+    \\input{glyphtounicode}, from the TeX distribution) is left to TeX: its
+    line is kept as is, with a warning. Raises ValueError if the includes
+    form a cycle.
+    """
+    root = os.path.abspath(path_file)
+    folder = os.path.dirname(root)
+    contents: Dict[str, List[str]] = {}
+    includes: Dict[str, List[str]] = {}
+    missing: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # File -> (reader, file that includes it)
+        pending: Dict[str, Tuple[Future, str]] = {
+            root: (pool.submit(read_lines, root), "")
+        }
+        while pending:
+            path = next(iter(pending))
+            future, parent = pending.pop(path)
+            try:
+                contents[path] = future.result()
+            except FileNotFoundError:
+                if not parent:
+                    raise
+                missing[path] = parent
+                warnings.warn(
+                    f"File {path}, included by {parent}, not found: "
+                    "leaving it to TeX",
+                    stacklevel=2,
+                )
+                continue
+            includes[path] = []
+            for line in contents[path]:
+                match = INCLUDE.match(line)
+                if match is None:
+                    continue
+                child = resolve_include(match.group(1), folder)
+                includes[path].append(child)
+                if child not in contents and child not in pending:
+                    pending[child] = (pool.submit(read_lines, child), path)
+    for children in includes.values():
+        children[:] = [child for child in children if child not in missing]
+
+    lines: List[str] = []
+    origins: List[Tuple[str, int]] = []
+
+    def expand(path: str, stack: List[str]):
+        if path in stack:
+            raise ValueError("Include cycle: " + " -> ".join(stack + [path]))
+        for number, line in enumerate(contents[path], start=1):
+            match = INCLUDE.match(line)
+            child = resolve_include(match.group(1), folder) if match else None
+            if child in contents:
+                expand(child, stack + [path])
+            else:
+                lines.append(line)
+                origins.append((path, number))
+
+    expand(root, [])
+    hashes = {
+        path: hashlib.sha256("".join(file_lines).encode("utf-8")).hexdigest()
+        for path, file_lines in contents.items()
+    }
+    return SourceTree(root, lines, origins, hashes, includes, missing)
+
+
+def dependency_graph(tree: SourceTree, questions: List[Question]) -> Dict:
+    """
+    Map every file of a tree to its hash, its includes and its questions.
+
+    A question depends on the file its \\begin{question} line is in.
+    """
+    graph = {
+        path: dict(sha256=tree.hashes[path], includes=children, questions=[])
+        for path, children in tree.includes.items()
+    }
+    for question in questions:
+        if question.source in graph:
+            graph[question.source]["questions"].append(question.name)
+    return graph
+
+
+def merge_dependencies(txt_old: Optional[str], graph: Dict) -> Dict:
+    """
+    Add the questions of a previous dependency graph (as JSON) to a graph.
+
+    Used when only some questions are rendered into an existing output: the
+    files keep the questions that were not rendered again.
+    """
+    if not txt_old:
+        return graph
+    names = {name for node in graph.values() for name in node["questions"]}
+    for path, node in json.loads(txt_old).items():
+        if path not in graph:
+            continue
+        new = graph[path]["questions"]
+        # Keep the order of the previous graph, without the moved questions
+        merged = [q for q in node["questions"] if q not in names or q in new]
+        graph[path]["questions"] = merged + [q for q in new if q not in merged]
+    return graph
+
+
+def write_dependencies(out_folder: str, graph: Dict) -> str:
+    """Write the dependency graph of a build to the output folder."""
+    path = os.path.join(out_folder, DEPENDENCIES_FILE)
+    with open(path, "w") as f:
+        json.dump(graph, f, indent=1)
+    return path
@@ -0,0 +1,300 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterable, List, Optional
+
+import typer
+
+from tex2imgs.utils import Question, build_questions, render_params
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    line INTEGER,
+    section TEXT,
+    subsection TEXT,
+    question INTEGER,
+    version INTEGER,
+    hash TEXT,
+    body TEXT,
+    scores TEXT,
+    width INTEGER,
+    height INTEGER,
+    size INTEGER,
+    aspectratio INTEGER,
+    dpi INTEGER,
+    output TEXT,
+    file TEXT,
+    updated REAL,
+    PRIMARY KEY (source, name, output)
+)
+"""
+
+app = typer.Typer(help="Query and re-render the question index.")
+
+
+def connect(path_index: str) -> sqlite3.Connection:
+    # Several renders may update the index at the same time (tex2imgs.batch)
+    conn = sqlite3.connect(path_index, timeout=60)
+    conn.row_factory = sqlite3.Row
+    conn.execute(SCHEMA)
+    return conn
+
+
+def update_index(
+    path_index: str,
+    records: Iterable[Dict],
+    path_output: str,
+    aspectratio: int,
+    dpi: int,
+):
+    """
+    Insert or replace the rendered questions in the index.
+
+    A question is identified by its source, name and output, so renders of
+    the same file with other configurations keep their own rows.
+
+    Parameters
+    ----------
+    path_index : str
+        Path to the SQLite index. Created if it does not exist.
+    records : Iterable[Dict]
+        One dictionary per rendered question, with the keys "question"
+        (a `Question`), "width", "height" and "size" (in pixels), and
+        optionally "file" (the image name, "<name>.png" by default).
+    path_output : str
+        Output folder or ZIP file of the render.
+    aspectratio : int
+        Aspect ratio of the render.
+    dpi : int
+        Dots per inch of the render.
+    """
+    now = time.time()
+    rows = []
+    for record in records:
+        question = record["question"]
+        rows.append(
+            (
+                question.source or "",
+                question.name,
+                question.line,
+                question.section,
+                question.subsection,
+                question.index,
+                question.version,
+                question.digest,
+                question.body,
+                json.dumps(question.scores),
+                int(record["width"]),
+                int(record["height"]),
+                int(record["size"]),
+                aspectratio,
+                dpi,
+                os.path.abspath(path_output),
+                record.get("file", question.name + ".png"),
+                now,
+            )
+        )
+    with connect(path_index) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO questions VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    conn.close()
+
+
+def query_index(
+    path_index: str,
+    section: Optional[str] = None,
+    subsection: Optional[str] = None,
+    source: Optional[str] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    names: Optional[List[str]] = None,
+    output: Optional[str] = None,
+    aspectratio: Optional[int] = None,
+    dpi: Optional[int] = None,
+) -> List[sqlite3.Row]:
+    """
+    Select questions from the index.
+
+    Section, subsection, source and output are glob patterns (e.g. "Alg*").
+    Sizes are the heights in pixels measured when the question was rendered.
+    A question has one row per output it was rendered to; aspectratio and
+    dpi select the renders with that configuration.
+    """
+    clauses = []
+    params: List = []
+    for column, pattern in [
+        ("section", section),
+        ("subsection", subsection),
+        ("source", source),
+        ("output", output),
+    ]:
+        if pattern is not None:
+            clauses.append(f"{column} GLOB ?")
+            params.append(pattern)
+    for column, value in [("aspectratio", aspectratio), ("dpi", dpi)]:
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if min_size is not None:
+        clauses.append("size >= ?")
+        params.append(min_size)
+    if max_size is not None:
+        clauses.append("size <= ?")
+        params.append(max_size)
+    if names:
+        clauses.append(f"name IN ({', '.join('?' * len(names))})")
+        params.extend(names)
+    sql = "SELECT * FROM questions"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY source, line, output"
+    conn = connect(path_index)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return rows
+
+
+def row_to_question(row: sqlite3.Row) -> Question:
+    return Question(
+        name=row["name"],
+        body=row["body"],
+        scores=json.loads(row["scores"]),
+        section=row["section"],
+        subsection=row["subsection"],
+        index=row["question"],
+        version=row["version"],
+        source=row["source"] or None,
+        line=row["line"],
+    )
+
+
+def group_by_source(rows: Iterable[sqlite3.Row]) -> Dict[str, List[Question]]:
+    """
+    Questions of the rows by source file, once each.
+
+    A question rendered to several outputs has several rows: the most
+    recently updated one is kept.
+    """
+    latest: Dict = {}
+    for row in rows:
+        key = (row["source"], row["name"])
+        if key not in latest or row["updated"] > latest[key]["updated"]:
+            latest[key] = row
+    dict_sources: Dict[str, List[Question]] = {}
+    for row in sorted(latest.values(), key=lambda r: (r["source"], r["line"])):
+        dict_sources.setdefault(row["source"], []).append(row_to_question(row))
+    return dict_sources
+
+
+def source_outputs(
+    output: str, dict_sources: Dict[str, List[Question]]
+) -> Dict[str, List[Question]]:
+    """
+    Output of the questions of each source: OUTPUT itself for one source,
+    else <OUTPUT>/<source file>, relative to the folder the sources share.
+    """
+    if len(dict_sources) == 1:
+        return {output: next(iter(dict_sources.values()))}
+    folders = [os.path.dirname(source) for source in dict_sources if source]
+    common = os.path.commonpath(folders) if folders else ""
+    return {
+        os.path.join(
+            output,
+            os.path.splitext(os.path.relpath(source, common))[0]
+            if source
+            else "untitled",
+        ): questions
+        for source, questions in dict_sources.items()
+    }
+
+
+@app.command()
+def query(
+    index: str = "questions.db",
+    section: Optional[str] = None,
+    subsection: Optional[str] = None,
+    source: Optional[str] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    output: Optional[str] = None,
+    aspectratio: Optional[int] = None,
+    dpi: Optional[int] = None,
+):
+    """List the indexed questions matching the filters, one line per render."""
+    rows = query_index(
+        index,
+        section,
+        subsection,
+        source,
+        min_size,
+        max_size,
+        output=output,
+        aspectratio=aspectratio,
+        dpi=dpi,
+    )
+    for row in rows:
+        typer.echo(
+            f"{row['name']}\t{row['source']}:{row['line']}\t{row['size']}px\t"
+            f"{row['width']}x{row['height']}@{row['dpi']}dpi\t"
+            f"{os.path.join(row['output'], row['file'])}"
+        )
+    typer.echo(f"{len(rows)} questions", err=True)
+
+
+@app.command()
+def render(
+    output: str,
+    index: str = "questions.db",
+    section: Optional[str] = None,
+    subsection: Optional[str] = None,
+    source: Optional[str] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    aspectratio: Optional[int] = None,
+    dpi: Optional[int] = None,
+    config: str = "config.json",
+    key: str = "169",
+):
+    """
+    Re-render the indexed questions matching the filters, without parsing.
+
+    Questions from several source files are written to one subfolder of
+    OUTPUT per file, since their names may repeat across files.
+    """
+    rows = query_index(
+        index,
+        section,
+        subsection,
+        source,
+        min_size,
+        max_size,
+        aspectratio=aspectratio,
+        dpi=dpi,
+    )
+    if not rows:
+        typer.echo("No questions match the filters.")
+        raise typer.Exit(1)
+    dict_sources = group_by_source(rows)
+    if len(dict_sources) > 1 and output.endswith(".zip"):
+        raise typer.BadParameter(
+            "The questions come from several files: OUTPUT must be a folder"
+        )
+    dict_config = json.load(open(config))
+    for path_output, questions in source_outputs(output, dict_sources).items():
+        gen = build_questions(
+            questions, path_output, path_index=index, **render_params(dict_config, key)
+        )
+        for p in gen:
+            sys.stdout.write("\r%d%%" % (p * 100))
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    app()
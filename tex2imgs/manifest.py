@@ -0,0 +1,226 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import typer
+
+from tex2imgs.utils import Question, write_bytes
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+# Render parameters recorded in the manifest: the ones that change the images
+CONFIG_KEYS = [
+    "aspectratio",
+    "fontsize",
+    "linespread",
+    "dpi",
+    "crop",
+    "show_size",
+    "raster_backend",
+    "render_mode",
+    "output_format",
+    "template",
+]
+
+app = typer.Typer(help="Compare build manifests and package what changed.")
+
+
+@dataclass
+class ManifestDiff:
+    """Image files of a new build compared with an old one."""
+
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+    unchanged: List[str]
+
+
+def manifest_config(params: Dict) -> Dict:
+    """Keep the render parameters that belong in a manifest."""
+    return {k: params[k] for k in CONFIG_KEYS if k in params}
+
+
+def file_hash(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def write_manifest(
+    out_folder: str,
+    records: Iterable[Dict],
+    config: Dict,
+    previous_files: Optional[Dict] = None,
+) -> str:
+    """
+    Write the manifest of a build to the output folder. Returns its path.
+
+    Each image file gets its content hash (sha256) and length in bytes, its
+    dimensions and size, and the question it comes from: name, hash of its
+    body (see `Question.digest`), source file and line. `config` holds the
+    render parameters (see CONFIG_KEYS). The entries of previous_files, from
+    the manifest of the output that the build adds to, are kept for the
+    files it does not write.
+    """
+    files = dict(previous_files or {})
+    for record in records:
+        question = record["question"]
+        path = os.path.join(out_folder, record["file"])
+        files[record["file"]] = dict(
+            sha256=file_hash(path),
+            bytes=os.path.getsize(path),
+            width=record["width"],
+            height=record["height"],
+            size=record["size"],
+            question=question.name,
+            question_hash=question.digest,
+            source=question.source,
+            line=question.line,
+        )
+    manifest = dict(
+        version=MANIFEST_VERSION,
+        created=time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        config=config,
+        files=files,
+    )
+    path_manifest = os.path.join(out_folder, MANIFEST_FILE)
+    with open(path_manifest, "w") as f:
+        json.dump(manifest, f, indent=1)
+    return path_manifest
+
+
+def read_manifest(path: str) -> Dict:
+    """Read a manifest file, or the manifest of an output folder or ZIP file."""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zipf:
+            try:
+                return json.loads(zipf.read(MANIFEST_FILE))
+            except KeyError:
+                raise ValueError(f"No {MANIFEST_FILE} in {path}") from None
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_FILE)
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def restore_unchanged(
+    path_zip: str,
+    out_folder: str,
+    questions: List[Question],
+    config: Dict,
+    extension: str,
+) -> List[Tuple[Question, Dict]]:
+    """
+    Extract the images of a previous build that a new build would repeat.
+
+    An image is reused if the previous build had the same configuration, and
+    the same question (by name and hash). Returns the reused questions with
+    their manifest entries.
+    """
+    try:
+        manifest = read_manifest(path_zip)
+    except (ValueError, zipfile.BadZipFile):
+        return []
+    if manifest.get("config") != config:
+        return []
+    reused = []
+    with zipfile.ZipFile(path_zip) as zipf:
+        for question in questions:
+            file = question.name + extension
+            entry = manifest["files"].get(file)
+            if entry is None or entry["question_hash"] != question.digest:
+                continue
+            write_bytes(os.path.join(out_folder, file), zipf.read(file))
+            reused.append((question, entry))
+    return reused
+
+
+def diff_manifests(old: Dict, new: Dict) -> ManifestDiff:
+    """Compare two manifests by file name and content hash."""
+    old_files, new_files = old["files"], new["files"]
+    diff = ManifestDiff([], [], [], [])
+    for name, entry in new_files.items():
+        if name not in old_files:
+            diff.added.append(name)
+        elif old_files[name]["sha256"] != entry["sha256"]:
+            diff.changed.append(name)
+        else:
+            diff.unchanged.append(name)
+    diff.removed = [name for name in old_files if name not in new_files]
+    return diff
+
+
+def read_files(path_output: str, names: List[str]) -> Iterator[Tuple[str, bytes]]:
+    """Read files of an output folder or ZIP file."""
+    if path_output.endswith(".zip"):
+        with zipfile.ZipFile(path_output) as zipf:
+            for name in names:
+                yield name, zipf.read(name)
+    else:
+        for name in names:
+            with open(os.path.join(path_output, name), "rb") as f:
+                yield name, f.read()
+
+
+def package_changes(path_new: str, diff: ManifestDiff, path_zip: str):
+    """
+    Zip the added and changed images of a build, for upload.
+
+    The ZIP also holds changes.csv, with the change of each file (added,
+    changed or removed), and the manifest of the new build.
+    """
+    names = diff.added + diff.changed
+    path_partial = path_zip + ".part"
+    with zipfile.ZipFile(path_partial, "w") as zipf:
+        for name, data in read_files(path_new, names + [MANIFEST_FILE]):
+            zipf.writestr(name, data)
+        rows = (
+            [[name, "added"] for name in diff.added]
+            + [[name, "changed"] for name in diff.changed]
+            + [[name, "removed"] for name in diff.removed]
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(["File", "Change"])
+        writer.writerows(rows)
+        zipf.writestr("changes.csv", buffer.getvalue())
+    os.replace(path_partial, path_zip)
+
+
+@app.callback()
+def callback():
+    pass
+
+
+@app.command()
+def diff(old: str, new: str, output: Optional[str] = None):
+    """
+    Compare the builds OLD and NEW (output folders, ZIP files or manifests).
+
+    With --output, write a ZIP file with the images to upload.
+    """
+    result = diff_manifests(read_manifest(old), read_manifest(new))
+    typer.echo(
+        f"{len(result.added)} added, {len(result.changed)} changed, "
+        f"{len(result.removed)} removed, {len(result.unchanged)} unchanged"
+    )
+    for name in result.removed:
+        typer.echo(f"Removed: {name}")
+    if output is not None:
+        if os.path.isfile(new) and not new.endswith(".zip"):
+            raise typer.BadParameter("NEW must be an output folder or ZIP file")
+        package_changes(new, result, output)
+        count = len(result.added) + len(result.changed)
+        typer.echo(f"Wrote {count} images to {output}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,215 @@
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from tex2imgs.utils import BEAMER_MARGIN_CM, BEAMER_WIDTHS_CM
+
+# matplotlib is imported when a question is checked or rendered: this module
+# is only used with render_mode="mathtext" and by the preview
+
+CM_PER_INCH = 2.54
+POINTS_PER_INCH = 72
+# Interline glue of the LaTeX size options: \baselineskip is 1.2 times the
+# font size, and \lineskip separates lines whose contents would touch
+BASELINESKIP = 1.2
+LINESKIP_PT = 1
+
+FRAME = re.compile(r"\s*\\begin\{frame\}(.*)\\end\{frame\}\s*", re.S)
+# The subset of a question body that is rendered without LaTeX: text, inline
+# math, \textbf (the choice letters), escaped characters and \\ line breaks
+TOKEN = re.compile(
+    r"(?P<math>\$[^$]+\$)"
+    r"|\\textbf\{(?P<bold>[^{}$\\]*)\}"
+    r"|\\(?P<escape>[%&#_])"
+    r"|(?P<text>[^$\\]+)"
+)
+# Characters with a meaning in LaTeX text (ties, ligatures, quotes...)
+UNSUPPORTED_TEXT = re.compile(r"[\^_~#&]|--|``|''")
+SPACE = re.compile(r"(\s+)")
+
+# A piece of text drawn in one style: (text, bold, math)
+Run = Tuple[str, bool, bool]
+
+# matplotlib is not thread-safe, and the preview renders from several threads
+_lock = threading.Lock()
+
+
+def slide_size_cm(aspectratio: int) -> Tuple[float, float]:
+    """Width and height of a beamer slide, in cm."""
+    digits = str(aspectratio)
+    # Two digits are X:Y, three XX:Y and four XX:YY (see `read_tex`)
+    split = 1 if len(digits) <= 2 else 2
+    x, y = int(digits[:split]), int(digits[split:])
+    width = BEAMER_WIDTHS_CM.get(aspectratio, 16)
+    return width, width * y / x
+
+
+def _font(fontsize: float, bold: bool = False):
+    from matplotlib.font_manager import FontProperties
+
+    return FontProperties(
+        family="sans-serif",
+        size=fontsize,
+        weight="bold" if bold else "normal",
+        math_fontfamily="dejavusans",
+    )
+
+
+def parse_mathtext(body: str) -> Optional[List[List[List[Run]]]]:
+    """
+    Split a question body into lines of words, if matplotlib can render it.
+
+    Returns None if the body uses anything outside the supported subset, or
+    math that matplotlib's mathtext cannot parse. Each line is a list of
+    words, and each word a list of runs.
+    """
+    from matplotlib.mathtext import MathTextParser
+
+    match = FRAME.fullmatch(body)
+    if match is None:
+        return None
+    parser = MathTextParser("path")
+    font = _font(12)
+    lines = []
+    for source in match.group(1).split("\\\\"):
+        runs: List[Run] = []
+        pos = 0
+        while pos < len(source):
+            token = TOKEN.match(source, pos)
+            if token is None:
+                return None
+            pos = token.end()
+            if token.group("math") is not None:
+                try:
+                    with _lock:
+                        parser.parse(token.group("math"), 72, font)
+                except ValueError:
+                    return None
+                runs.append((token.group("math"), False, True))
+            elif token.group("bold") is not None:
+                runs.append((token.group("bold"), True, False))
+            elif token.group("escape") is not None:
+                runs.append((token.group("escape"), False, False))
+            else:
+                # Braces only group in text, e.g. the ones left by \choice{...}
+                text = token.group("text").replace("{", "").replace("}", "")
+                if UNSUPPORTED_TEXT.search(text):
+                    return None
+                runs.append((text, False, False))
+
+        # Words break at the spaces of the text; math is never broken
+        words: List[List[Run]] = [[]]
+        for text, bold, math in runs:
+            parts = [text] if math else SPACE.split(text)
+            for part in parts:
+                if not math and part.isspace():
+                    words.append([])
+                elif part:
+                    words[-1].append((part, bold, math))
+        words = [word for word in words if word]
+        if words:
+            lines.append(words)
+    return lines
+
+
+def supports_mathtext(body: str) -> bool:
+    """Whether a question body can be rendered by `render_mathtext`."""
+    return parse_mathtext(body) is not None
+
+
+def render_mathtext(
+    lines: List[List[List[Run]]],
+    aspectratio: int = 169,
+    fontsize: int = 12,
+    linespread: float = 1.1,
+    dpi: int = 200,
+):
+    """
+    Render parsed question lines (see `parse_mathtext`) as a beamer slide.
+
+    The image has the size of the slide and the text is laid out like a
+    frame: 1 cm side margins, lines broken at the text width, and the block
+    centered vertically. So the image goes through `process_image` like the
+    LaTeX renders, but the fonts and spacing are matplotlib's.
+
+    Returns
+    -------
+    PIL.Image.Image
+        RGB image of the slide.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from PIL import Image
+
+    width_cm, height_cm = slide_size_cm(aspectratio)
+    px_per_cm = dpi / CM_PER_INCH
+    px_per_pt = dpi / POINTS_PER_INCH
+    margin = BEAMER_MARGIN_CM * px_per_cm
+    text_width = width_cm * px_per_cm - 2 * margin
+    baselineskip = fontsize * BASELINESKIP * linespread * px_per_pt
+    lineskip = LINESKIP_PT * px_per_pt
+    fonts = {False: _font(fontsize), True: _font(fontsize, bold=True)}
+
+    with _lock:
+        fig = Figure(
+            figsize=(width_cm / CM_PER_INCH, height_cm / CM_PER_INCH), dpi=dpi
+        )
+        canvas = FigureCanvasAgg(fig)
+        renderer = canvas.get_renderer()
+
+        def measure(run: Run) -> Tuple[float, float, float]:
+            text, bold, math = run
+            return renderer.get_text_width_height_descent(text, fonts[bold], math)
+
+        # Width of an interword space
+        space = measure(("a a", False, False))[0] - measure(("aa", False, False))[0]
+
+        # Break the lines: (x, run) to draw, with the ascent and descent
+        placed: List[Tuple[List[Tuple[float, Run]], float, float]] = []
+        for words in lines:
+            row: List[Tuple[float, Run]] = []
+            x = ascent = descent = 0.0
+            for word in words:
+                sizes = [measure(run) for run in word]
+                width = sum(w for w, _, _ in sizes)
+                if row and x + space + width > text_width:
+                    placed.append((row, ascent, descent))
+                    row = []
+                    x = ascent = descent = 0.0
+                if row:
+                    x += space
+                for run, (w, h, d) in zip(word, sizes):
+                    row.append((x, run))
+                    x += w
+                    ascent = max(ascent, h - d)
+                    descent = max(descent, d)
+            placed.append((row, ascent, descent))
+
+        # Baselines, from the top of the first line
+        baselines = []
+        y = 0.0
+        for k, (_, ascent, descent) in enumerate(placed):
+            if k == 0:
+                y = ascent
+            else:
+                y += max(baselineskip, placed[k - 1][2] + ascent + lineskip)
+            baselines.append(y)
+        total = y + placed[-1][2] if placed else 0
+        width_px, height_px = canvas.get_width_height()
+        top = max((height_px - total) / 2, 0)
+
+        for (row, _, _), baseline in zip(placed, baselines):
+            for x, (text, bold, _) in row:
+                fig.text(
+                    (margin + x) / width_px,
+                    1 - (top + baseline) / height_px,
+                    text,
+                    fontproperties=fonts[bold],
+                    va="baseline",
+                    ha="left",
+                )
+        canvas.draw()
+        img = Image.frombuffer(
+            "RGBA", (width_px, height_px), canvas.buffer_rgba(), "raw", "RGBA", 0, 1
+        ).convert("RGB")
+    return img
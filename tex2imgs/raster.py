@@ -0,0 +1,394 @@
+import os
+import re
+import subprocess
+import time
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Type
+
+from tex2imgs.supervisor import RenderTimeout, Supervisor, kill
+
+# PIL, pdf2image and pypdfium2 are imported by the backends that use them
+
+PPM_HEADER_FIELDS = 3  # width, height, maxval
+
+
+class RasterBackend:
+    """
+    Turns the pages of a PDF into RGB PIL images, in page order.
+
+    Subclasses implement `pages`. Backends hold no state between calls, so
+    one instance can be shared by several renders. Subprocesses and long
+    loops are run under the backend's supervisor (timeouts, cancellation).
+    """
+
+    name = ""
+
+    def __init__(self, supervisor: Optional[Supervisor] = None):
+        self.supervisor = supervisor or Supervisor()
+
+    def pages(
+        self,
+        path_pdf: str,
+        dpi: int,
+        first_page: int = 1,
+        last_page: Optional[int] = None,
+    ) -> Iterator:
+        """
+        Yield the pages of a PDF as images.
+
+        Parameters
+        ----------
+        path_pdf : str
+            Path to the PDF file.
+        dpi : int
+            Dots per inch of the images.
+        first_page : int, optional
+            First page to render, starting at 1.
+        last_page : int, optional
+            Last page to render (included). If None, render until the end.
+        """
+        raise NotImplementedError
+
+
+class Pdf2ImageBackend(RasterBackend):
+    """pdf2image: one pdftoppm process per batch of pages."""
+
+    name = "pdf2image"
+
+    def __init__(self, batch_size: int = 50, supervisor: Optional[Supervisor] = None):
+        super().__init__(supervisor)
+        self.batch_size = batch_size
+
+    def pages(self, path_pdf, dpi, first_page=1, last_page=None):
+        from pdf2image import convert_from_path, pdfinfo_from_path
+        from pdf2image.exceptions import PDFPopplerTimeoutError
+
+        # pdf2image starts its own processes: only the timeout applies
+        timeout = self.supervisor.timeout
+        if last_page is None:
+            last_page = pdfinfo_from_path(path_pdf, timeout=timeout)["Pages"]
+        for first in range(first_page, last_page + 1, self.batch_size):
+            self.supervisor.check()
+            try:
+                images = convert_from_path(
+                    path_pdf,
+                    first_page=first,
+                    last_page=min(first + self.batch_size - 1, last_page),
+                    dpi=dpi,
+                    timeout=timeout,
+                )
+            except PDFPopplerTimeoutError as e:
+                raise RenderTimeout(f"Timeout after {timeout:g}s: pdftoppm") from e
+            yield from images
+
+
+def read_ppm(stream: IO[bytes]):
+    """
+    Read one binary PPM (P6) image from a stream.
+
+    Returns None at the end of the stream. pdftoppm writes the pages back to
+    back, so the stream is consumed exactly up to the end of the image.
+    """
+    from PIL import Image
+
+    magic = stream.read(2)
+    if not magic:
+        return None
+    if magic != b"P6":
+        raise ValueError(f"Expected a PPM image, got {magic!r}")
+    fields = []
+    token = b""
+    while len(fields) < PPM_HEADER_FIELDS:
+        char = stream.read(1)
+        if not char:
+            raise ValueError("Truncated PPM header")
+        if char == b"#":
+            stream.readline()
+        elif char.isspace():
+            if token:
+                fields.append(int(token))
+                token = b""
+        else:
+            token += char
+    # The single whitespace after maxval was consumed by the loop
+    width, height, maxval = fields
+    if maxval != 255:
+        raise ValueError(f"Unsupported PPM maxval {maxval}")
+    size = width * height * 3
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated PPM image")
+    return Image.frombytes("RGB", (width, height), data)
+
+
+class PdftoppmPipeBackend(RasterBackend):
+    """
+    One pdftoppm process for the whole document, reading PPM from its stdout.
+
+    Pages are decoded as they are written, without intermediate files, and
+    the process starts once per PDF instead of once per batch.
+    """
+
+    name = "pdftoppm"
+
+    def __init__(
+        self, command: str = "pdftoppm", supervisor: Optional[Supervisor] = None
+    ):
+        super().__init__(supervisor)
+        self.command = command
+
+    def pages(self, path_pdf, dpi, first_page=1, last_page=None):
+        cmd = [self.command, "-r", str(dpi), "-f", str(first_page)]
+        if last_page is not None:
+            cmd += ["-l", str(last_page)]
+        cmd.append(path_pdf)
+        proc = self.supervisor.popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=1 << 20
+        )
+        try:
+            while True:
+                try:
+                    img = read_ppm(proc.stdout)
+                except ValueError:
+                    # Raise the reason instead, if the supervisor killed it
+                    proc.wait()
+                    self.supervisor.check(proc)
+                    raise
+                if img is None:
+                    break
+                yield img
+            proc.stdout.close()
+            retcode = proc.wait()
+            self.supervisor.check(proc)
+            if retcode != 0:
+                raise ValueError(
+                    "Error {} executing command: {}".format(retcode, " ".join(cmd))
+                )
+        finally:
+            # The consumer may stop early (or fail); do not leave it running
+            if proc.poll() is None:
+                kill(proc)
+
+
+class PdfiumBackend(RasterBackend):
+    """In-process rendering with pypdfium2 (optional dependency)."""
+
+    name = "pdfium"
+
+    def pages(self, path_pdf, dpi, first_page=1, last_page=None):
+        try:
+            import pypdfium2 as pdfium
+        except ImportError as e:
+            raise ImportError(
+                "The pdfium raster backend needs pypdfium2: pip install pypdfium2"
+            ) from e
+
+        timeout = self.supervisor.timeout
+        start = time.monotonic()
+        pdf = pdfium.PdfDocument(path_pdf)
+        try:
+            if last_page is None:
+                last_page = len(pdf)
+            for k in range(first_page - 1, last_page):
+                # In-process: limits are checked between pages
+                self.supervisor.check()
+                if timeout is not None and time.monotonic() - start > timeout:
+                    raise RenderTimeout(f"Timeout after {timeout:g}s: pdfium")
+                page = pdf[k]
+                bitmap = page.render(scale=dpi / 72)
+                yield bitmap.to_pil().convert("RGB")
+                page.close()
+        finally:
+            pdf.close()
+
+
+RASTER_BACKENDS: Dict[str, Type[RasterBackend]] = {
+    backend.name: backend
+    for backend in [Pdf2ImageBackend, PdftoppmPipeBackend, PdfiumBackend]
+}
+
+
+def get_backend(
+    name: str = "pdf2image",
+    batch_size: int = 50,
+    supervisor: Optional[Supervisor] = None,
+) -> RasterBackend:
+    """
+    Instantiate a raster backend by name.
+
+    Parameters
+    ----------
+    name : str, optional
+        One of "pdf2image" (default), "pdftoppm" or "pdfium".
+    batch_size : int, optional
+        Pages per pdftoppm call, only used by "pdf2image".
+    supervisor : Supervisor, optional
+        Limits for the subprocesses of the backend. No limits if None.
+    """
+    if name not in RASTER_BACKENDS:
+        raise ValueError(
+            f"Unknown raster backend {name!r}, "
+            f"choose one of: {', '.join(RASTER_BACKENDS)}"
+        )
+    if name == Pdf2ImageBackend.name:
+        return Pdf2ImageBackend(batch_size=batch_size, supervisor=supervisor)
+    return RASTER_BACKENDS[name](supervisor=supervisor)
+
+
+# DVI path: latex + dvipng, for questions that need no PDF-only features
+PAPERSIZE_MARKER = "tex2imgs-papersize="
+PAPERSIZE_TYPEOUT = (
+    r"\AtBeginDocument{\typeout{"
+    + PAPERSIZE_MARKER
+    + r"\the\paperwidth,\the\paperheight}}"
+)
+TEX_POINTS_PER_INCH = 72.27
+
+
+def dvi_paper_size(path_log: str) -> Tuple[float, float]:
+    """Page size in inches, as written to the log by PAPERSIZE_TYPEOUT."""
+    with open(path_log, "r", errors="replace") as f:
+        match = re.search(PAPERSIZE_MARKER + r"([\d.]+)pt,([\d.]+)pt", f.read())
+    if match is None:
+        raise ValueError(f"Page size not found in {path_log}")
+    width, height = (float(x) / TEX_POINTS_PER_INCH for x in match.groups())
+    return width, height
+
+
+def dvipng_files(
+    path_dvi: str,
+    dpi: int,
+    paper_size: Tuple[float, float],
+    pages: int,
+    supervisor: Optional[Supervisor] = None,
+) -> List[str]:
+    """
+    Convert every page of a DVI file to PNG with dvipng.
+
+    The images cover the full page, like the PDF backends, so both paths
+    share the whitespace scan and cropping. Returns the paths in page order.
+    Raises ValueError if dvipng fails or does not write the expected pages.
+    """
+    folder = os.path.join(os.path.dirname(path_dvi), "dvipng")
+    os.makedirs(folder, exist_ok=True)
+    width, height = paper_size
+    cmd = [
+        "dvipng",
+        "-q",
+        "-D",
+        str(dpi),
+        "-T",
+        f"{width:.4f}in,{height:.4f}in",
+        "-bg",
+        "rgb 1.0 1.0 1.0",
+        # Re-encoded after the size scan, so compress as little as possible
+        "-z",
+        "1",
+        "-o",
+        os.path.join(folder, "page%d.png"),
+        path_dvi,
+    ]
+    retcode = (supervisor or Supervisor()).run(cmd, stdout=subprocess.DEVNULL)
+    if retcode != 0:
+        raise ValueError(
+            "Error {} executing command: {}".format(retcode, " ".join(cmd))
+        )
+    files = sorted(
+        os.listdir(folder), key=lambda file: int(re.sub(r"\D", "", file) or 0)
+    )
+    if len(files) != pages:
+        raise ValueError(f"dvipng wrote {len(files)} pages, expected {pages}")
+    return [os.path.join(folder, file) for file in files]
+
+
+# SVG output: dvisvgm from the DVI, or pdftocairo from the PDF as a fallback
+PGF_DVISVGM = r"\def\pgfsysdriver{pgfsys-dvisvgm.def}"
+SVG_POINTS_PER_INCH = 72
+
+
+def dvisvgm_files(
+    path_dvi: str, pages: int, supervisor: Optional[Supervisor] = None
+) -> List[str]:
+    """
+    Convert every page of a DVI file to a tight-cropped SVG with dvisvgm.
+
+    Glyphs are written as paths, so the SVGs need no fonts. Returns the paths
+    in page order. Raises ValueError if dvisvgm fails.
+    """
+    folder = os.path.join(os.path.dirname(path_dvi), "dvisvgm")
+    os.makedirs(folder, exist_ok=True)
+    cmd = [
+        "dvisvgm",
+        "--no-fonts",
+        "--exact-bbox",
+        "--bbox=min",
+        "--page=1-",
+        "--verbosity=1",
+        "--output=" + os.path.join(folder, "page%p.svg"),
+        path_dvi,
+    ]
+    retcode = (supervisor or Supervisor()).run(cmd, stdout=subprocess.DEVNULL)
+    if retcode != 0:
+        raise ValueError(
+            "Error {} executing command: {}".format(retcode, " ".join(cmd))
+        )
+    files = sorted(
+        os.listdir(folder), key=lambda file: int(re.sub(r"\D", "", file) or 0)
+    )
+    if len(files) != pages:
+        raise ValueError(f"dvisvgm wrote {len(files)} pages, expected {pages}")
+    return [os.path.join(folder, file) for file in files]
+
+
+def pdftocairo_files(
+    path_pdf: str, pages: int, supervisor: Optional[Supervisor] = None
+) -> List[str]:
+    """
+    Convert every page of a PDF to SVG with pdftocairo.
+
+    pdftocairo writes one page per call and keeps the full page size. Raises
+    ValueError if pdftocairo fails.
+    """
+    folder = os.path.join(os.path.dirname(path_pdf), "pdftocairo")
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for page in range(1, pages + 1):
+        path_svg = os.path.join(folder, f"page{page}.svg")
+        cmd = ["pdftocairo", "-svg", "-f", str(page), "-l", str(page)]
+        cmd += [path_pdf, path_svg]
+        retcode = (supervisor or Supervisor()).run(cmd, stdout=subprocess.DEVNULL)
+        if retcode != 0:
+            raise ValueError(
+                "Error {} executing command: {}".format(retcode, " ".join(cmd))
+            )
+        files.append(path_svg)
+    return files
+
+
+def svg_size(path_svg: str) -> Tuple[float, float]:
+    """
+    Width and height of an SVG in points, from its root element.
+
+    Without width and height, the size of the viewBox is used: dvisvgm
+    writes its user units in points.
+    """
+    with open(path_svg, "r", errors="replace") as f:
+        head = f.read(4096)
+    match = re.search(r"<svg\b[^>]*>", head)
+    if match is None:
+        raise ValueError(f"No <svg> element in {path_svg}")
+    element = match.group(0)
+
+    def attribute(name: str) -> Optional[str]:
+        value = re.search(r"(?<![\w-])" + name + r"=['\"]([^'\"]*)['\"]", element)
+        return value.group(1) if value else None
+
+    size = [
+        re.fullmatch(r"([\d.]+)(pt)?", attribute(name) or "")
+        for name in ["width", "height"]
+    ]
+    if size[0] and size[1]:
+        return float(size[0].group(1)), float(size[1].group(1))
+    numbers = (attribute("viewBox") or "").replace(",", " ").split()
+    if len(numbers) != 4:
+        raise ValueError(f"No width and height, nor viewBox, in {path_svg}")
+    return float(numbers[2]), float(numbers[3])
@@ -0,0 +1,140 @@
+import io
+import tempfile
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from tex2imgs.supervisor import Supervisor
+from tex2imgs.utils import (
+    QuestionFilter,
+    check_options,
+    parse_questions,
+    render_images,
+    tex_environment,
+)
+
+
+@dataclass
+class RenderedQuestion:
+    """A question rendered in memory."""
+
+    name: str  # As in a build, e.g. "Algebra_LinearEquations_Q001_V01"
+    png: bytes  # Contents of <name>.png
+    size: int  # Row of sizes.csv, see `process_image`
+    width: int
+    height: int
+    scores: Dict  # Row of questions.csv
+
+    def array(self):
+        """The image as an RGB numpy array of shape (height, width, 3)."""
+        import numpy as np
+        from PIL import Image
+
+        return np.asarray(Image.open(io.BytesIO(self.png)).convert("RGB"))
+
+
+def render_questions(
+    source: Union[str, Iterable[str]],
+    score_good: float = 1,
+    score_bad: Optional[float] = None,
+    score_noanswer: Optional[float] = None,
+    batch_size: int = 50,
+    aspectratio: int = 169,
+    fontsize: int = 12,
+    linespread: float = 1.1,
+    dpi: int = 200,
+    crop: bool = False,
+    show_size: bool = False,
+    raster_backend: str = "pdf2image",
+    render_mode: str = "pdf",
+    template: str = "beamer",
+    figure_cache: Optional[str] = None,
+    timeout: Optional[float] = None,
+    memory_mb: Optional[int] = None,
+    cpu_seconds: Optional[int] = None,
+    cancel: Optional[Callable[[], bool]] = None,
+    select: Optional[QuestionFilter] = None,
+) -> Iterator[RenderedQuestion]:
+    """
+    Render questions without writing any output files.
+
+    The questions are compiled in a temporary folder, which is removed when
+    the iterator is exhausted or closed, and the images are kept in memory
+    as PNG bytes. Nothing else touches the disk: there is no figure cache
+    unless figure_cache is given. See `read_tex` for the parameters; the
+    output is always PNG.
+
+    Parameters
+    ----------
+    source : str or Iterable[str]
+        LaTeX source with \\begin{question} ... \\end{question} blocks: one
+        string, or an iterable of lines (with or without their newlines) or
+        questions.
+
+    Yields
+    ------
+    RenderedQuestion
+        One per question, in the order of the source, whatever the order
+        they are rendered in (see `render_mode`). Identical questions are
+        rendered once and share their image.
+    """
+    check_options(render_mode, "png", template)
+    if not isinstance(source, str):
+        source = "".join(
+            line if line.endswith("\n") else line + "\n" for line in source
+        )
+    questions, errors = parse_questions(
+        source.splitlines(keepends=True),
+        score_good=score_good,
+        score_bad=score_bad,
+        score_noanswer=score_noanswer,
+        select=select,
+    )
+    if errors:
+        idx, name, e = errors[0]
+        raise ValueError(f"Error in question {name}, line {idx}: {e}")
+
+    dict_groups: Dict[str, List[int]] = {}
+    for i, question in enumerate(questions):
+        dict_groups.setdefault(question.digest, []).append(i)
+    supervisor = Supervisor(
+        timeout, memory_mb, cpu_seconds, cancel, env=tex_environment()
+    )
+
+    with tempfile.TemporaryDirectory(prefix="tex2imgs_") as workdir:
+        pages = render_images(
+            questions,
+            list(dict_groups.values()),
+            workdir,
+            aspectratio=aspectratio,
+            fontsize=fontsize,
+            linespread=linespread,
+            dpi=dpi,
+            crop=crop,
+            show_size=show_size,
+            raster_backend=raster_backend,
+            render_mode=render_mode,
+            template=template,
+            figure_cache=figure_cache,
+            batch_size=batch_size,
+            supervisor=supervisor,
+        )
+        # Groups come out by render mode (e.g. mathtext first): hold the
+        # questions back until the ones before them are rendered
+        ready: Dict[int, RenderedQuestion] = {}
+        next_index = 0
+        for group, img, size in pages:
+            supervisor.check()
+            buffer = io.BytesIO()
+            img.save(buffer, "PNG")
+            for i in group:
+                ready[i] = RenderedQuestion(
+                    name=questions[i].name,
+                    png=buffer.getvalue(),
+                    size=size,
+                    width=img.size[0],
+                    height=img.size[1],
+                    scores=questions[i].scores,
+                )
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index += 1
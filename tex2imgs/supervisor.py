@@ -0,0 +1,188 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+POLL_SECONDS = 0.2
+# Soft CPU limit first (SIGXCPU), then the hard one (SIGKILL)
+CPU_GRACE_SECONDS = 5
+
+
+class RenderAborted(Exception):
+    """A render step was stopped by the supervisor."""
+
+
+class RenderTimeout(RenderAborted):
+    """A render step exceeded its time limit."""
+
+
+class RenderCancelled(RenderAborted):
+    """The render was cancelled, e.g. because the user left the page."""
+
+
+class RenderKilled(RenderAborted):
+    """A render step died from a signal, e.g. when over its CPU limit."""
+
+
+class Supervisor:
+    """
+    Run the render subprocesses (pdflatex, pdftoppm, dvipng...) under limits.
+
+    Every process runs in its own process group, so that killing it also
+    kills whatever it started. A watcher thread kills the group when the
+    process exceeds its wall-clock timeout or when `cancel` returns True.
+    Memory and CPU limits are applied to the started process with prlimit
+    (Linux only). A process that dies from a signal (e.g. SIGXCPU or SIGKILL
+    over its CPU limit) raises RenderKilled: like a timeout, it is final and
+    not worth retrying with another renderer.
+
+    Parameters
+    ----------
+    timeout : float, optional
+        Wall-clock seconds allowed to each subprocess. No limit if None.
+    memory_mb : int, optional
+        Address space limit of each subprocess, in MB (RLIMIT_AS).
+    cpu_seconds : int, optional
+        CPU time limit of each subprocess, in seconds (RLIMIT_CPU).
+    cancel : Callable[[], bool], optional
+        Polled while the subprocesses run; returning True kills them and
+        raises RenderCancelled.
+    env : Dict[str, str], optional
+        Environment of the subprocesses, e.g. with TEXINPUTS set (see
+        `tex2imgs.utils.tex_environment`). The current one if None.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        memory_mb: Optional[int] = None,
+        cpu_seconds: Optional[int] = None,
+        cancel: Optional[Callable[[], bool]] = None,
+        env: Optional[Dict[str, str]] = None,
+    ):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.cancel = cancel
+        self.env = env
+        # Why each killed process was killed, by pid
+        self.killed: Dict[int, RenderAborted] = {}
+
+    def _set_limits(self, pid: int):
+        # Applied after the process starts: preexec_fn is not safe when other
+        # threads are running (Streamlit, watchers, thread pools)
+        import resource
+
+        try:
+            if self.memory_mb is not None:
+                limit = self.memory_mb * 2**20
+                resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            if self.cpu_seconds is not None:
+                resource.prlimit(
+                    pid,
+                    resource.RLIMIT_CPU,
+                    (self.cpu_seconds, self.cpu_seconds + CPU_GRACE_SECONDS),
+                )
+        except ProcessLookupError:
+            # Already exited
+            pass
+
+    def popen(self, cmd: List[str], **kwargs) -> subprocess.Popen:
+        """Start a supervised process. Same arguments as subprocess.Popen."""
+        self.check()
+        if self.env is not None:
+            kwargs.setdefault("env", self.env)
+        if os.name == "posix":
+            kwargs.setdefault("start_new_session", True)
+        proc = subprocess.Popen(cmd, **kwargs)
+        limited = self.memory_mb is not None or self.cpu_seconds is not None
+        if limited and sys.platform.startswith("linux"):
+            self._set_limits(proc.pid)
+        if self.timeout is not None or self.cancel is not None:
+            watcher = threading.Thread(
+                target=self._watch, args=(proc, cmd), daemon=True
+            )
+            watcher.start()
+        return proc
+
+    def _watch(self, proc: subprocess.Popen, cmd: List[str]):
+        start = time.monotonic()
+        while proc.poll() is None:
+            if self.cancel is not None and self.cancel():
+                reason = RenderCancelled(f"Cancelled: {' '.join(cmd)}")
+            elif self.timeout is not None and time.monotonic() - start > self.timeout:
+                reason = RenderTimeout(
+                    f"Timeout after {self.timeout:g}s: {' '.join(cmd)}"
+                )
+            else:
+                time.sleep(POLL_SECONDS)
+                continue
+            self.killed[proc.pid] = reason
+            kill(proc)
+            return
+
+    def run(self, cmd: List[str], **kwargs) -> int:
+        """
+        Run a supervised process to completion and return its exit code.
+
+        Raises RenderTimeout or RenderCancelled if it had to be killed, and
+        RenderKilled if it died from a signal.
+        """
+        proc = self.popen(cmd, **kwargs)
+        try:
+            proc.communicate()
+        finally:
+            if proc.poll() is None:
+                kill(proc)
+        self.check(proc)
+        return proc.returncode
+
+    def check(self, proc: Optional[subprocess.Popen] = None):
+        """
+        Raise if the render must stop.
+
+        Call it between steps that run in this process, or with a process
+        that has exited, to raise the reason it was killed.
+        """
+        if proc is not None and proc.pid in self.killed:
+            raise self.killed.pop(proc.pid)
+        if proc is not None and proc.returncode is not None and proc.returncode < 0:
+            name = signal.Signals(-proc.returncode).name
+            args = proc.args if isinstance(proc.args, str) else " ".join(proc.args)
+            raise RenderKilled(f"Killed by {name}: {args}")
+        if self.cancel is not None and self.cancel():
+            raise RenderCancelled("Cancelled")
+
+
+def kill(proc: subprocess.Popen):
+    """Kill a process and its process group, and wait for it."""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+    proc.wait()
+
+
+def streamlit_cancel() -> Optional[Callable[[], bool]]:
+    """
+    Cancellation callback for renders started by a Streamlit page.
+
+    Returns True once the browser session that started the render is gone
+    (tab closed, connection lost), so its subprocesses are killed instead of
+    occupying the server. None outside a Streamlit script run.
+    """
+    from streamlit.runtime import exists, get_instance
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    if ctx is None or not exists():
+        return None
+    runtime = get_instance()
+    session_id = ctx.session_id
+    return lambda: not runtime.is_active_session(session_id)
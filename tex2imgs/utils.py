@@ -1,17 +1,24 @@
+import csv
+import fnmatch
+import hashlib
+import io
+import itertools
 import json
 import os
 import re
-import subprocess
+import shutil
 import sys
+import tempfile
 import zipfile
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-import numpy as np
-import pandas as pd
-import typer
-from pdf2image import convert_from_path
-from PIL import ImageDraw, ImageFont
+from tex2imgs.supervisor import Supervisor
+
+# numpy, pdf2image and PIL are imported where the images are rasterized, and
+# typer only when run as a script, so importing this module stays fast
 
 TXT_FULL = r"""
     \documentclass[$FONTSIZE$pt, aspectratio=$ASPECT$, fleqn]{beamer}
@@ -36,6 +43,61 @@ TXT_FULL = r"""
 
     """
 
+# Lighter alternative to the beamer template: every question is one page of
+# the standalone class, as wide as its contents (up to the text width of the
+# slide) and as tall as its contents, so the pages need no whitespace scan
+TXT_STANDALONE = r"""
+    \documentclass[$FONTSIZE$pt, varwidth=$WIDTH$, border=$BORDER$, multi=qpage,
+        fleqn]{standalone}
+    \usepackage{amsmath}
+    \usepackage{amssymb}
+    \usepackage{caption}
+    \usepackage{subcaption}
+    \usepackage{graphicx}
+    \usepackage{mathtools}
+    \usepackage{pgfplots}
+    \usepackage{pifont}
+    \usepackage{tikz}
+    \usepackage{tkz-euclide}
+    \usetikzlibrary{calc}
+    \usepackage{xcolor}
+    \usepackage{wrapfig}
+    \renewcommand{\familydefault}{\sfdefault}
+    \setlength\parindent{0pt}
+    \linespread{$LINESPREAD$}
+
+    \begin{document}
+
+    """
+TEMPLATES = ["beamer", "standalone"]
+# Slide width of each beamer aspect ratio, in cm (16 for any other ratio)
+BEAMER_WIDTHS_CM = {
+    1610: 16,
+    169: 16,
+    149: 14,
+    141: 14.85,
+    54: 12.5,
+    43: 12.8,
+    32: 13.5,
+}
+# Beamer leaves a 1 cm margin on each side of the text
+BEAMER_MARGIN_CM = 1
+STANDALONE_BORDER = "4pt"
+
+# dvipng cannot draw PostScript specials (tikz, pgfplots) nor embedded
+# graphics, so questions using them always go through pdflatex
+PDF_ONLY = re.compile(
+    r"\\(?:includegraphics|tikz|tkz|pgf|addplot|begin\{(?:tikzpicture|axis)\})"
+)
+RENDER_MODES = ["pdf", "auto", "mathtext"]
+OUTPUT_FORMATS = ["png", "svg"]
+# Persistent cache of the compiled tikz pictures (see tex2imgs.figures)
+DEFAULT_FIGURE_CACHE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "tex2imgs",
+    "figures",
+)
+
 
 def process_question(
     lines: List[str],
@@ -103,29 +165,258 @@ def process_question(
     return txt, dict_question
 
 
-def read_tex(
-    path_file: Union[str, List[str]],
-    path_output: str,
+@dataclass
+class Question:
+    """A parsed question, ready to be compiled as one beamer frame."""
+
+    name: str  # Output name, e.g. "Algebra_LinearEquations_Q001_V01"
+    body: str  # Frame source, as returned by process_question
+    scores: Dict  # Row of questions.csv
+    section: Optional[str] = None
+    subsection: Optional[str] = None
+    index: int = 0
+    version: Optional[int] = None
+    source: Optional[str] = None
+    line: int = 0  # Line of \begin{question} in the source, starting at 1
+
+    @property
+    def digest(self) -> str:
+        """Hash of the body, ignoring differences in whitespace."""
+        normalized = " ".join(self.body.split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def parse_versions(text: str) -> List[Tuple[int, int]]:
+    """Parse version ranges such as "1-3,5" into [(1, 3), (5, 5)]."""
+    ranges = []
+    for part in text.split(","):
+        match = re.fullmatch(r"\s*(\d+)\s*(?:-\s*(\d+)\s*)?", part)
+        if match is None:
+            raise ValueError(f"Invalid version range: {part}")
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if last < first:
+            raise ValueError(f"Invalid version range: {part}")
+        ranges.append((first, last))
+    return ranges
+
+
+@dataclass
+class QuestionFilter:
+    """
+    Select the questions of a file to render.
+
+    Sections and subsections are matched with shell-style globs against
+    their names as they appear in the question names (without spaces,
+    underscores and commas), and questions against their full names, e.g.
+    "Algebra_*_Q001_V*". Empty lists select everything. Versions are ranges
+    such as "1-3,5"; questions without versions always pass them.
+    """
+
+    sections: List[str] = field(default_factory=list)
+    subsections: List[str] = field(default_factory=list)
+    questions: List[str] = field(default_factory=list)
+    versions: Optional[str] = None
+
+    def __post_init__(self):
+        self.version_ranges = (
+            parse_versions(self.versions) if self.versions is not None else None
+        )
+
+    def __call__(
+        self,
+        name: str,
+        section: Optional[str],
+        subsection: Optional[str],
+        version: Optional[int],
+    ) -> bool:
+        """Whether the question with these name, section... is selected."""
+
+        def matches(value: Optional[str], patterns: List[str]) -> bool:
+            if not patterns:
+                return True
+            if value is None:
+                return False
+            return any(
+                fnmatch.fnmatchcase(value, re.sub(r"[ _,]", "", pattern))
+                for pattern in patterns
+            )
+
+        if not matches(section, self.sections):
+            return False
+        if not matches(subsection, self.subsections):
+            return False
+        if self.questions and not any(
+            fnmatch.fnmatchcase(name, pattern) for pattern in self.questions
+        ):
+            return False
+        if self.version_ranges is not None and version is not None:
+            return any(first <= version <= last for first, last in self.version_ranges)
+        return True
+
+
+def link_or_copy(src: str, dst: str):
+    """Hard-link dst to src, or copy it where links are not supported."""
+    if os.path.exists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def write_output(path: str, write: Callable[[str], None]):
+    """
+    Write a file of an output through a temporary file, then rename it.
+
+    write(path_partial) writes the contents. Identical questions share their
+    image through hard links (see `build_questions`): replacing the file,
+    instead of writing over it, leaves the other links unchanged.
+    """
+    path_partial = path + ".part"
+    try:
+        write(path_partial)
+        os.replace(path_partial, path)
+    except BaseException:
+        if os.path.exists(path_partial):
+            os.remove(path_partial)
+        raise
+
+
+def write_bytes(path: str, data: bytes):
+    """Write a file of an output with `write_output`."""
+
+    def write(path_partial: str):
+        with open(path_partial, "wb") as f:
+            f.write(data)
+
+    write_output(path, write)
+
+
+def score_table(ls_dict: List[Dict]) -> Tuple[List[str], List[List[str]]]:
+    """
+    Turn the question dictionaries into the header and rows of a CSV.
+
+    Columns appear in order of first use. Values are formatted as pandas
+    would: a numeric column with a float or a missing value is all floats.
+    """
+    header = list(dict.fromkeys(k for d in ls_dict for k in d))
+    columns = []
+    for key in header:
+        values = [d.get(key) for d in ls_dict]
+        present = [v for v in values if v is not None]
+        numeric = all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in present
+        )
+        as_float = numeric and (
+            len(present) < len(values) or any(isinstance(v, float) for v in present)
+        )
+        columns.append(
+            [
+                "" if v is None else str(float(v)) if as_float else str(v)
+                for v in values
+            ]
+        )
+    return header, [list(row) for row in zip(*columns)]
+
+
+def read_score_table(txt: str) -> List[Dict]:
+    """
+    Read the question dictionaries back from a table of `score_table`.
+
+    Empty cells become None and the scores are parsed as numbers, so that
+    the rows can be formatted again together with new ones.
+    """
+
+    def parse(value: str):
+        if value == "":
+            return None
+        if re.fullmatch(r"-?\d+", value):
+            return int(value)
+        if re.fullmatch(r"-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?", value):
+            return float(value)
+        return value
+
+    reader = csv.reader(io.StringIO(txt))
+    header = next(reader)
+    return [
+        dict(zip(header, [row[0]] + [parse(value) for value in row[1:]]))
+        for row in reader
+    ]
+
+
+def write_csv(path: str, header: List[str], rows: List[List[str]]):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def output_folder(path_output: str) -> str:
+    """Folder where the images are written (the ZIP path without ".zip")."""
+    if path_output.endswith(".zip"):
+        return path_output[:-4]
+    return path_output
+
+
+def read_output_file(path_output: str, name: str) -> Optional[str]:
+    """
+    Text of a file of an existing output, None if it has no such file.
+
+    The output folder comes first: while a ZIP output is being rebuilt, its
+    folder holds the newer files.
+    """
+    path = os.path.join(output_folder(path_output), name)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return f.read()
+    if path_output.endswith(".zip") and os.path.exists(path_output):
+        with zipfile.ZipFile(path_output) as zipf:
+            try:
+                return zipf.read(name).decode("utf-8")
+            except KeyError:
+                return None
+    return None
+
+
+def merge_rows(
+    txt_old: Optional[str], header: List[str], rows: List[List[str]]
+) -> Tuple[List[str], List[List[str]]]:
+    """
+    Merge the rows of a CSV file with new rows, by their first column.
+
+    The new rows replace the old ones with the same item, in place, and the
+    others are added at the end. Columns missing from a row are left empty.
+    """
+    if not txt_old:
+        return header, rows
+    reader = csv.reader(io.StringIO(txt_old))
+    old_header = next(reader)
+    merged_header = list(dict.fromkeys(old_header + header))
+    dict_new = {row[0]: dict(zip(header, row)) for row in rows}
+    merged = []
+    for row in reader:
+        merged.append(dict_new.pop(row[0], None) or dict(zip(old_header, row)))
+    merged.extend(dict_new.values())
+    return merged_header, [[d.get(k, "") for k in merged_header] for d in merged]
+
+
+def parse_questions(
+    lines: List[str],
     score_good: float = 1,
     score_bad: Optional[float] = None,
     score_noanswer: Optional[float] = None,
-    batch_size: int = 50,
-    aspectratio: int = 169,
-    fontsize: int = 12,
-    linespread: float = 1.1,
-    dpi: int = 200,
-    crop: bool = False,
-    show_size: bool = False,
-):
+    source: Optional[str] = None,
+    origins: Optional[List[Tuple[str, int]]] = None,
+    select: Optional[QuestionFilter] = None,
+) -> Tuple[List[Question], List[Tuple[int, str, Exception]]]:
     """
-    Read a LaTeX file and extract the questions and choices.
+    Extract the questions of a LaTeX file.
 
     Parameters
     ----------
-    path_file : str
-        Path to the LaTeX file.
-    path_output : str
-        Path to the output folder or zip file.
+    lines : List[str]
+        Lines of the LaTeX file.
     score_good : float, optional
         Score for the correct answer.
     score_bad : float, optional
@@ -133,44 +424,29 @@ def read_tex(
         If None, it will be set to -score_good / number_of_choices.
     score_noanswer : float, optional
         Score for not answering the question. This is added as a last option.
-    aspectratio : int, optional
-        Aspect ratio for the images, default is 169.
-        As of the 2022, arbitrary aspect ratios are available.
-        Two-digit numbers will be interpreted as X:Y,
-        three-digit numbers as XX:Y and four digit as XX:YY.
-    fontsize : int, optional
-        Font size for the images, default is 12.
-    dpi : int, optional
-        Dots per inch for the images, default is 200.
-    crop : bool, optional
-        Whether to crop the images, default is False.
-    """
-    # Insert the line in the preamble (third line)
-    txt_full = TXT_FULL.replace("$ASPECT$", str(aspectratio), 1)
-    txt_full = txt_full.replace("$FONTSIZE$", str(fontsize), 1)
-    txt_full = txt_full.replace("$LINESPREAD$", str(linespread), 1)
-
-    if path_output.endswith(".zip"):
-        out_folder = path_output[:-4]
-    else:
-        out_folder = path_output
-
-    if not os.path.exists(out_folder):
-        os.makedirs(out_folder)
+    source : str, optional
+        Path of the LaTeX file, stored in each question.
+    origins : List[Tuple[str, int]], optional
+        Source file and line number of each line, when the lines come from
+        several files (see tex2imgs.includes). Overrides source.
+    select : QuestionFilter, optional
+        Only the selected questions are processed and returned. The others
+        still count towards the question indices, so the names do not change.
 
-    if isinstance(path_file, str):
-        with open(path_file, "r") as f:
-            lines = f.readlines()
-    else:
-        # Assume it is a list of strings
-        lines = path_file
-
-    ls_dict_questions = []
-    ls_fout = []
+    Returns
+    -------
+    List[Question]
+        Questions in the order they appear.
+    List[Tuple[int, str, Exception]]
+        Questions that could not be processed: (line index, name, error).
+    """
+    questions = []
+    errors = []
     question_index = 0
     version_index = None
     section = None
     subsection = None
+    question_start = 0
 
     for idx, line in enumerate(lines):
         line = line.strip()
@@ -201,78 +477,418 @@ def read_tex(
                 version_index += 1
             line = line.replace("\\begin{question}", "\\begin{frame}\n")
             question_lines = [line]  # Reset
+            question_start = idx
         elif line.endswith("\\end{question}"):
             line = line.replace("\\end{question}", "\\end{frame}\n")
             question_lines.append(line)
-            fout = out_folder + "/"
+            name = ""
             if section is not None:
                 # Remove spaces, underscores and commas
                 section = re.sub(r"[ _,]", "", section)
-                fout += f"{section}_"
+                name += f"{section}_"
             if subsection is not None:
                 # Remove spaces, underscores and commas
                 subsection = re.sub(r"[ _,]", "", subsection)
-                fout += f"{subsection}_"
-            fout += f"Q{question_index:03d}"
+                name += f"{subsection}_"
+            name += f"Q{question_index:03d}"
             if version_index is not None:
-                fout += f"_V{version_index:02d}"
+                name += f"_V{version_index:02d}"
+            if select is not None and not select(
+                name, section, subsection, version_index
+            ):
+                continue
+            if origins is None:
+                question_source, question_line = source, question_start + 1
+            else:
+                question_source, question_line = origins[question_start]
             try:
                 txt, dict_question = process_question(
                     question_lines,
-                    fout,
+                    name,
                     score_good=score_good,
                     score_bad=score_bad,
                     score_noanswer=score_noanswer,
                 )
-                ls_dict_questions.append(dict_question)
-                txt_full += txt
-                ls_fout.append(fout)
             except Exception as e:
-                print(f"Error in question {fout}, line {idx}")
-                # Save a traceback
-                with open(out_folder + f"/error_{idx:04d}.txt", "w") as f:
-                    f.write(str(e))
+                errors.append((idx, name, e))
+                continue
+            questions.append(
+                Question(
+                    name=name,
+                    body=txt,
+                    scores=dict_question,
+                    section=section,
+                    subsection=subsection,
+                    index=question_index,
+                    version=version_index,
+                    source=question_source,
+                    line=question_line,
+                )
+            )
         elif question_index > 0:
             question_lines.append(line)
 
-    txt_full += "\n\end{document}"
+    return questions, errors
 
-    with open("cover.tex", "w") as f:
-        f.write(txt_full)
 
-    cmd = ["pdflatex", "-interaction", "nonstopmode", "cover.tex"]
-    proc = subprocess.Popen(cmd)
-    proc.communicate()
+def write_errors(out_folder: str, errors: List[Tuple[int, str, Exception]]):
+    """Report the questions that could not be parsed, one error file each."""
+    if errors and not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+    for idx, name, e in errors:
+        print(f"Error in question {out_folder}/{name}, line {idx}")
+        # Save a traceback
+        with open(out_folder + f"/error_{idx:04d}.txt", "w") as f:
+            f.write(str(e))
+
+
+def read_tex(
+    path_file: Union[str, List[str]],
+    path_output: str,
+    score_good: float = 1,
+    score_bad: Optional[float] = None,
+    score_noanswer: Optional[float] = None,
+    batch_size: int = 50,
+    aspectratio: int = 169,
+    fontsize: int = 12,
+    linespread: float = 1.1,
+    dpi: int = 200,
+    crop: bool = False,
+    show_size: bool = False,
+    path_index: Optional[str] = None,
+    raster_backend: str = "pdf2image",
+    render_mode: str = "pdf",
+    output_format: str = "png",
+    template: str = "beamer",
+    figure_cache: Optional[str] = DEFAULT_FIGURE_CACHE,
+    timeout: Optional[float] = None,
+    memory_mb: Optional[int] = None,
+    cpu_seconds: Optional[int] = None,
+    cancel: Optional[Callable[[], bool]] = None,
+    select: Optional[QuestionFilter] = None,
+):
+    """
+    Read a LaTeX file and extract the questions and choices.
+
+    Parameters
+    ----------
+    path_file : str
+        Path to the LaTeX file. The files it includes with \\input or
+        \\include are read too, and the dependency graph of the questions on
+        the files is written to dependencies.json (see tex2imgs.includes).
+    path_output : str
+        Path to the output folder or zip file.
+    score_good : float, optional
+        Score for the correct answer.
+    score_bad : float, optional
+        Score for the wrong answers.
+        If None, it will be set to -score_good / number_of_choices.
+    score_noanswer : float, optional
+        Score for not answering the question. This is added as a last option.
+    aspectratio : int, optional
+        Aspect ratio for the images, default is 169.
+        As of the 2022, arbitrary aspect ratios are available.
+        Two-digit numbers will be interpreted as X:Y,
+        three-digit numbers as XX:Y and four digit as XX:YY.
+    fontsize : int, optional
+        Font size for the images, default is 12.
+    dpi : int, optional
+        Dots per inch for the images, default is 200.
+    crop : bool, optional
+        Whether to crop the images, default is False.
+    path_index : str, optional
+        Path to the SQLite question index (see tex2imgs.index) to update
+        with the rendered questions. Not updated if None.
+    raster_backend : str, optional
+        How the PDF pages are turned into images (see tex2imgs.raster):
+        "pdf2image" (default), "pdftoppm" or "pdfium".
+    render_mode : str, optional
+        "pdf" (default) compiles every question with pdflatex. "auto" renders
+        the questions without tikz, pgfplots or graphics with latex and
+        dvipng, which is faster, and the rest with pdflatex. Falls back to
+        pdflatex for all questions if the DVI render fails. "mathtext" draws
+        the questions made of plain text and inline math with matplotlib,
+        without LaTeX (see tex2imgs.mathtext), and compiles the rest with
+        pdflatex. Both render modes only apply to the beamer template.
+    output_format : str, optional
+        "png" (default) or "svg". SVG output skips rasterization: each
+        question is converted by dvisvgm, cropped to its contents, with the
+        glyphs as paths. dpi, crop and show_size do not change the SVGs, but
+        the sizes are still reported in pixels at dpi.
+    template : str, optional
+        "beamer" (default) renders each question on a slide of the given
+        aspect ratio. "standalone" renders each question on a page sized to
+        its contents, at most as wide as the text of that slide; it is
+        faster to compile and rasterize, and needs no cropping. The
+        questions are always compiled with pdflatex (render_mode is ignored).
+    figure_cache : str, optional
+        Folder where the tikz pictures compiled with pdflatex are cached, by
+        hash of their source and the preamble, so that unchanged pictures
+        are not compiled again (see tex2imgs.figures). No cache if None.
+    timeout : float, optional
+        Wall-clock seconds allowed to each subprocess (pdflatex, pdftoppm...).
+        A process over the limit is killed and RenderTimeout is raised.
+    memory_mb : int, optional
+        Memory limit of each subprocess, in MB.
+    cpu_seconds : int, optional
+        CPU time limit of each subprocess, in seconds.
+    cancel : Callable[[], bool], optional
+        Polled during the render; once it returns True, the subprocesses are
+        killed and RenderCancelled is raised. See tex2imgs.supervisor.
+    select : QuestionFilter, optional
+        Render only the questions it selects (by section, subsection, name or
+        version). The others are skipped while parsing, and the selected
+        ones keep the names and indices they have in a full build. An
+        existing output keeps the other questions: the new images and rows
+        are merged into its files, tables and manifest.
+
+    Yields
+    ------
+    float
+        Progress of the render, from 0 to 1.
+
+    Returns
+    -------
+    int
+        Number of questions rendered (the value of the StopIteration).
+    """
+    out_folder = output_folder(path_output)
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    tree = None
+    if isinstance(path_file, str):
+        from tex2imgs.includes import read_source_tree
+
+        tree = read_source_tree(path_file)
+        lines = tree.lines
+        origins = tree.origins
+    else:
+        # Assume it is a list of strings
+        lines = path_file
+        origins = None
+
+    questions, errors = parse_questions(
+        lines,
+        score_good=score_good,
+        score_bad=score_bad,
+        score_noanswer=score_noanswer,
+        origins=origins,
+        select=select,
+    )
+    write_errors(out_folder, errors)
+    if tree is not None:
+        from tex2imgs.includes import (
+            DEPENDENCIES_FILE,
+            dependency_graph,
+            merge_dependencies,
+            write_dependencies,
+        )
+
+        graph = dependency_graph(tree, questions)
+        if select is not None:
+            graph = merge_dependencies(
+                read_output_file(path_output, DEPENDENCIES_FILE), graph
+            )
+        write_dependencies(out_folder, graph)
+
+    return (
+        yield from build_questions(
+            questions,
+            path_output,
+            batch_size=batch_size,
+            aspectratio=aspectratio,
+            fontsize=fontsize,
+            linespread=linespread,
+            dpi=dpi,
+            crop=crop,
+            show_size=show_size,
+            path_index=path_index,
+            raster_backend=raster_backend,
+            render_mode=render_mode,
+            output_format=output_format,
+            template=template,
+            figure_cache=figure_cache,
+            timeout=timeout,
+            memory_mb=memory_mb,
+            cpu_seconds=cpu_seconds,
+            cancel=cancel,
+            merge=select is not None,
+        )
+    )
+
+
+def build_document(
+    bodies: List[str],
+    aspectratio: int = 169,
+    fontsize: int = 12,
+    linespread: float = 1.1,
+    template: str = "beamer",
+) -> str:
+    """
+    Full LaTeX document with one page per question body.
+
+    With the "beamer" template every body is a frame of a slide of the given
+    aspect ratio. With "standalone" the frames become pages of the standalone
+    class, at most as wide as the text of that slide and cropped to their
+    contents by LaTeX.
+    """
+    if template == "standalone":
+        width = BEAMER_WIDTHS_CM.get(aspectratio, 16) - 2 * BEAMER_MARGIN_CM
+        txt_full = TXT_STANDALONE.replace("$WIDTH$", f"{width:g}cm", 1)
+        txt_full = txt_full.replace("$BORDER$", STANDALONE_BORDER, 1)
+        bodies = [
+            body.replace("\\begin{frame}", "\\begin{qpage}").replace(
+                "\\end{frame}", "\\end{qpage}"
+            )
+            for body in bodies
+        ]
+    elif template == "beamer":
+        txt_full = TXT_FULL.replace("$ASPECT$", str(aspectratio), 1)
+    else:
+        raise ValueError(
+            f"Unknown template {template!r}, choose one of: {', '.join(TEMPLATES)}"
+        )
+    # Insert the line in the preamble (third line)
+    txt_full = txt_full.replace("$FONTSIZE$", str(fontsize), 1)
+    txt_full = txt_full.replace("$LINESPREAD$", str(linespread), 1)
+    txt_full += "".join(bodies)
+    txt_full += "\n\\end{document}"
+    return txt_full
+
+
+def tex_environment(sources: Iterable[Optional[str]] = ()) -> Dict[str, str]:
+    """
+    Environment for compiling in a private folder as if in place.
+
+    TEXINPUTS makes the relative paths of the questions (\\includegraphics,
+    \\input, data files of pgfplots...) resolve against the folders of their
+    source files and the current folder, after the compilation folder and
+    before the default search path.
+
+    Parameters
+    ----------
+    sources : Iterable[str], optional
+        Source files of the questions (see `Question.source`).
+    """
+    folders = ["."]
+    for source in sources:
+        if source is None:
+            continue
+        folder = os.path.dirname(os.path.abspath(source))
+        if folder not in folders:
+            folders.append(folder)
+    if os.getcwd() not in folders:
+        folders.append(os.getcwd())
+    env = dict(os.environ)
+    # The trailing separator appends the default search path
+    env["TEXINPUTS"] = os.pathsep.join(folders + [env.get("TEXINPUTS", "")])
+    return env
+
+
+def compile_tex(
+    txt_full: str,
+    workdir: str,
+    engine: str = "pdflatex",
+    jobname: str = "cover",
+    supervisor: Optional[Supervisor] = None,
+) -> str:
+    """
+    Compile a LaTeX document inside workdir.
+
+    Returns the path to the output: a PDF with pdflatex, a DVI with latex.
+    Raises ValueError if the compilation fails, and RenderTimeout or
+    RenderCancelled if the supervisor stops it.
+    """
+    with open(os.path.join(workdir, jobname + ".tex"), "w") as f:
+        f.write(txt_full)
 
-    retcode = proc.returncode
+    cmd = [engine, "-interaction", "nonstopmode", jobname + ".tex"]
+    retcode = (supervisor or Supervisor()).run(cmd, cwd=workdir)
     if not retcode == 0:
-        os.unlink("cover.pdf")
         raise ValueError(
             "Error {} executing command: {}".format(retcode, " ".join(cmd))
         )
+    extension = ".dvi" if engine == "latex" else ".pdf"
+    return os.path.join(workdir, jobname + extension)
 
-    # Turn the list of dictionaries into a DataFrame
-    df = pd.DataFrame(ls_dict_questions)
-    # Split into sub-dataframes by section
-    df["Section"] = df["Item"].apply(lambda x: x.split("_")[0])
-    for section in df["Section"].unique():
-        df_section = df[df["Section"] == section]
-        df_section = df_section.drop(columns=["Section"])
-        df_section.to_csv(out_folder + f"/questions_{section}.csv", index=False)
-    df = df.drop(columns=["Section"])
-    df.to_csv(out_folder + "/questions.csv", index=False)
 
-    # Store the size of the images
-    dict_sizes = {}
-    # Convert the PDF to PNG
-    j = 0
-    for i, fout in enumerate(ls_fout):
-        if i % batch_size == 0:
-            images = convert_from_path(
-                "cover.pdf", first_page=i + 1, last_page=i + batch_size, dpi=dpi
-            )
-            j = i
-        img = images[i - j]
+def needs_pdf(body: str) -> bool:
+    """Whether a question body uses features that only pdflatex renders."""
+    return PDF_ONLY.search(body) is not None
+
+
+def render_dvi(
+    txt_full: str,
+    workdir: str,
+    dpi: int,
+    pages: int,
+    supervisor: Optional[Supervisor] = None,
+) -> List[str]:
+    """
+    Render a document with latex and dvipng. Returns one PNG path per page.
+
+    Raises ValueError if either step fails, so the caller can fall back to
+    the PDF path.
+    """
+    from tex2imgs.raster import PAPERSIZE_TYPEOUT, dvi_paper_size, dvipng_files
+
+    # Report the page size in the log, so dvipng renders the full page
+    txt_full = txt_full.replace(
+        "\\begin{document}", PAPERSIZE_TYPEOUT + "\n    \\begin{document}", 1
+    )
+    path_dvi = compile_tex(
+        txt_full, workdir, engine="latex", jobname="cover_dvi", supervisor=supervisor
+    )
+    paper_size = dvi_paper_size(os.path.join(workdir, "cover_dvi.log"))
+    return dvipng_files(path_dvi, dpi, paper_size, pages, supervisor=supervisor)
+
+
+def render_svg(
+    txt_full: str, workdir: str, pages: int, supervisor: Optional[Supervisor] = None
+) -> List[str]:
+    """
+    Render a document as one SVG per page, without rasterizing.
+
+    Uses latex and dvisvgm, which crop each page to its contents. If that
+    fails, falls back to pdflatex and pdftocairo, which keep the full page.
+    Raises ValueError if both fail.
+    """
+    from tex2imgs.raster import PGF_DVISVGM, dvisvgm_files, pdftocairo_files
+
+    try:
+        # tikz and pgfplots must emit SVG instead of PostScript specials
+        path_dvi = compile_tex(
+            PGF_DVISVGM + txt_full,
+            workdir,
+            engine="latex",
+            jobname="cover_dvi",
+            supervisor=supervisor,
+        )
+        return dvisvgm_files(path_dvi, pages, supervisor=supervisor)
+    except ValueError as e:
+        print(f"dvisvgm render failed ({e}), falling back to pdftocairo")
+    path_pdf = compile_tex(txt_full, workdir, supervisor=supervisor)
+    return pdftocairo_files(path_pdf, pages, supervisor=supervisor)
+
+
+def process_image(
+    img, crop: bool = False, show_size: bool = False, tight: bool = False
+):
+    """
+    Measure a rendered page, and optionally crop and annotate it.
+
+    Returns the image and its size: the height from the top of the page to
+    the last row with non-white pixels, minus the blank rows on top. Pages
+    that are already cropped to their contents (tight=True, e.g. from the
+    standalone template) are not scanned: their size is their height.
+    """
+    w, h = img.size
+    if tight:
+        size = h
+    else:
+        # Imported here: only rasterization needs it
+        import numpy as np
 
         # Find where the question ends
         whites = (255 - np.asarray(img)).sum(axis=2)
@@ -280,71 +896,627 @@ def read_tex(
         y1 = np.argmax(whites.sum(axis=1) > 0)
         # Find the last row with non-white pixels
         y2 = np.argmax(whites[::-1].sum(axis=1) > 0)
-        w, h = img.size
-        dict_sizes[fout.split("/")[-1]] = h - y2 - y1
-
-        if crop:
-            # Crop the image
-            y2 = h - y2 + y1
-            img = img.crop((0, 0, w, y2))
-
-        if show_size:
-            # Put the size in red at the bottom of the image
-            draw = ImageDraw.Draw(img)
-            font = ImageFont.truetype("arial.ttf", 30)
-            draw.text(
-                (0, 0),
-                f"{img.size[0]}x{img.size[1]}",
-                (255, 0, 0),
-                font=font,
+        size = int(h - y2 - y1)
+
+    if crop and not tight:
+        # Crop the image
+        y2 = h - y2 + y1
+        img = img.crop((0, 0, w, y2))
+
+    if show_size:
+        # Put the size in red at the bottom of the image
+        from PIL import ImageDraw, ImageFont
+
+        draw = ImageDraw.Draw(img)
+        font = ImageFont.truetype("arial.ttf", 30)
+        draw.text(
+            (0, 0),
+            f"{img.size[0]}x{img.size[1]}",
+            (255, 0, 0),
+            font=font,
+        )
+    return img, size
+
+
+def check_options(render_mode: str, output_format: str, template: str):
+    """Raise ValueError if a render option has an unknown value."""
+    if render_mode not in RENDER_MODES:
+        raise ValueError(
+            f"Unknown render mode {render_mode!r}, "
+            f"choose one of: {', '.join(RENDER_MODES)}"
+        )
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output format {output_format!r}, "
+            f"choose one of: {', '.join(OUTPUT_FORMATS)}"
+        )
+    if template not in TEMPLATES:
+        raise ValueError(
+            f"Unknown template {template!r}, choose one of: {', '.join(TEMPLATES)}"
+        )
+
+
+def build_questions(
+    questions: List[Question],
+    path_output: str,
+    batch_size: int = 50,
+    aspectratio: int = 169,
+    fontsize: int = 12,
+    linespread: float = 1.1,
+    dpi: int = 200,
+    crop: bool = False,
+    show_size: bool = False,
+    path_index: Optional[str] = None,
+    raster_backend: str = "pdf2image",
+    render_mode: str = "pdf",
+    output_format: str = "png",
+    template: str = "beamer",
+    figure_cache: Optional[str] = DEFAULT_FIGURE_CACHE,
+    timeout: Optional[float] = None,
+    memory_mb: Optional[int] = None,
+    cpu_seconds: Optional[int] = None,
+    cancel: Optional[Callable[[], bool]] = None,
+    merge: bool = False,
+):
+    """
+    Compile parsed questions and save one image per question.
+
+    Writes the images, questions.csv, questions_<section>.csv and sizes.csv
+    to the output folder or ZIP file, and yields the progress from 0 to 1.
+    The progress is not yielded once per question (identical questions are
+    rendered together): the generator returns the number of questions, as
+    in `read_tex`. See `read_tex` for the parameters. With merge, the
+    questions are added to an existing output, which keeps the other
+    questions (see `finish_output`); it must have been rendered with the same
+    parameters.
+    """
+    out_folder = output_folder(path_output)
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    ls_fout = [out_folder + "/" + question.name for question in questions]
+
+    # Identical questions (e.g. reused across topics) are compiled and
+    # rasterized once; page k of the PDF is shared by ls_groups[k]
+    dict_groups: Dict[str, List[int]] = {}
+    for i, question in enumerate(questions):
+        dict_groups.setdefault(question.digest, []).append(i)
+    ls_groups = list(dict_groups.values())
+
+    check_options(render_mode, output_format, template)
+    extension = "." + output_format
+    supervisor = Supervisor(
+        timeout,
+        memory_mb,
+        cpu_seconds,
+        cancel,
+        env=tex_environment(question.source for question in questions),
+    )
+    # Recorded in the manifest (see tex2imgs.manifest)
+    config = dict(
+        aspectratio=aspectratio,
+        fontsize=fontsize,
+        linespread=linespread,
+        dpi=dpi,
+        crop=crop,
+        show_size=show_size,
+        raster_backend=raster_backend,
+        render_mode=render_mode,
+        output_format=output_format,
+        template=template,
+    )
+    if merge:
+        from tex2imgs.manifest import MANIFEST_FILE
+
+        txt_manifest = read_output_file(path_output, MANIFEST_FILE)
+        if txt_manifest is not None and json.loads(txt_manifest)["config"] != config:
+            raise ValueError(
+                f"{path_output} was rendered with other parameters: "
+                "render all its questions, or select them into a new output"
+            )
+
+    # Store the size of the images
+    ls_sizes = [0] * len(questions)
+    ls_dims = [(0, 0)] * len(questions)
+
+    # Resume an interrupted render: questions already written with the same
+    # parameters and the same body are not compiled again
+    from tex2imgs.checkpoint import Checkpoint, render_key
+
+    key = render_key(
+        dict(
+            preamble=build_document([], aspectratio, fontsize, linespread, template),
+            dpi=dpi,
+            crop=crop,
+            show_size=show_size,
+            raster_backend=raster_backend,
+            render_mode=render_mode,
+            output_format=output_format,
+        )
+    )
+    checkpoint = Checkpoint(out_folder, key)
+    if path_output.endswith(".zip") and os.path.exists(path_output):
+        from tex2imgs.manifest import restore_unchanged
+
+        # A finished ZIP keeps no checkpoint: its manifest tells which images
+        # are still valid, e.g. all but the ones from an edited input file
+        for question, entry in restore_unchanged(
+            path_output, out_folder, questions, config, extension
+        ):
+            checkpoint.add(
+                question.name,
+                question.digest,
+                entry["size"],
+                entry["width"],
+                entry["height"],
+            )
+    ls_entries = [
+        checkpoint.completed(q.name, q.digest, fout + extension)
+        for q, fout in zip(questions, ls_fout)
+    ]
+    done = 0
+    for i, entry in enumerate(ls_entries):
+        if entry is not None:
+            ls_sizes[i] = entry["size"]
+            ls_dims[i] = (entry["width"], entry["height"])
+            done += 1
+    if done:
+        yield done / len(ls_fout)
+    # Only the groups missing from the checkpoint are compiled
+    ls_groups = [g for g in ls_groups if any(ls_entries[i] is None for i in g)]
+
+    # Compile in a private folder, so concurrent renders do not share files
+    workdir = tempfile.TemporaryDirectory(prefix="tex2imgs_")
+    try:
+        if output_format == "svg":
+            ls_svg = render_svg(
+                build_document(
+                    [questions[group[0]].body for group in ls_groups],
+                    aspectratio=aspectratio,
+                    fontsize=fontsize,
+                    linespread=linespread,
+                    template=template,
+                ),
+                workdir.name,
+                len(ls_groups),
+                supervisor,
             )
+        else:
+            pages = render_images(
+                questions,
+                ls_groups,
+                workdir.name,
+                aspectratio=aspectratio,
+                fontsize=fontsize,
+                linespread=linespread,
+                dpi=dpi,
+                crop=crop,
+                show_size=show_size,
+                raster_backend=raster_backend,
+                render_mode=render_mode,
+                template=template,
+                figure_cache=figure_cache,
+                batch_size=batch_size,
+                supervisor=supervisor,
+            )
+    except Exception:
+        workdir.cleanup()
+        raise
+
+    write_question_tables(out_folder, questions, path_output if merge else None)
 
-        img.save(fout + ".png", "PNG")
-        yield (i + 1) / len(ls_fout)
+    def store(group: List[int], size: int, dims: Tuple[int, int]):
+        # The first question of the group holds the file, the rest link to it
+        fout = ls_fout[group[0]] + extension
+        for i in group:
+            if i != group[0]:
+                link_or_copy(fout, ls_fout[i] + extension)
+            ls_sizes[i] = size
+            ls_dims[i] = dims
+            checkpoint.add(questions[i].name, questions[i].digest, size, *dims)
 
-    # Save dict_sizes as a CSV file
-    df_sizes = pd.DataFrame(dict_sizes.items(), columns=["Item", "Size"])
-    # Sort by size
-    df_sizes = df_sizes.sort_values("Size", ascending=True)
-    df_sizes.to_csv(out_folder + "/sizes.csv", index=False)
+    if output_format == "svg":
+        from tex2imgs.raster import SVG_POINTS_PER_INCH, svg_size
 
-    # Remove auxiliary files
-    for ext in ["aux", "log", "nav", "out", "snm", "tex", "toc"]:
-        if os.path.exists("cover." + ext):
-            os.unlink("cover." + ext)
+        for group, path_svg in zip(ls_groups, ls_svg):
+            # Report the sizes in pixels at dpi, like the PNG output
+            width, height = (
+                round(x * dpi / SVG_POINTS_PER_INCH) for x in svg_size(path_svg)
+            )
+            supervisor.check()
+            write_output(
+                ls_fout[group[0]] + extension,
+                partial(shutil.move, path_svg),
+            )
+            store(group, height, (width, height))
+            done += len(group)
+            yield done / len(ls_fout)
+    else:
+        for group, img, size in pages:
+            supervisor.check()
+            write_output(ls_fout[group[0]] + ".png", partial(img.save, format="PNG"))
+            store(group, size, img.size)
+            done += len(group)
+            yield done / len(ls_fout)
+
+    # Remove the compilation folder
+    workdir.cleanup()
+    checkpoint.close()
+
+    finish_output(
+        path_output,
+        questions,
+        ls_sizes,
+        ls_dims,
+        extension=extension,
+        path_index=path_index,
+        aspectratio=aspectratio,
+        dpi=dpi,
+        config=config,
+        merge=merge,
+    )
+    return len(questions)
+
+
+def render_images(
+    questions: List[Question],
+    ls_groups: List[List[int]],
+    workdir: str,
+    aspectratio: int = 169,
+    fontsize: int = 12,
+    linespread: float = 1.1,
+    dpi: int = 200,
+    crop: bool = False,
+    show_size: bool = False,
+    raster_backend: str = "pdf2image",
+    render_mode: str = "pdf",
+    template: str = "beamer",
+    figure_cache: Optional[str] = DEFAULT_FIGURE_CACHE,
+    batch_size: int = 50,
+    supervisor: Optional[Supervisor] = None,
+) -> Iterator[Tuple[List[int], object, int]]:
+    """
+    Compile groups of identical questions and rasterize one image per group.
+
+    The questions are compiled in workdir before this returns, so that
+    compilation errors are raised right away. The pages are rasterized as
+    the returned iterator is consumed. See `read_tex` for the parameters.
+
+    Parameters
+    ----------
+    questions : List[Question]
+        Parsed questions.
+    ls_groups : List[List[int]]
+        Indices of the questions to render, grouped by body: only the first
+        question of each group is compiled.
+    workdir : str
+        Compilation folder.
+
+    Returns
+    -------
+    Iterator[Tuple[List[int], PIL.Image.Image, int]]
+        Each group with its image and size (see `process_image`), in the
+        order they are rendered.
+    """
+    supervisor = supervisor or Supervisor()
+    # Questions drawn by matplotlib, and their lines (see tex2imgs.mathtext)
+    mathtext_groups: List[List[int]] = []
+    ls_mathtext = []
+    if render_mode == "mathtext" and template == "beamer":
+        from tex2imgs.mathtext import parse_mathtext
+
+        dvi_groups, pdf_groups = [], []
+        for group in ls_groups:
+            lines = parse_mathtext(questions[group[0]].body)
+            if lines is None:
+                pdf_groups.append(group)
+            else:
+                mathtext_groups.append(group)
+                ls_mathtext.append(lines)
+    elif render_mode == "auto" and template == "beamer":
+        # dvipng renders every page at one paper size, which only holds for
+        # the beamer template
+        dvi_groups, pdf_groups = [], []
+        for group in ls_groups:
+            if needs_pdf(questions[group[0]].body):
+                pdf_groups.append(group)
+            else:
+                dvi_groups.append(group)
+    else:
+        dvi_groups, pdf_groups = [], ls_groups
+
+    def bodies(groups: List[List[int]]) -> List[str]:
+        return [questions[group[0]].body for group in groups]
+
+    def document(ls_bodies: List[str]) -> str:
+        return build_document(
+            ls_bodies,
+            aspectratio=aspectratio,
+            fontsize=fontsize,
+            linespread=linespread,
+            template=template,
+        )
+
+    ls_png = []
+    path_pdf = None
+    if dvi_groups:
+        try:
+            ls_png = render_dvi(
+                document(bodies(dvi_groups)),
+                workdir,
+                dpi,
+                pages=len(dvi_groups),
+                supervisor=supervisor,
+            )
+        except ValueError as e:
+            print(f"DVI render failed ({e}), falling back to pdflatex")
+            dvi_groups = []
+            pdf_groups = ls_groups
+    if pdf_groups:
+        from tex2imgs.figures import compile_pdf
+
+        path_pdf = compile_pdf(
+            bodies(pdf_groups),
+            document,
+            workdir,
+            cache_dir=figure_cache,
+            supervisor=supervisor,
+        )
+
+    def pages() -> Iterator[Tuple[List[int], object, int]]:
+        # Imported here: only rasterization needs it
+        from PIL import Image
+
+        from tex2imgs.mathtext import render_mathtext
+        from tex2imgs.raster import get_backend
+
+        backend = get_backend(
+            raster_backend, batch_size=batch_size, supervisor=supervisor
+        )
+        # The matplotlib pages come first, then the DVI pages, then the PDF
+        # pages, all as full pages
+        if pdf_groups:
+            pdf_pages = backend.pages(path_pdf, dpi=dpi, last_page=len(pdf_groups))
+        else:
+            pdf_pages = iter(())
+        dvi_pages = (Image.open(path_png).convert("RGB") for path_png in ls_png)
+        mathtext_pages = (
+            render_mathtext(lines, aspectratio, fontsize, linespread, dpi)
+            for lines in ls_mathtext
+        )
+
+        groups = mathtext_groups + dvi_groups + pdf_groups
+        all_pages = itertools.chain(mathtext_pages, dvi_pages, pdf_pages)
+        try:
+            for group, img in zip(groups, all_pages):
+                img, size = process_image(
+                    img, crop=crop, show_size=show_size, tight=template == "standalone"
+                )
+                yield group, img, size
+        finally:
+            if pdf_groups:
+                pdf_pages.close()
+
+    return pages()
+
+
+def write_question_tables(
+    out_folder: str, questions: List[Question], merge_from: Optional[str] = None
+):
+    """
+    Write the scores: questions.csv, then one questions_<section>.csv each.
+
+    With merge_from, an existing output, the rows of its tables are kept for
+    the other questions, and the new rows replace the ones of the same items.
+    """
+    ls_scores = [question.scores for question in questions]
+    if merge_from is not None:
+        txt_old = read_output_file(merge_from, "questions.csv")
+        dict_new = {scores["Item"]: scores for scores in ls_scores}
+        ls_old = read_score_table(txt_old) if txt_old else []
+        ls_scores = [dict_new.pop(d["Item"], d) for d in ls_old]
+        ls_scores += dict_new.values()
+    header, rows = score_table(ls_scores)
+    dict_tables: Dict[str, List[List[str]]] = {}
+    for row in rows:
+        section = row[0].split("_")[0]
+        dict_tables.setdefault(f"questions_{section}.csv", []).append(row)
+    dict_tables["questions.csv"] = rows
+    for name, table_rows in dict_tables.items():
+        write_csv(os.path.join(out_folder, name), header, table_rows)
+
+
+def finish_output(
+    path_output: str,
+    questions: List[Question],
+    ls_sizes: List[int],
+    ls_dims: List[Tuple[int, int]],
+    extension: str = ".png",
+    path_index: Optional[str] = None,
+    aspectratio: int = 169,
+    dpi: int = 200,
+    config: Optional[Dict] = None,
+    merge: bool = False,
+):
+    """
+    Complete a render whose images are in the output folder.
+
+    Writes sizes.csv and manifest.json, updates the question index if
+    path_index is given, and zips the folder if path_output is a ZIP file.
+    With merge, the questions are added to the existing output: the files,
+    sizes and manifest entries of the other questions are kept.
+
+    Parameters
+    ----------
+    path_output : str
+        Path to the output folder or zip file.
+    questions : List[Question]
+        Rendered questions.
+    ls_sizes : List[int]
+        Height of the contents of each image, in pixels.
+    ls_dims : List[Tuple[int, int]]
+        Width and height of each image, in pixels.
+    extension : str, optional
+        Extension of the images, ".png" or ".svg".
+    config : Dict, optional
+        Render parameters, recorded in the manifest (see tex2imgs.manifest).
+    merge : bool, optional
+        Whether the questions are only part of the output, e.g. selected with
+        a `QuestionFilter`.
+    """
+    from tex2imgs.manifest import MANIFEST_FILE, write_manifest
+
+    out_folder = output_folder(path_output)
+    dict_sizes = {q.name: size for q, size in zip(questions, ls_sizes)}
+    records = [
+        dict(
+            question=q,
+            width=dims[0],
+            height=dims[1],
+            size=size,
+            file=q.name + extension,
+        )
+        for q, dims, size in zip(questions, ls_dims, ls_sizes)
+    ]
+
+    # Save dict_sizes as a CSV file, sorted by size
+    header, rows = ["Item", "Size"], [[k, str(v)] for k, v in dict_sizes.items()]
+    previous_files = None
+    if merge:
+        header, rows = merge_rows(
+            read_output_file(path_output, "sizes.csv"), header, rows
+        )
+        txt_manifest = read_output_file(path_output, MANIFEST_FILE)
+        if txt_manifest is not None:
+            previous_files = json.loads(txt_manifest)["files"]
+    rows.sort(key=lambda row: int(row[1]))
+    write_csv(out_folder + "/sizes.csv", header, rows)
+
+    write_manifest(out_folder, records, config or {}, previous_files)
+
+    if path_index is not None:
+        from tex2imgs.index import update_index
+
+        update_index(
+            path_index,
+            records,
+            path_output=path_output,
+            aspectratio=aspectratio,
+            dpi=dpi,
+        )
 
     # Zip the images
     if path_output.endswith(".zip"):
-        with zipfile.ZipFile(path_output, "w") as zipf:
-            for root, dirs, files in os.walk(out_folder):
-                for file in files:
-                    if (
-                        file.endswith(".png")
-                        or file.endswith(".csv")
-                        or file.endswith(".txt")
-                    ):
-                        zipf.write(os.path.join(root, file), file)
-                        os.remove(os.path.join(root, file))
+        from tex2imgs.checkpoint import CHECKPOINT_FILE
+
+        if merge and os.path.exists(path_output):
+            # Bring back the files of the other questions
+            with zipfile.ZipFile(path_output) as zipf:
+                for name in zipf.namelist():
+                    if not os.path.exists(os.path.join(out_folder, name)):
+                        zipf.extract(name, out_folder)
+        ls_files = [
+            os.path.join(root, file)
+            for root, dirs, files in os.walk(out_folder)
+            for file in files
+            if file.endswith((".png", ".svg", ".csv", ".txt", ".json"))
+        ]
+        # Write under a temporary name: if interrupted, the folder and its
+        # checkpoint are still there and no truncated ZIP is left behind
+        path_partial = path_output + ".part"
+        with zipfile.ZipFile(path_partial, "w") as zipf:
+            for path in ls_files:
+                zipf.write(path, os.path.basename(path))
+        os.replace(path_partial, path_output)
+        for path in ls_files:
+            os.remove(path)
+        path_checkpoint = os.path.join(out_folder, CHECKPOINT_FILE)
+        if os.path.exists(path_checkpoint):
+            os.remove(path_checkpoint)
         # Remove the folder
         os.rmdir(out_folder)
 
 
+def config_params(dict_config: Dict, key: str) -> Dict:
+    """
+    Build the keyword arguments of `read_tex` from a configuration file.
+
+    Parameters
+    ----------
+    dict_config : Dict
+        Contents of the configuration file (see config.json).
+    key : str
+        Key of the render configuration to use, e.g. "169".
+    """
+    return dict(
+        score_good=dict_config["score_good"],
+        score_bad=dict_config["score_bad"],
+        score_noanswer=dict_config["score_noanswer"],
+        **render_params(dict_config, key),
+    )
+
+
+def render_params(dict_config: Dict, key: str) -> Dict:
+    """Same as `config_params`, without the scores (for `build_questions`)."""
+    return dict(
+        show_size=dict_config["show_size"],
+        raster_backend=dict_config.get("raster_backend", "pdf2image"),
+        render_mode=dict_config.get("render_mode", "pdf"),
+        output_format=dict_config.get("output_format", "png"),
+        template=dict_config.get("template", "beamer"),
+        figure_cache=dict_config.get("figure_cache", DEFAULT_FIGURE_CACHE),
+        **render_limits(dict_config),
+        **dict_config[key],
+    )
+
+
+def render_limits(dict_config: Dict, preview: bool = False) -> Dict:
+    """
+    Limits of the render subprocesses from a configuration file.
+
+    Returns the timeout, memory_mb and cpu_seconds keys (see
+    `tex2imgs.supervisor.Supervisor`). With preview, the keys in
+    "preview_limits" override them: previews rerun on every edit, so a
+    runaway question must fail fast.
+    """
+    limits = {k: dict_config.get(k) for k in ["timeout", "memory_mb", "cpu_seconds"]}
+    if preview:
+        limits.update(dict_config.get("preview_limits", {}))
+    return limits
+
+
 def main(
     file: str = "examples/real.tex",
     output: str = "output",
     config: str = "config.json",
     key: str = "169",
+    index: Optional[str] = None,
+    section: Optional[List[str]] = None,
+    subsection: Optional[List[str]] = None,
+    question: Optional[List[str]] = None,
+    versions: Optional[str] = None,
 ):
+    """
+    Render the questions of a LaTeX file. --section, --subsection and
+    --question (globs, repeatable) and --versions (e.g. "1-3,5") render only
+    part of the file.
+    """
     dict_config = json.load(open(config))
+    select = None
+    if section or subsection or question or versions is not None:
+        select = QuestionFilter(
+            sections=list(section or []),
+            subsections=list(subsection or []),
+            questions=list(question or []),
+            versions=versions,
+        )
 
     gen = read_tex(
         file,
         output,
-        score_good=dict_config["score_good"],
-        score_bad=dict_config["score_bad"],
-        score_noanswer=dict_config["score_noanswer"],
-        show_size=dict_config["show_size"],
-        **dict_config[key],
+        path_index=index,
+        select=select,
+        **config_params(dict_config, key),
     )
 
     for p in gen:
@@ -353,4 +1525,6 @@ def main(
 
 
 if __name__ == "__main__":
+    import typer
+
     typer.run(main)
@@ -0,0 +1,245 @@
+import bisect
+import json
+import os
+import re
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import typer
+
+from tex2imgs.supervisor import Supervisor
+from tex2imgs.utils import (
+    Question,
+    build_document,
+    parse_questions,
+    tex_environment,
+    write_csv,
+)
+
+# With -file-line-error, TeX starts every error with "<file>:<line>: "
+LOG_ERROR = re.compile(r"^(?:\./)?[^:\n]+\.tex:(\d+): (.*)$", re.M)
+# The context of an error: the input line up to the point of the error
+LOG_CONTEXT = re.compile(r"^l\.\d+ ?(.*)$", re.M)
+LOG_FATAL = ("==> Fatal error occurred", "Emergency stop")
+
+
+@dataclass
+class LatexError:
+    """A LaTeX error, traced back to its question."""
+
+    name: Optional[str]  # Question name, None for errors outside questions
+    source: Optional[str]
+    line: int  # Line of \begin{question} in the source
+    message: str
+    context: str  # TeX input up to the error, e.g. "Calculate $\frac"
+
+    def __str__(self) -> str:
+        where = f"{self.source or ''}:{self.line}: {self.name or 'preamble'}"
+        return f"{where}: {self.message}\n    {self.context}"
+
+
+def parse_log(log: str) -> List[Dict]:
+    """Errors of a log written with -file-line-error: line, message, context."""
+    errors = []
+    for match in LOG_ERROR.finditer(log):
+        context = LOG_CONTEXT.search(log, match.end())
+        errors.append(
+            dict(
+                line=int(match.group(1)),
+                message=match.group(2).strip(),
+                context=context.group(1).strip() if context else "",
+            )
+        )
+    return errors
+
+
+def check_shard(
+    bodies: List[str],
+    document: Callable[[List[str]], str],
+    supervisor: Supervisor,
+) -> List[Dict]:
+    """
+    Compile bodies in draft mode and return their errors.
+
+    Each error gets the index of the body it is in ("body", None for the
+    preamble). Errors after the last body, e.g. at \\end{document} or at the
+    end of the file, belong to the last body. If TeX stops at a fatal error,
+    the bodies after it are checked again in a new document.
+    """
+    if not bodies:
+        return []
+    txt_full = document(bodies)
+    # Line where each body starts: the preamble ends right before the first
+    preamble_lines = document([]).count("\n") - 1
+    starts = []
+    line = preamble_lines + 1
+    for body in bodies:
+        starts.append(line)
+        line += body.count("\n")
+
+    with tempfile.TemporaryDirectory(prefix="tex2imgs_validate_") as workdir:
+        with open(os.path.join(workdir, "validate.tex"), "w") as f:
+            f.write(txt_full)
+        cmd = [
+            "pdflatex",
+            "-draftmode",
+            "-interaction",
+            "nonstopmode",
+            "-file-line-error",
+            "validate.tex",
+        ]
+        supervisor.run(cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+        path_log = os.path.join(workdir, "validate.log")
+        if not os.path.exists(path_log):
+            raise ValueError("Error executing command: " + " ".join(cmd))
+        with open(path_log, "r", errors="replace") as f:
+            log = f.read()
+
+    errors = parse_log(log)
+    for error in errors:
+        k = bisect.bisect_right(starts, error["line"]) - 1
+        error["body"] = k if k >= 0 else None
+    if any(marker in log for marker in LOG_FATAL) and errors:
+        last = errors[-1]["body"]
+        if last is not None and last + 1 < len(bodies):
+            rest = check_shard(bodies[last + 1 :], document, supervisor)
+            for error in rest:
+                if error["body"] is not None:
+                    error["body"] += last + 1
+            errors += [e for e in rest if e["body"] is not None]
+    return errors
+
+
+def validate_questions(
+    questions: List[Question],
+    shard_size: int = 20,
+    workers: Optional[int] = None,
+    aspectratio: int = 169,
+    fontsize: int = 12,
+    linespread: float = 1.1,
+    template: str = "beamer",
+    timeout: Optional[float] = None,
+    memory_mb: Optional[int] = None,
+    cpu_seconds: Optional[int] = None,
+    **kwargs,
+) -> List[LatexError]:
+    """
+    Check that questions compile, without producing any image.
+
+    The distinct question bodies are split in shards of shard_size, which
+    are compiled in parallel with pdflatex -draftmode (no PDF is written).
+    The errors in the logs are mapped back to the questions, and reported
+    for every question with that body. Other keyword arguments (e.g. the
+    rest of `render_params`) are ignored.
+
+    Returns
+    -------
+    List[LatexError]
+        The errors, in the order of the questions.
+    """
+    supervisor = Supervisor(
+        timeout,
+        memory_mb,
+        cpu_seconds,
+        env=tex_environment(question.source for question in questions),
+    )
+    document = partial(
+        build_document,
+        aspectratio=aspectratio,
+        fontsize=fontsize,
+        linespread=linespread,
+        template=template,
+    )
+    dict_groups: Dict[str, List[Question]] = {}
+    for question in questions:
+        dict_groups.setdefault(question.digest, []).append(question)
+    groups = list(dict_groups.values())
+    shards = [groups[i : i + shard_size] for i in range(0, len(groups), shard_size)]
+
+    def check(shard: List[List[Question]]) -> List[Dict]:
+        return check_shard([group[0].body for group in shard], document, supervisor)
+
+    errors: List[LatexError] = []
+    preamble_errors = set()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for shard, shard_errors in zip(shards, pool.map(check, shards)):
+            for error in shard_errors:
+                if error["body"] is None:
+                    # Every shard repeats the errors of the preamble
+                    if error["message"] not in preamble_errors:
+                        preamble_errors.add(error["message"])
+                        errors.append(
+                            LatexError(
+                                None, None, 0, error["message"], error["context"]
+                            )
+                        )
+                    continue
+                for question in shard[error["body"]]:
+                    errors.append(
+                        LatexError(
+                            question.name,
+                            question.source,
+                            question.line,
+                            error["message"],
+                            error["context"],
+                        )
+                    )
+    order = {q.name: i for i, q in enumerate(questions)}
+    errors.sort(key=lambda e: -1 if e.name is None else order[e.name])
+    return errors
+
+
+def main(
+    file: str,
+    config: str = "config.json",
+    key: str = "169",
+    shard_size: int = 20,
+    workers: int = os.cpu_count() or 1,
+    report: Optional[str] = None,
+):
+    """Check every question of a LaTeX file for errors, without rendering."""
+    from tex2imgs.includes import read_source_tree
+    from tex2imgs.utils import render_params
+
+    dict_config = json.load(open(config))
+    tree = read_source_tree(file)
+    questions, parse_errors = parse_questions(
+        tree.lines,
+        score_good=dict_config["score_good"],
+        score_bad=dict_config["score_bad"],
+        score_noanswer=dict_config["score_noanswer"],
+        origins=tree.origins,
+    )
+    errors = [
+        LatexError(name, *tree.origins[idx], str(e), "")
+        for idx, name, e in parse_errors
+    ]
+    errors += validate_questions(
+        questions,
+        shard_size=shard_size,
+        workers=workers,
+        **render_params(dict_config, key),
+    )
+    for error in errors:
+        typer.echo(str(error))
+    if report is not None:
+        write_csv(
+            report,
+            ["Item", "Source", "Line", "Error", "Context"],
+            [
+                [e.name or "", e.source or "", str(e.line), e.message, e.context]
+                for e in errors
+            ],
+        )
+    count = len({e.name for e in errors if e.name is not None})
+    typer.echo(f"{len(questions)} questions checked, {count} with errors")
+    if errors:
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
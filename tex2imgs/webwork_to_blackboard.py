@@ -1,11 +1,28 @@
 from __future__ import annotations
 
+import codecs
 import csv
+import hashlib
 import io
+import mmap
 import re
-from dataclasses import dataclass
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from types import SimpleNamespace
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Only this many bytes are decoded to sniff the dialect, and the sniffer sees
+# at most SNIFF_CHARS characters of them.
+SNIFF_BYTES = 16 * 1024
+SNIFF_CHARS = 4096
+CHUNK_BYTES = 1024 * 1024
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
 
 
 def norm(value: object) -> str:
@@ -16,21 +33,109 @@ def clean(value: object) -> str:
     return str(value or "").strip()
 
 
-def read_csv_text(raw: str) -> List[List[str]]:
-    sample = raw[:4096]
+def sniff_dialect(sample: str):
     try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        return csv.Sniffer().sniff(sample[:SNIFF_CHARS], delimiters=",;\t|")
     except csv.Error:
-        dialect = csv.get_dialect("excel")
-    return list(csv.reader(raw.splitlines(), dialect))
+        return csv.get_dialect("excel")
+
+
+@dataclass
+class CsvFormat:
+    encoding: str
+    offset: int
+    dialect: object
+
+
+def detect_format(prefix: bytes) -> CsvFormat:
+    encoding, offset = "utf-8", 0
+    for bom, name in BYTE_ORDER_MARKS:
+        if prefix.startswith(bom):
+            encoding, offset = name, len(bom)
+            break
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    sample = decoder.decode(prefix[offset:SNIFF_BYTES])
+    return CsvFormat(encoding=encoding, offset=offset, dialect=sniff_dialect(sample))
+
+
+def iter_lines(
+    buffer: Union[bytes, mmap.mmap],
+    encoding: str,
+    offset: int = 0,
+    chunk_size: int = CHUNK_BYTES,
+) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    for start in range(offset, len(buffer), chunk_size):
+        pending += decoder.decode(buffer[start : start + chunk_size])
+        # A trailing "\r" may be the first half of a "\r\n" in the next chunk.
+        cut = max(pending.rfind("\n"), pending.rfind("\r", 0, len(pending) - 1)) + 1
+        if cut:
+            yield from io.StringIO(pending[:cut], newline="")
+            pending = pending[cut:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield from io.StringIO(pending, newline="")
+
+
+@dataclass
+class CsvSource:
+    """CSV bytes in memory or on disk, parsed lazily into cleaned rows.
+
+    Files are memory-mapped and decoded chunk by chunk. The encoding and
+    dialect are detected once from a bounded prefix and cached in ``format``,
+    so iterating the source again does not sniff again.
+    """
+
+    data: Optional[bytes] = None
+    path: Optional[Path] = None
+    format: Optional[CsvFormat] = None
+
+    @contextmanager
+    def buffer(self) -> Iterator[Union[bytes, mmap.mmap]]:
+        if self.path is None:
+            yield self.data or b""
+            return
+        with open(self.path, "rb") as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                yield b""
+                return
+            with mapped:
+                yield mapped
+
+    def __iter__(self) -> Iterator[List[str]]:
+        with self.buffer() as buffer:
+            if self.format is None:
+                self.format = detect_format(buffer[:SNIFF_BYTES])
+            lines = iter_lines(buffer, self.format.encoding, self.format.offset)
+            for row in csv.reader(lines, self.format.dialect):
+                yield [cell.strip() for cell in row]
+
+
+def clean_rows(rows: Iterable[Sequence[str]]) -> Iterator[List[str]]:
+    if isinstance(rows, CsvSource):
+        # Rows from a CsvSource are already cleaned
+        return iter(rows)
+    return ([clean(c) for c in row] for row in rows)
+
+
+def read_csv_text(raw: str) -> List[List[str]]:
+    dialect = sniff_dialect(raw)
+    return [
+        [cell.strip() for cell in row]
+        for row in csv.reader(io.StringIO(raw, newline=""), dialect)
+    ]
 
 
 def read_csv_bytes(data: bytes) -> List[List[str]]:
-    return read_csv_text(data.decode("utf-8-sig", errors="replace"))
+    return list(CsvSource(data=data))
 
 
 def read_csv(path: Path) -> List[List[str]]:
-    return read_csv_text(path.read_text(encoding="utf-8-sig", errors="replace"))
+    return list(CsvSource(path=Path(path)))
 
 
 def rows_to_csv_text(rows: Sequence[Sequence[str]]) -> str:
@@ -44,6 +149,43 @@ def rows_to_csv_bytes(rows: Sequence[Sequence[str]]) -> bytes:
     return rows_to_csv_text(rows).encode("utf-8")
 
 
+@dataclass
+class EncodedRows:
+    """CSV bytes plus the byte offset where each row starts.
+
+    Row ``i`` spans ``data[offsets[i]:offsets[i + 1]]``, so a slice of rows can
+    be decoded without parsing the rest of the file.
+    """
+
+    data: bytes
+    offsets: array
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> List[List[str]]:
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return []
+        text = self.data[self.offsets[start] : self.offsets[stop]].decode("utf-8")
+        return list(csv.reader(io.StringIO(text, newline="")))
+
+
+def encode_rows(rows: Iterable[Sequence[str]]) -> EncodedRows:
+    lines: List[str] = []
+    writer = csv.writer(
+        SimpleNamespace(write=lines.append), quoting=csv.QUOTE_ALL, lineterminator="\n"
+    )
+    offsets = array("Q", [0])
+    chunks: List[bytes] = []
+    for row in rows:
+        writer.writerow(row)
+        chunk = lines.pop().encode("utf-8")
+        chunks.append(chunk)
+        offsets.append(offsets[-1] + len(chunk))
+    return EncodedRows(data=b"".join(chunks), offsets=offsets)
+
+
 def write_csv(path: Path, rows: Sequence[Sequence[str]]) -> None:
     with path.open("w", encoding="utf-8", newline="") as f:
         writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n")
@@ -119,6 +261,14 @@ class ConversionResult:
     unmatched_webwork_keys: List[str]
     blackboard_key: str
     webwork_key: str
+    project_headers: List[str] = field(default_factory=list)
+
+
+@dataclass
+class DeltaResult:
+    rows: List[List[str]]
+    changed_students: int
+    changed_headers: List[str]
 
 
 @dataclass
@@ -131,6 +281,7 @@ class ColumnAction:
 
 BLACKBOARD_KEY_COLUMNS = ["email", "e-mail", "username", "user id", "login id", "login"]
 WEBWORK_KEY_COLUMNS = ["email", "e-mail", "login id", "login", "username", "user id"]
+WEBWORK_HEADER_GROUPS = [["email"], ["e-mail"], ["login id"], ["username"], ["user id"]]
 
 
 def find_column(header: Sequence[str], key_column: str) -> int:
@@ -151,13 +302,21 @@ def find_preferred_column(header: Sequence[str], preferred: Sequence[str]) -> Op
     return None
 
 
-def detect_webwork(
-    rows: List[List[str]], key_column: Optional[str] = None
-) -> WebWorkExport:
-    header_idx = first_available_header_row(
-        rows, [["email"], ["e-mail"], ["login id"], ["username"], ["user id"]]
-    )
-    header = [clean(c) for c in rows[header_idx]]
+def header_group(
+    row: Sequence[str], groups: Sequence[Sequence[str]], limit: int
+) -> Optional[int]:
+    # One norm() over the joined row instead of one per cell; the separator
+    # never appears in a required name, so a match cannot straddle two cells.
+    line = norm("\0".join(row))
+    for g, required in enumerate(groups[:limit]):
+        if all(r in line for r in required):
+            return g
+    return None
+
+
+def webwork_columns(
+    header: Sequence[str], key_column: Optional[str] = None
+) -> Tuple[int, List[int], List[str]]:
     header_norm = [norm(c) for c in header]
 
     if key_column is not None:
@@ -174,7 +333,7 @@ def detect_webwork(
     project_names: List[str] = []
     started = False
     for i, cell in enumerate(header):
-        c = norm(cell)
+        c = header_norm[i]
         if c.startswith("problem_set") or c.startswith("problem set"):
             started = True
             project_indices.append(i)
@@ -197,27 +356,69 @@ def detect_webwork(
             header[i] or f"Project_{j + 1}" for j, i in enumerate(project_indices)
         ]
 
+    return key_idx, project_indices, project_names
+
+
+def detect_webwork(
+    rows: Iterable[Sequence[str]], key_column: Optional[str] = None
+) -> WebWorkExport:
+    """Detect the WebWork header and keep only the key and project columns.
+
+    The header is the first row matching the earliest group in
+    WEBWORK_HEADER_GROUPS. Rows are read in a single pass: rows after the
+    current best header candidate are projected straight away, and the
+    projection restarts if a later row turns out to be a better header. The
+    returned export holds the projected header and rows, with the key in
+    column 0, so memory grows with the key plus project columns only.
+    """
+    groups = [[norm(x) for x in group] for group in WEBWORK_HEADER_GROUPS]
+    best = len(groups)
+    header: Optional[List[str]] = None
+    columns: Optional[Tuple[int, List[int], List[str]]] = None
+    error: Optional[ValueError] = None
     data_rows: List[List[str]] = []
-    for row in rows[header_idx + 1 :]:
-        if not any(clean(c) for c in row):
+
+    for row in clean_rows(rows):
+        if best:
+            group = header_group(row, groups, best)
+            if group is not None:
+                best, header, data_rows = group, row, []
+                try:
+                    columns, error = webwork_columns(header, key_column), None
+                except ValueError as exc:
+                    columns, error = None, exc
+                continue
+        if columns is None or not any(row):
             continue
-        data_rows.append([clean(c) for c in row])
+        data_rows.append(
+            [row[i] if i < len(row) else "" for i in [columns[0], *columns[1]]]
+        )
+
+    if header is None:
+        required = sorted({item for group in WEBWORK_HEADER_GROUPS for item in group})
+        raise ValueError(
+            f"Could not find a header row containing one of: {', '.join(required)}"
+        )
+    if error is not None:
+        raise error
 
+    key_idx, project_indices, project_names = columns
     return WebWorkExport(
-        header=header,
-        key_idx=key_idx,
-        project_indices=project_indices,
+        header=[header[key_idx]] + [header[i] for i in project_indices],
+        key_idx=0,
+        project_indices=list(range(1, len(project_indices) + 1)),
         project_names=project_names,
         rows=data_rows,
     )
 
 
 def detect_blackboard(
-    rows: List[List[str]], key_column: Optional[str] = None
+    rows: Iterable[Sequence[str]], key_column: Optional[str] = None
 ) -> BlackboardExport:
-    if not rows:
+    out_rows = list(clean_rows(rows))
+    if not out_rows:
         raise ValueError("Blackboard file is empty.")
-    header = [clean(c) for c in rows[0]]
+    header = out_rows[0]
 
     if key_column is not None:
         try:
@@ -229,7 +430,6 @@ def detect_blackboard(
         if key_idx is None:
             raise ValueError("Could not detect the Blackboard key column.")
 
-    out_rows = [[clean(c) for c in row] for row in rows]
     for row in out_rows[1:]:
         while len(row) < len(header):
             row.append("")
@@ -270,14 +470,24 @@ def unique_values(values: Iterable[str]) -> List[str]:
 
 
 def convert_rows(
-    blackboard_rows: List[List[str]],
-    webwork_rows: List[List[str]],
+    blackboard_rows: Iterable[Sequence[str]],
+    webwork_rows: Iterable[Sequence[str]],
     blackboard_key: Optional[str] = None,
     webwork_key: Optional[str] = None,
 ) -> ConversionResult:
     bb = detect_blackboard(blackboard_rows, blackboard_key)
     ww = detect_webwork(webwork_rows, webwork_key)
-    lookup, variant_records = build_indexed_lookup(ww)
+    return merge_exports(bb, ww)
+
+
+def merge_exports(
+    bb: BlackboardExport,
+    ww: WebWorkExport,
+    index: Optional[Tuple[Dict[str, Tuple[List[str], int]], Dict[str, List[int]]]] = None,
+) -> ConversionResult:
+    if index is None:
+        index = build_indexed_lookup(ww)
+    lookup, variant_records = index
 
     out_header = list(bb.header)
     appended_headers: List[str] = []
@@ -366,6 +576,92 @@ def convert_rows(
         unmatched_webwork_keys=unique_values(unmatched_webwork_keys),
         blackboard_key=bb.header[bb.key_idx],
         webwork_key=ww.header[ww.key_idx],
+        project_headers=unique_values(action.header for action in column_actions),
+    )
+
+
+def cell_digest(value: object) -> str:
+    return hashlib.sha1(clean(value).encode("utf-8")).hexdigest()
+
+
+def header_positions(header: Sequence[str], names: Iterable[str]) -> Dict[str, int]:
+    header_norm = [norm(cell) for cell in header]
+    positions: Dict[str, int] = {}
+    for name in names:
+        try:
+            positions[name] = header_norm.index(norm(name))
+        except ValueError:
+            continue
+    return positions
+
+
+def gradebook_hashes(
+    rows: Sequence[Sequence[str]], key_column: str, headers: Sequence[str]
+) -> Dict[str, Dict[str, str]]:
+    if not rows:
+        return {}
+    header = [clean(c) for c in rows[0]]
+    key_idx = header_positions(header, [key_column]).get(key_column)
+    if key_idx is None:
+        raise ValueError(f"Previous gradebook key column not found: {key_column}")
+    positions = header_positions(header, headers)
+
+    hashes: Dict[str, Dict[str, str]] = {}
+    for row in rows[1:]:
+        key = norm(row[key_idx]) if key_idx < len(row) else ""
+        if not key:
+            continue
+        hashes[key] = {
+            name: cell_digest(row[idx] if idx < len(row) else "")
+            for name, idx in positions.items()
+        }
+    return hashes
+
+
+def delta_rows(
+    result: ConversionResult,
+    previous: Union[Sequence[Sequence[str]], Dict[str, Dict[str, str]]],
+) -> DeltaResult:
+    headers = result.project_headers
+    if not isinstance(previous, dict):
+        previous = gradebook_hashes(previous, result.blackboard_key, headers)
+    current = gradebook_hashes(result.rows, result.blackboard_key, headers)
+
+    out_header = result.rows[0] if result.rows else []
+    key_idx = header_positions(out_header, [result.blackboard_key])[
+        result.blackboard_key
+    ]
+    positions = header_positions(out_header, headers)
+    empty = cell_digest("")
+
+    # Students missing from the WebWork export have no new grades: leaving
+    # them out keeps the upload from clearing the grades they already have
+    unmatched = {norm(key) for key in result.unmatched_blackboard_keys}
+
+    changed_keys = set()
+    changed_names = set()
+    for key, cells in current.items():
+        if key in unmatched:
+            continue
+        before = previous.get(key, {})
+        for name, digest in cells.items():
+            if before.get(name, empty) != digest:
+                changed_keys.add(key)
+                changed_names.add(name)
+
+    changed_headers = [name for name in headers if name in changed_names]
+    out_rows: List[List[str]] = [
+        [out_header[key_idx]] + [out_header[positions[h]] for h in changed_headers]
+    ]
+    for row in result.rows[1:]:
+        if norm(row[key_idx]) not in changed_keys:
+            continue
+        out_rows.append([row[key_idx]] + [row[positions[h]] for h in changed_headers])
+
+    return DeltaResult(
+        rows=out_rows,
+        changed_students=len(out_rows) - 1,
+        changed_headers=changed_headers,
     )
 
 
@@ -375,12 +671,16 @@ def convert(
     output_path: Path,
     blackboard_key: Optional[str] = None,
     webwork_key: Optional[str] = None,
+    previous_path: Optional[Path] = None,
 ) -> Tuple[int, int, int]:
     result = convert_rows(
-        blackboard_rows=read_csv(blackboard_path),
-        webwork_rows=read_csv(webwork_path),
+        blackboard_rows=CsvSource(path=Path(blackboard_path)),
+        webwork_rows=CsvSource(path=Path(webwork_path)),
         blackboard_key=blackboard_key,
         webwork_key=webwork_key,
     )
-    write_csv(output_path, result.rows)
+    if previous_path is not None:
+        write_csv(output_path, delta_rows(result, read_csv(previous_path)).rows)
+    else:
+        write_csv(output_path, result.rows)
     return result.matched, result.unmatched, result.appended_columns